@@ -0,0 +1,93 @@
+"""
+Gunicorn configuration of the production server, run with
+
+    gunicorn -c DjangoProject/gunicorn.conf.py
+
+Workers are threaded sync workers (`gthread`) serving `DjangoProject.wsgi`. Set
+`GUNICORN_WORKER_CLASS=uvicorn_worker.UvicornWorker` to serve `DjangoProject.asgi` instead,
+which keeps the `/api/tasks/async/` endpoints async. On Django 4.2 every ORM call of an
+async view still hops to a thread, so the uvicorn workers used about 30% more CPU per
+request than `gthread` in `benchmark_api --url`.
+
+The supported setup (docker-compose.yaml) runs both: `gthread` workers for the API and
+uvicorn workers for `/api/tasks/async/`, which the event stream needs (a WSGI server answers
+it with a 501), behind the proxy of `DjangoProject/nginx.conf`. Both need `EVENTS_REDIS_URL`
+so that events published by the WSGI workers reach the streams.
+
+Every setting can be overridden from the environment. The defaults are one worker per core
+with 4 threads each. The GIL lets a worker use one core at most, and its threads overlap
+the time requests wait on PostgreSQL and Redis; more workers than cores only added context
+switches in the benchmark. Plain `sync` workers handle one request each, so they default
+to the usual `2 * cores + 1`. Cores are the ones this process may run on, which respects
+container CPU sets, not the host's.
+
+The app is imported once in the master (`preload_app`) and the workers are forked from it,
+sharing its memory copy-on-write and starting in milliseconds. Nothing opens a database or
+cache connection at import, so no connection is shared across the fork.
+
+Reloading:
+- `kill -HUP <master>` replaces the workers gracefully (in-flight requests finish within
+  `graceful_timeout`) and picks up configuration changes. With `preload_app` the code is
+  the master's, so it does not pick up new code.
+- To deploy new code without dropping connections, `kill -USR2 <master>` starts a new master
+  with new workers on the same socket, then `kill -QUIT <old master>` drains the old one.
+"""
+import os
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'DjangoProject.settings')
+
+
+def available_cores() -> int:
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        # Not available on macOS.
+        return os.cpu_count() or 1
+
+
+cores = available_cores()
+
+bind = os.environ.get('GUNICORN_BIND', f'0.0.0.0:{os.environ.get("PORT", "8000")}')
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+wsgi_app = 'DjangoProject.wsgi:application' if worker_class in ('sync', 'gthread') else 'DjangoProject.asgi:application'
+workers = int(os.environ.get('WEB_CONCURRENCY', 2 * cores + 1 if worker_class == 'sync' else cores))
+# Only used by gthread workers.
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+
+preload_app = True
+
+# Recycle workers after this many requests (jittered so they don't restart together), which
+# bounds the growth of memory leaks and of the copy-on-write pages a worker has touched.
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 2000))
+max_requests_jitter = int(os.environ.get('GUNICORN_MAX_REQUESTS_JITTER', 200))
+
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 60))
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', 5))
+backlog = int(os.environ.get('GUNICORN_BACKLOG', 2048))
+
+accesslog = os.environ.get('GUNICORN_ACCESS_LOG', '-')
+errorlog = '-'
+loglevel = os.environ.get('GUNICORN_LOG_LEVEL', 'info')
+# Trust X-Forwarded-* from the load balancer in front of the container.
+forwarded_allow_ips = os.environ.get('FORWARDED_ALLOW_IPS', '*')
+
+
+def on_starting(server):
+    from apps.common.metrics import get_registry
+
+    # Counters restart with the server, drop what the previous deployment left in METRICS_DIR.
+    get_registry().clear_directory()
+
+
+def worker_exit(server, worker):
+    from apps.common.metrics import get_registry
+
+    # Runs in the worker: write out what it recorded since its last periodic flush.
+    get_registry().flush()
+
+
+def child_exit(server, worker):
+    from apps.common.metrics import get_registry
+
+    get_registry().archive(worker.pid)
@@ -10,8 +10,14 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
+
+def env_bool(name: str, default: bool) -> bool:
+    return os.environ.get(name, str(default)).lower() in ('1', 'true', 'yes', 'on')
+
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -22,14 +28,23 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 SECRET_KEY = 'django-insecure-padp=i%lys6-s3-+%vwbja9rxsu$=7undv(8txc$b^j90h)=ta'
 
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = True
+# DEBUG also keeps every SQL query of a request in memory, the production server turns it off.
+DEBUG = env_bool('DJANGO_DEBUG', True)
 
-ALLOWED_HOSTS = []
+ALLOWED_HOSTS = [host for host in os.environ.get('DJANGO_ALLOWED_HOSTS', '').split(',') if host]
 
 # Application definition
 
 EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
 
+# Task notifications are written to an outbox table and sent by `manage.py deliver_emails`
+EMAIL_OUTBOX_BATCH_SIZE = 100
+EMAIL_OUTBOX_MAX_ATTEMPTS = 5
+EMAIL_OUTBOX_BACKOFF_SECONDS = 30
+# How long a worker has to send the batch it claimed. Emails it hasn't sent by then (it was
+# killed) are claimed again, so keep it longer than a batch takes to go out.
+EMAIL_OUTBOX_CLAIM_SECONDS = 600
+
 INSTALLED_APPS = [
     'django.contrib.admin',
     'django.contrib.auth',
@@ -37,8 +52,10 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'rest_framework_simplejwt',
     'drf_spectacular',
+    'apps.common',
     'apps.tasks',
     'apps.users',
     'django_filters',
@@ -46,7 +63,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'apps.common.middlewares.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'apps.common.middlewares.ProfilingMiddleware',
+    'apps.common.middlewares.ReplicaPinningMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -57,6 +77,49 @@ MIDDLEWARE = [
 
 ROOT_URLCONF = 'DjangoProject.urls'
 
+# Per-request query/timing instrumentation, see apps.common.middlewares.ProfilingMiddleware
+PROFILING_ENABLED = env_bool('PROFILING_ENABLED', DEBUG)
+PROFILING_SLOW_REQUEST_MS = 500
+# Share of requests run under cProfile, only those slower than the threshold are dumped
+PROFILING_SAMPLE_RATE = 0.0
+PROFILING_DUMP_DIR = BASE_DIR / 'profiles'
+
+METRICS_ENABLED = True
+# Directory shared by every process (gunicorn workers, the email worker) to aggregate their
+# metrics on /metrics; None keeps them in the serving process only
+METRICS_DIR = os.environ.get('METRICS_DIR') or None
+METRICS_FLUSH_INTERVAL = 5
+
+# Analytics entries are invalidated by writes, the timeout only bounds memory use
+ANALYTICS_CACHE_TIMEOUT = 24 * 3600
+# How long a recompute may hold the lock before another caller takes over
+ANALYTICS_CACHE_LOCK_TIMEOUT = 30
+
+# Snapshots of authenticated users (apps.users.authentication), dropped when a user is saved.
+# The shared cache keeps them USER_CACHE_TIMEOUT seconds, each process its USER_CACHE_LOCAL_SIZE
+# most recent users for USER_CACHE_LOCAL_TIMEOUT seconds: the delay before other processes
+# stop authenticating a deactivated user.
+USER_CACHE_TIMEOUT = 60
+USER_CACHE_LOCAL_TIMEOUT = 5
+USER_CACHE_LOCAL_SIZE = 10000
+
+# Task events streamed on /api/tasks/async/events/ (apps.common.events), served under ASGI
+# only (see DjangoProject/gunicorn.conf.py). Without a Redis URL events only reach the streams
+# of the process that published them, set it as soon as more than one process serves the API.
+EVENTS_REDIS_URL = os.environ.get('EVENTS_REDIS_URL') or None
+EVENTS_REDIS_CHANNEL = 'tasks:events'
+EVENTS_REDIS_RETRY_SECONDS = 1
+# Events a stream may fall behind by before it's closed and its client told to resync
+EVENTS_QUEUE_SIZE = 100
+EVENTS_KEEPALIVE_SECONDS = 15
+# Streams end after this long and clients reconnect. Django doesn't notice clients that
+# disconnected from a stream, so this bounds how long their subscriptions linger.
+EVENTS_STREAM_MAX_SECONDS = 300
+
+# Days of changes the change feed (apps.tasks.changes) keeps, `manage.py prune_changes` deletes
+# older ones. Clients that haven't synced for longer are told to download every task again.
+CHANGE_LOG_RETENTION_DAYS = int(os.environ.get('CHANGE_LOG_RETENTION_DAYS', 30))
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
@@ -81,17 +144,51 @@ WSGI_APPLICATION = 'DjangoProject.wsgi.application'
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.postgresql',
-        'NAME': 'django-db',
-        'USER': 'django-user',
-        'PASSWORD': 'passw0rd',
-        'HOST': 'db',
-        'PORT': '5432',
+        'NAME': os.environ.get('DB_NAME', 'django-db'),
+        'USER': os.environ.get('DB_USER', 'django-user'),
+        'PASSWORD': os.environ.get('DB_PASSWORD', 'passw0rd'),
+        'HOST': os.environ.get('DB_HOST', 'db'),
+        'PORT': os.environ.get('DB_PORT', '5432'),
+        # Keep connections open across requests (seconds, 0 closes them after every request).
+        # Every server thread holds one, so PostgreSQL sees up to workers * threads of them.
+        # Past what PostgreSQL should hold, point DB_HOST at pgbouncer (as docker-compose.yaml
+        # does) with DB_PGBOUNCER=1: it pools those connections over a few server connections.
+        # Django 4.2 with psycopg2 has no in-process pool.
+        'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', 60)),
+        # Check a reused connection before the first query of a request, so a connection the
+        # server or a proxy dropped is replaced instead of failing the request.
+        'CONN_HEALTH_CHECKS': env_bool('DB_CONN_HEALTH_CHECKS', True),
+        # Behind pgbouncer in transaction pooling mode, a server-side cursor (`.iterator()`)
+        # can't outlive its transaction, so they are turned off.
+        'DISABLE_SERVER_SIDE_CURSORS': env_bool('DB_PGBOUNCER', False),
     }
 }
 
+# Read replicas (comma-separated `host` or `host:port`), used by the views mixing in
+# apps.common.replicas.ReplicaReadMixin. Locally, pointing a replica at the primary's host
+# exercises the routing. In tests a replica is a second connection to the test database,
+# which doesn't see the data of the test's transaction, so only run ReplicaReadTests with it.
+REPLICA_DATABASES = []
+for index, replica in enumerate(filter(None, os.environ.get('DB_REPLICA_HOSTS', '').split(',')), start=1):
+    replica_host, _, replica_port = replica.partition(':')
+    DATABASES[f'replica_{index}'] = {
+        **DATABASES['default'],
+        'HOST': replica_host,
+        'PORT': replica_port or DATABASES['default']['PORT'],
+        'TEST': {'MIRROR': 'default'},
+    }
+    REPLICA_DATABASES.append(f'replica_{index}')
+
+DATABASE_ROUTERS = ['apps.common.replicas.ReplicaRouter']
+# Replicas further behind the primary are skipped until they catch up (seconds)
+REPLICA_MAX_LAG = float(os.environ.get('DB_REPLICA_MAX_LAG', 2))
+REPLICA_LAG_CHECK_INTERVAL = 1
+# How long a client reads from the primary after a write, longer than the usual lag
+REPLICA_STICKY_SECONDS = float(os.environ.get('DB_REPLICA_STICKY_SECONDS', 5))
+
 CACHES = {
     "default": {
-        "BACKEND": "django_redis.cache.RedisCache",
+        "BACKEND": "apps.common.cache.InstrumentedRedisCache",
         "LOCATION": "redis://redis-primary:6379/1",
         "OPTIONS": {
             "CLIENT_CLASS": "django_redis.client.DefaultClient",
@@ -120,10 +217,13 @@ AUTH_PASSWORD_VALIDATORS = [
 REST_FRAMEWORK = {
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'apps.users.authentication.CachedJWTAuthentication',
     ),
     'DEFAULT_FILTER_BACKENDS': ('django_filters.rest_framework.DjangoFilterBackend',
                                 'rest_framework.filters.OrderingFilter', 'rest_framework.filters.SearchFilter'),
+    # DRF's JSON, encoded with orjson (apps.common.renderers)
+    'DEFAULT_RENDERER_CLASSES': ('apps.common.renderers.FastJSONRenderer',
+                                 'rest_framework.renderers.BrowsableAPIRenderer'),
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.LimitOffsetPagination',
     'PAGE_SIZE': 10
 }
@@ -145,10 +245,26 @@ USE_I18N = True
 
 USE_TZ = True
 
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        # Profiling lines (apps.profiling) are INFO, set DJANGO_LOG_LEVEL=INFO to see them.
+        'apps': {'handlers': ['console'], 'level': os.environ.get('DJANGO_LOG_LEVEL', 'WARNING'), 'propagate': False},
+        # SQL is only logged with DEBUG on, and even then only when asked for explicitly.
+        'django.db.backends': {'level': os.environ.get('DJANGO_DB_LOG_LEVEL', 'INFO')},
+    },
+}
+
 # Static files (CSS, JavaScript, Images)
 # https://docs.djangoproject.com/en/5.2/howto/static-files/
 
 STATIC_URL = 'static/'
+# Where `collectstatic` gathers them for the proxy to serve, Django only serves them with DEBUG on
+STATIC_ROOT = BASE_DIR / 'staticfiles'
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
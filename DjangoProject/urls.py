@@ -23,6 +23,7 @@ urlpatterns = [
     path("schema", SpectacularAPIView.as_view(), name="schema"),
     path("redoc", SpectacularRedocView.as_view(url_name="schema"), name="redoc"),
     path('admin/', admin.site.urls),
+    path('', include('apps.common.urls')),
     path('api/users/', include('apps.users.urls')),
     path('api/tasks/', include('apps.tasks.urls')),
 ]
@@ -3,3 +3,10 @@ from django.apps import AppConfig
 
 class CommonConfig(AppConfig):
     name = "apps.common"
+
+    def ready(self):
+        from django.db.backends.signals import connection_created
+
+        from .middlewares import install_query_observer
+
+        connection_created.connect(install_query_observer, dispatch_uid="install_query_observer")
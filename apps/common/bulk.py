@@ -0,0 +1,80 @@
+import csv
+import io
+from datetime import date, datetime
+from itertools import islice
+from typing import Iterable, Iterator
+
+from django.db import DEFAULT_DB_ALIAS, connections
+
+COPY_NULL = r'\N'
+
+
+def chunked(iterable: Iterable, size: int) -> Iterator[list]:
+    """Yield lists of at most `size` items from `iterable`."""
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def supports_copy(using: str = DEFAULT_DB_ALIAS) -> bool:
+    return connections[using].vendor == 'postgresql'
+
+
+def advance_sequence(table: str, max_id: int | None, using: str = DEFAULT_DB_ALIAS, column: str = 'id'):
+    """
+    Move the PostgreSQL sequence of `table.column` past `max_id`, the largest id rows were
+    written with explicitly, so the ids it generates next don't collide with theirs. Other
+    databases generate ids past the largest one in the table already.
+    """
+    connection = connections[using]
+    if max_id is None or connection.vendor != 'postgresql':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT pg_get_serial_sequence(%s, %s)', [table, column])
+        sequence = cursor.fetchone()[0]
+        cursor.execute(f'SELECT setval(%s, %s) FROM {sequence} WHERE last_value <= %s', [sequence, max_id, max_id])
+
+
+def copy_rows(table: str, columns: list[str], rows: Iterable[tuple], using: str = DEFAULT_DB_ALIAS) -> int:
+    """
+    Load `rows` into `table` with PostgreSQL `COPY ... FROM STDIN`.
+
+    This skips per-row INSERT parsing and planning entirely and is the fastest way to write
+    large volumes. Model `save()`, signals and field defaults are bypassed, so callers must
+    provide every non-null column. Returns the number of rows written.
+    """
+    connection = connections[using]
+    quote = connection.ops.quote_name
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    count = 0
+    for row in rows:
+        writer.writerow([_copy_value(value) for value in row])
+        count += 1
+    if not count:
+        return 0
+    buffer.seek(0)
+
+    sql = (f'COPY {quote(table)} ({", ".join(quote(column) for column in columns)}) '
+           f"FROM STDIN WITH (FORMAT csv, NULL '{COPY_NULL}')")
+    with connection.cursor() as cursor:
+        raw_cursor = cursor.cursor
+        if hasattr(raw_cursor, 'copy_expert'):
+            # psycopg2
+            raw_cursor.copy_expert(sql, buffer)
+        else:
+            # psycopg 3
+            with raw_cursor.copy(sql) as copy:
+                copy.write(buffer.getvalue())
+    return count
+
+
+def _copy_value(value):
+    if value is None:
+        return COPY_NULL
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
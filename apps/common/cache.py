@@ -0,0 +1,49 @@
+from django.core.cache.backends.base import BaseCache
+from django.core.cache.backends.locmem import LocMemCache
+from django_redis.cache import RedisCache
+
+from apps.common.metrics import get_registry
+
+MISSING = object()
+
+
+class InstrumentedCacheMixin:
+    """
+    Counts cache hits and misses of `get` and `get_many` as `cache_hits_total` and
+    `cache_misses_total`, labelled with the `METRICS_NAME` of the cache (`default` if unset).
+    """
+
+    def __init__(self, location, params):
+        super().__init__(location, params)
+        self.metrics_name = params.get("METRICS_NAME", "default")
+        # The generic get_many() goes through get(), which already counts.
+        self.get_many_counts = getattr(super().get_many, "__func__", None) is not BaseCache.get_many
+
+    def get(self, key, default=None, *args, **kwargs):
+        value = super().get(key, MISSING, *args, **kwargs)
+        hit = value is not MISSING
+        self.record(int(hit), int(not hit))
+        return value if hit else default
+
+    def get_many(self, keys, *args, **kwargs):
+        if not self.get_many_counts:
+            return super().get_many(keys, *args, **kwargs)
+        keys = list(keys)
+        values = super().get_many(keys, *args, **kwargs)
+        self.record(len(values), len(keys) - len(values))
+        return values
+
+    def record(self, hits: int, misses: int):
+        registry = get_registry()
+        if hits:
+            registry.inc("cache_hits_total", hits, cache=self.metrics_name)
+        if misses:
+            registry.inc("cache_misses_total", misses, cache=self.metrics_name)
+
+
+class InstrumentedRedisCache(InstrumentedCacheMixin, RedisCache):
+    pass
+
+
+class InstrumentedLocMemCache(InstrumentedCacheMixin, LocMemCache):
+    pass
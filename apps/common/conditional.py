@@ -0,0 +1,45 @@
+"""
+Conditional GET: `ETag` and `Last-Modified` validators and `304 Not Modified` responses.
+
+Views compute their validators from columns that change with every change to what they
+render, so a client revalidating an unchanged resource is answered without the queries and
+serialization of a full response. `Last-Modified` has a precision of one second: clients
+sending `If-None-Match` (browsers send it when they have an `ETag`) also notice changes made
+within the second they fetched the resource, those only sending `If-Modified-Since` don't.
+"""
+from datetime import datetime
+from hashlib import blake2b
+
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+CONDITIONAL_HEADERS = ("HTTP_IF_MATCH", "HTTP_IF_NONE_MATCH", "HTTP_IF_MODIFIED_SINCE", "HTTP_IF_UNMODIFIED_SINCE")
+
+
+def is_conditional(request) -> bool:
+    return any(header in request.META for header in CONDITIONAL_HEADERS)
+
+
+def make_etag(*parts) -> str:
+    """A strong `ETag` for a representation `parts` (values with a stable `repr`) identify."""
+    return quote_etag(blake2b(repr(parts).encode(), digest_size=16).hexdigest())
+
+
+def conditional_response(request, etag: str, last_modified: datetime | None = None) -> HttpResponse | None:
+    """
+    The `304 Not Modified` (or `412 Precondition Failed`) response to a conditional request
+    whose resource has the given validators, None when the full response is due.
+    """
+    response = get_conditional_response(request, etag=etag,
+                                        last_modified=int(last_modified.timestamp()) if last_modified else None)
+    if response is not None:
+        set_validators(response, etag, last_modified)
+    return response
+
+
+def set_validators(response, etag: str, last_modified: datetime | None = None):
+    response["ETag"] = etag
+    if last_modified is not None:
+        response["Last-Modified"] = http_date(last_modified.timestamp())
+    return response
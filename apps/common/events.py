@@ -0,0 +1,168 @@
+"""
+Events pushed to clients as they happen, over the server-sent event streams of
+`apps.tasks.async_views.AsyncTaskEventsView`.
+
+Code that changes something publishes an `Event` once its transaction commits
+(`publish_on_commit`), and the broker hands it to every open stream that should see it: the
+users in `Event.user_ids`, and staff. `LocalBroker` only reaches the streams of the process that
+published the event, so as soon as more than one process serves the API, set `EVENTS_REDIS_URL`:
+`RedisBroker` publishes to a Redis channel every process listens to.
+
+Delivery is best effort. Events aren't stored, so a client that was disconnected or fell too far
+behind catches up from the change feed (`apps.tasks.changes`).
+"""
+import asyncio
+import json
+import logging
+import threading
+from dataclasses import dataclass, field
+from typing import Iterable
+
+import redis
+import redis.asyncio
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class Event:
+    type: str
+    data: dict
+    # Users the event is for, staff get every event
+    user_ids: frozenset = field(default_factory=frozenset)
+
+    def encode(self) -> str:
+        return json.dumps({"type": self.type, "data": self.data, "user_ids": sorted(self.user_ids)},
+                          cls=DjangoJSONEncoder)
+
+    @classmethod
+    def decode(cls, raw: str | bytes) -> "Event":
+        message = json.loads(raw)
+        return cls(message["type"], message["data"], frozenset(message["user_ids"]))
+
+
+class Subscription:
+    """The events of one stream, queued in the event loop that reads them."""
+
+    def __init__(self, user_id, see_all: bool):
+        self.user_id = user_id
+        self.see_all = see_all
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=settings.EVENTS_QUEUE_SIZE)
+        # Set once an event was dropped because the client didn't keep up
+        self.overflowed = False
+
+    def wants(self, event: Event) -> bool:
+        return self.see_all or self.user_id in event.user_ids
+
+    def put(self, event: Event):
+        # Runs in `self.loop`, asyncio queues aren't thread-safe.
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+    async def get(self, timeout: float) -> Event | None:
+        """The next event, None when none came within `timeout` seconds."""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class LocalBroker:
+    """Hands events to the subscriptions of this process, from any thread."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.subscriptions = set()
+
+    def subscribe(self, user_id, see_all: bool = False) -> Subscription:
+        """Subscribe the running event loop to the events of `user_id`, or to all of them."""
+        subscription = Subscription(user_id, see_all)
+        with self.lock:
+            self.subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self.lock:
+            self.subscriptions.discard(subscription)
+
+    def publish(self, event: Event):
+        self.dispatch(event)
+
+    def dispatch(self, event: Event):
+        with self.lock:
+            subscriptions = [subscription for subscription in self.subscriptions if subscription.wants(event)]
+        for subscription in subscriptions:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.put, event)
+            except RuntimeError:
+                # Its event loop is closed, so nothing reads it anymore.
+                self.unsubscribe(subscription)
+
+
+class RedisBroker(LocalBroker):
+    """
+    Publishes events to a Redis channel. Every event loop with subscriptions listens to the
+    channel and hands the events to its subscriptions, the publishing process's included.
+    """
+
+    def __init__(self, url: str, channel: str):
+        super().__init__()
+        self.url = url
+        self.channel = channel
+        self.client = redis.Redis.from_url(url)
+        self.listeners = {}
+
+    def publish(self, event: Event):
+        # The write already committed, so a failure only costs the event.
+        try:
+            self.client.publish(self.channel, event.encode())
+        except redis.RedisError:
+            logger.warning("Could not publish a %s event", event.type, exc_info=True)
+
+    def subscribe(self, user_id, see_all: bool = False) -> Subscription:
+        subscription = super().subscribe(user_id, see_all)
+        with self.lock:
+            listener = self.listeners.get(subscription.loop)
+            if listener is None or listener.done():
+                self.listeners[subscription.loop] = subscription.loop.create_task(self.listen())
+        return subscription
+
+    async def listen(self):
+        while True:
+            client = redis.asyncio.Redis.from_url(self.url)
+            try:
+                async with client.pubsub() as pubsub:
+                    await pubsub.subscribe(self.channel)
+                    async for message in pubsub.listen():
+                        if message["type"] == "message":
+                            self.dispatch(Event.decode(message["data"]))
+            except redis.RedisError:
+                logger.warning("Lost the events channel, reconnecting", exc_info=True)
+                await asyncio.sleep(settings.EVENTS_REDIS_RETRY_SECONDS)
+            finally:
+                await client.aclose()
+
+
+_broker = None
+
+
+def get_broker() -> LocalBroker:
+    global _broker
+    if _broker is None:
+        if settings.EVENTS_REDIS_URL:
+            _broker = RedisBroker(settings.EVENTS_REDIS_URL, settings.EVENTS_REDIS_CHANNEL)
+        else:
+            _broker = LocalBroker()
+    return _broker
+
+
+def publish_on_commit(event_type: str, data: dict, user_ids: Iterable, using: str | None = None):
+    """Publish an event once the current transaction commits, right away outside of one."""
+    event = Event(event_type, data, frozenset(user_id for user_id in user_ids if user_id is not None))
+    transaction.on_commit(lambda: get_broker().publish(event), using=using)
@@ -0,0 +1,208 @@
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from pathlib import Path
+
+from django.conf import settings
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class MetricsRegistry:
+    """
+    Prometheus-style counters and histograms.
+
+    Updates only touch an in-process dict under an uncontended lock. To be multi-process safe
+    (gunicorn workers, the email worker), each process periodically writes a snapshot of its
+    own metrics to `<directory>/metrics-<pid>.json`, and a scrape sums the snapshots of every
+    process. Snapshots of exited processes are kept (folded into one archive file by
+    `archive`) so their counters never go backwards; clear the directory when the service is
+    redeployed.
+    """
+
+    def __init__(self, directory: str | Path | None = None, flush_interval: float = 5.0):
+        self.directory = Path(directory) if directory else None
+        self.flush_interval = flush_interval
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.pid = os.getpid()
+        self.counters = {}
+        self.histograms = {}
+        self.buckets = {}
+        self.last_flush = time.monotonic()
+
+    def inc(self, name: str, value: float = 1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.check_fork()
+            self.counters[key] = self.counters.get(key, 0) + value
+        self.maybe_flush()
+
+    def observe(self, name: str, value: float, buckets: tuple = DEFAULT_BUCKETS, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.check_fork()
+            self.buckets.setdefault(name, buckets)
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                # one count per bucket, then +Inf, sum
+                histogram = self.histograms[key] = [0] * (len(buckets) + 1) + [0.0]
+            histogram[bisect_left(self.buckets[name], value)] += 1
+            histogram[-1] += value
+        self.maybe_flush()
+
+    def check_fork(self):
+        # Metrics recorded by a parent before forking belong to the parent.
+        if os.getpid() != self.pid:
+            self.reset()
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            self.check_fork()
+            return {
+                'counters': [[name, list(labels), value] for (name, labels), value in self.counters.items()],
+                'histograms': [[name, list(labels), list(values)] for (name, labels), values in self.histograms.items()],
+                'buckets': {name: list(buckets) for name, buckets in self.buckets.items()},
+            }
+
+    def maybe_flush(self):
+        if self.directory is not None and time.monotonic() - self.last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        if self.directory is None:
+            return
+        self.last_flush = time.monotonic()
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self.directory / f'metrics-{os.getpid()}.json'
+        tmp_path = path.with_suffix('.tmp')
+        tmp_path.write_text(json.dumps(self.snapshot()))
+        os.replace(tmp_path, path)
+
+    def collect(self) -> dict:
+        """Merge the snapshots of every process, this one included."""
+        if self.directory is None:
+            return merge_snapshots([self.snapshot()])
+
+        self.flush()
+        return merge_snapshots(read_snapshots(self.directory.glob('metrics-*.json')))
+
+    def archive(self, pid: int):
+        """
+        Fold the snapshot of the exited process `pid` into `metrics-archive.json`, so workers
+        recycled by the server don't leave a file each behind while their counts stay in.
+        """
+        if self.directory is None:
+            return
+        path = self.directory / f'metrics-{pid}.json'
+        if not path.exists():
+            return
+        archive = self.directory / 'metrics-archive.json'
+        merged = merge_snapshots(read_snapshots([archive, path]))
+        tmp_path = archive.with_suffix('.tmp')
+        tmp_path.write_text(json.dumps({
+            'counters': [[name, list(labels), value] for (name, labels), value in merged['counters'].items()],
+            'histograms': [[name, list(labels), values] for (name, labels), values in merged['histograms'].items()],
+            'buckets': {name: list(buckets) for name, buckets in merged['buckets'].items()},
+        }))
+        os.replace(tmp_path, archive)
+        path.unlink()
+
+    def clear_directory(self):
+        """Remove the snapshots of a previous deployment, call before any process starts."""
+        if self.directory is not None:
+            for path in self.directory.glob('metrics-*.json'):
+                path.unlink(missing_ok=True)
+
+    def render(self) -> str:
+        """Render all metrics in the Prometheus text exposition format."""
+        collected = self.collect()
+        lines = []
+
+        for name in sorted({name for name, _ in collected['counters']}):
+            lines.append(f'# TYPE {name} counter')
+            for (metric, labels), value in sorted(collected['counters'].items()):
+                if metric == name:
+                    lines.append(f'{name}{format_labels(labels)} {format_value(value)}')
+
+        for name, hit_ratio in cache_hit_ratios(collected['counters']).items():
+            lines.append('# TYPE cache_hit_ratio gauge')
+            lines.append(f'cache_hit_ratio{format_labels((("cache", name),))} {format_value(hit_ratio)}')
+
+        for name in sorted({name for name, _ in collected['histograms']}):
+            lines.append(f'# TYPE {name} histogram')
+            bounds = collected['buckets'][name]
+            for (metric, labels), values in sorted(collected['histograms'].items()):
+                if metric != name:
+                    continue
+                cumulative = 0
+                for bound, count in zip([*map(format_value, bounds), '+Inf'], values[:-1]):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{format_labels(labels + (("le", bound),))} {cumulative}')
+                lines.append(f'{name}_sum{format_labels(labels)} {format_value(values[-1])}')
+                lines.append(f'{name}_count{format_labels(labels)} {cumulative}')
+
+        return '\n'.join(lines) + '\n'
+
+
+def read_snapshots(paths) -> list[dict]:
+    snapshots = []
+    for path in paths:
+        try:
+            snapshots.append(json.loads(path.read_text()))
+        except (OSError, ValueError):
+            continue
+    return snapshots
+
+
+def merge_snapshots(snapshots: list[dict]) -> dict:
+    counters, histograms, buckets = {}, {}, {}
+    for snapshot in snapshots:
+        buckets.update({name: tuple(values) for name, values in snapshot['buckets'].items()})
+        for name, labels, value in snapshot['counters']:
+            key = (name, tuple(tuple(label) for label in labels))
+            counters[key] = counters.get(key, 0) + value
+        for name, labels, values in snapshot['histograms']:
+            key = (name, tuple(tuple(label) for label in labels))
+            merged = histograms.setdefault(key, [0] * len(values))
+            histograms[key] = [a + b for a, b in zip(merged, values)]
+    return {'counters': counters, 'histograms': histograms, 'buckets': buckets}
+
+
+def cache_hit_ratios(counters: dict) -> dict:
+    hits, misses = {}, {}
+    for (name, labels), value in counters.items():
+        cache_name = dict(labels).get('cache')
+        if name == 'cache_hits_total':
+            hits[cache_name] = hits.get(cache_name, 0) + value
+        elif name == 'cache_misses_total':
+            misses[cache_name] = misses.get(cache_name, 0) + value
+    return {name: hits.get(name, 0) / total
+            for name in set(hits) | set(misses)
+            if (total := hits.get(name, 0) + misses.get(name, 0))}
+
+
+def format_labels(labels: tuple) -> str:
+    if not labels:
+        return ''
+    escaped = (f'{key}="{str(value).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"'
+               for key, value in labels)
+    return '{' + ','.join(escaped) + '}'
+
+
+def format_value(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+_registry = None
+
+
+def get_registry() -> MetricsRegistry:
+    global _registry
+    if _registry is None:
+        _registry = MetricsRegistry(settings.METRICS_DIR, settings.METRICS_FLUSH_INTERVAL)
+    return _registry
@@ -1,16 +1,69 @@
+import cProfile
+import json
 import logging
+import random
+import time
 import traceback
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
 
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
 from django.http import JsonResponse
 from django.utils import translation
 from django.utils.deprecation import MiddlewareMixin
 from django.utils.translation import gettext as _
+from rest_framework.permissions import SAFE_METHODS
+
+from apps.common.metrics import get_registry
+from apps.common.replicas import pin_to_primary
 
 logger = logging.getLogger(__name__)
 
 
 # Create your middleware here.
 
+# Query observers of the current request, called with `(alias, seconds)` after every query.
+# Context variables follow the request into the threads `sync_to_async` runs the ORM in, so
+# this also works for async views, unlike wrappers installed on the event loop's connections.
+query_observers = ContextVar("query_observers", default=())
+
+
+def observe_query(execute, sql, params, many, context):
+    """Database execute wrapper reporting the query duration to the current `query_observers`."""
+    observers = query_observers.get()
+    if not observers:
+        return execute(sql, params, many, context)
+
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        duration = time.perf_counter() - started
+        for observer in observers:
+            observer(context["connection"].alias, duration)
+
+
+def install_query_observer(connection, **kwargs):
+    """Install `observe_query` on a connection, connected to `connection_created`."""
+    if observe_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(observe_query)
+
+
+@contextmanager
+def track_queries(observer):
+    # Covers connections of this thread opened before `connection_created` was connected.
+    for alias in connections:
+        install_query_observer(connections[alias])
+    token = query_observers.set(query_observers.get() + (observer,))
+    try:
+        yield
+    finally:
+        query_observers.reset(token)
+
 
 class ApiMiddleware(MiddlewareMixin):
     @staticmethod
@@ -28,3 +81,250 @@ class ApiMiddleware(MiddlewareMixin):
             },
             status=500,
         )
+
+
+class RequestProfile:
+    """Timings collected for a single request, in seconds."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.view_started = None
+        self.view_time = 0.0
+        self.render_started = None
+        self.render_time = 0.0
+
+    def __call__(self, alias, duration):
+        # Registered as a query observer, see `track_queries`.
+        self.queries += 1
+        self.db_time += duration
+
+    @property
+    def serialize_time(self) -> float:
+        # DRF views spend their non-SQL time building and running serializers.
+        return max(self.view_time - self.db_time, 0.0)
+
+
+class ProfilingMiddleware:
+    """
+    Per-request SQL and timing instrumentation.
+
+    Records query count, DB time, view (serializer) time, render time and response size, and
+    returns them as a `Server-Timing` header and a JSON log line on the `apps.profiling` logger.
+    A `PROFILING_SAMPLE_RATE` share of requests also runs under cProfile, and the stats of those
+    slower than `PROFILING_SLOW_REQUEST_MS` are dumped to `PROFILING_DUMP_DIR`.
+    """
+
+    logger = logging.getLogger("apps.profiling")
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.PROFILING_ENABLED:
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        profile = request.profile = RequestProfile()
+        profiler = self.start_profiler()
+
+        with track_queries(profile):
+            try:
+                response = self.get_response(request)
+            finally:
+                if profiler is not None:
+                    profiler.disable()
+
+        return self.finish(request, response, profile, profiler)
+
+    async def __acall__(self, request):
+        # cProfile only sees the event loop thread here, not the ORM, so requests aren't sampled.
+        profile = request.profile = RequestProfile()
+        with track_queries(profile):
+            response = await self.get_response(request)
+        return self.finish(request, response, profile, None)
+
+    def finish(self, request, response, profile, profiler):
+        total = time.perf_counter() - profile.started
+        if profile.view_started is not None and not profile.view_time:
+            # Not a template response, the view ran until the response came back.
+            profile.view_time = total - (profile.view_started - profile.started)
+
+        size = None if response.streaming else len(response.content)
+        response["Server-Timing"] = self.server_timing(profile, total)
+        self.log(request, response, profile, total, size)
+
+        if profiler is not None and total * 1000 >= settings.PROFILING_SLOW_REQUEST_MS:
+            self.dump(profiler, request, total)
+
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.profile.view_started = time.perf_counter()
+
+    def process_template_response(self, request, response):
+        # DRF responses are rendered after the view returns, split that time out.
+        profile = request.profile
+        now = time.perf_counter()
+        if profile.view_started is not None:
+            profile.view_time = now - profile.view_started
+        profile.render_started = now
+        response.add_post_render_callback(lambda r: self.rendered(profile))
+        return response
+
+    @staticmethod
+    def rendered(profile):
+        profile.render_time = time.perf_counter() - profile.render_started
+
+    @staticmethod
+    def start_profiler():
+        if random.random() >= settings.PROFILING_SAMPLE_RATE:
+            return None
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Another profiler is already active in this process (Python 3.12+).
+            return None
+        return profiler
+
+    @staticmethod
+    def server_timing(profile, total) -> str:
+        return ", ".join([
+            f'db;dur={profile.db_time * 1000:.1f};desc="{profile.queries} queries"',
+            f"serialize;dur={profile.serialize_time * 1000:.1f}",
+            f"render;dur={profile.render_time * 1000:.1f}",
+            f"total;dur={total * 1000:.1f}",
+        ])
+
+    def log(self, request, response, profile, total, size):
+        match = request.resolver_match
+        self.logger.info(json.dumps({
+            "method": request.method,
+            "path": request.path,
+            "view": match.view_name if match else None,
+            "status": response.status_code,
+            "queries": profile.queries,
+            "db_ms": round(profile.db_time * 1000, 2),
+            "serialize_ms": round(profile.serialize_time * 1000, 2),
+            "render_ms": round(profile.render_time * 1000, 2),
+            "total_ms": round(total * 1000, 2),
+            "response_bytes": size,
+        }))
+
+    @staticmethod
+    def dump(profiler, request, total):
+        match = request.resolver_match
+        name = (match.view_name if match else "unresolved").replace(":", "_").replace("/", "_")
+        dump_dir = Path(settings.PROFILING_DUMP_DIR)
+        dump_dir.mkdir(parents=True, exist_ok=True)
+        profiler.dump_stats(dump_dir / f"{time.strftime('%Y%m%d-%H%M%S')}-{name}-{total * 1000:.0f}ms.prof")
+
+
+class MetricsMiddleware:
+    """
+    Records request latency per route (`http_request_duration_seconds`) and the count and
+    duration of the database queries the request runs (`db_query_duration_seconds`), see
+    `apps.common.metrics`. Place it first so the latency covers every other middleware.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.METRICS_ENABLED:
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        registry = get_registry()
+        started = time.perf_counter()
+        status = 500
+
+        with track_queries(self.query_observer(registry)):
+            try:
+                response = self.get_response(request)
+                status = response.status_code
+            finally:
+                self.observe_request(registry, request, started, status)
+
+        return response
+
+    async def __acall__(self, request):
+        registry = get_registry()
+        started = time.perf_counter()
+        status = 500
+
+        with track_queries(self.query_observer(registry)):
+            try:
+                response = await self.get_response(request)
+                status = response.status_code
+            finally:
+                self.observe_request(registry, request, started, status)
+
+        return response
+
+    @staticmethod
+    def observe_request(registry, request, started, status):
+        match = request.resolver_match
+        registry.observe(
+            "http_request_duration_seconds",
+            time.perf_counter() - started,
+            route=match.view_name if match else "unmatched",
+            method=request.method,
+            status=f"{status // 100}xx",
+        )
+
+    @staticmethod
+    def query_observer(registry):
+        def observe(alias, duration):
+            registry.observe("db_query_duration_seconds", duration, alias=alias)
+
+        return observe
+
+
+class ReplicaPinningMiddleware:
+    """
+    After a successful write (an unsafe method answered below 400), reads of the same client
+    go to the primary for `REPLICA_STICKY_SECONDS`, so views reading from replicas always
+    show it its own writes. See `apps.common.replicas`.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        response = self.get_response(request)
+        if self.wrote(request, response):
+            pin_to_primary(request)
+        return response
+
+    async def __acall__(self, request):
+        response = await self.get_response(request)
+        if self.wrote(request, response):
+            await sync_to_async(pin_to_primary)(request)
+        return response
+
+    @staticmethod
+    def wrote(request, response) -> bool:
+        return bool(settings.REPLICA_DATABASES) and request.method not in SAFE_METHODS and response.status_code < 400
@@ -0,0 +1,274 @@
+import base64
+import binascii
+import json
+from datetime import date, datetime
+
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db.models import Q
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import BasePagination, LimitOffsetPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Keyset (seek) pagination over the queryset's current ordering.
+
+    The cursor holds the ordering values of the last row of the page, and the next page
+    is fetched with `WHERE (ordering) > (cursor)` instead of `OFFSET`, so every page costs
+    the same no matter how deep the client is. No `COUNT(*)` query is issued.
+
+    `tie_breaker` (a unique field) is always appended to the ordering, in the direction of
+    the last ordering field, so rows with equal values are never skipped or repeated.
+    """
+
+    page_size = api_settings.PAGE_SIZE
+    max_page_size = 1000
+    page_size_query_param = 'limit'
+    cursor_query_param = 'cursor'
+    ordering = ('-id',)
+    ordering_fields = ('id', 'created_at', 'status', 'title')
+    tie_breaker = 'id'
+
+    invalid_cursor_message = _('Invalid cursor')
+    invalid_ordering_message = _('Cursor pagination does not support ordering by "{field}".')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        queryset, reverse, position = self.page_queryset(queryset, request, view)
+        return self.set_page(list(queryset), reverse, position)
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """`paginate_queryset` for async views, fetching the page with the async ORM."""
+        queryset, reverse, position = self.page_queryset(queryset, request, view)
+        return self.set_page([row async for row in queryset], reverse, position)
+
+    def page_queryset(self, queryset, request, view):
+        """Return the queryset of the requested page (plus one row), and the decoded cursor."""
+        self.request = request
+        self.limit = self.get_limit(request)
+        self.ordering = self.get_ordering(queryset, view)
+
+        reverse, position = self.decode_cursor(request)
+
+        if position is not None:
+            position = self.parse_position(position, queryset.model)
+            queryset = queryset.filter(self.get_seek_filter(position, reverse))
+
+        order_by = [self.order_by_expression(field, descending ^ reverse) for field, descending in self.ordering]
+        return queryset.order_by(*order_by)[:self.limit + 1], reverse, position
+
+    def set_page(self, rows: list, reverse: bool, position: list | None) -> list:
+        has_more = len(rows) > self.limit
+        rows = rows[:self.limit]
+        if reverse:
+            rows.reverse()
+
+        self.page = rows
+        self.has_next = has_more if not reverse else position is not None
+        self.has_previous = has_more if reverse else position is not None
+        return rows
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                'name': self.cursor_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'Opaque cursor from the `next`/`previous` links. Pass it empty to start.',
+                'schema': {'type': 'string'},
+            },
+            {
+                'name': self.page_size_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'Number of results to return per page.',
+                'schema': {'type': 'integer'},
+            },
+        ]
+
+    def get_limit(self, request) -> int:
+        try:
+            limit = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except (TypeError, ValueError):
+            return self.page_size
+        return min(max(limit, 1), self.max_page_size)
+
+    def get_ordering(self, queryset, view) -> list[tuple[str, bool]]:
+        """Return the `(field, descending)` pairs the page is ordered by, tie breaker included."""
+        ordering = queryset.query.order_by or getattr(view, 'ordering', None) or self.ordering
+        if isinstance(ordering, str):
+            ordering = (ordering,)
+
+        pairs = []
+        for term in ordering:
+            if not isinstance(term, str):
+                raise ValidationError(self.invalid_ordering_message.format(field=term))
+            field = term.lstrip('-')
+            if field == 'pk':
+                field = self.tie_breaker
+            if field not in self.ordering_fields:
+                raise ValidationError(self.invalid_ordering_message.format(field=field))
+            pairs.append((field, term.startswith('-')))
+
+        if self.tie_breaker not in [field for field, _ in pairs]:
+            pairs.append((self.tie_breaker, pairs[-1][1] if pairs else False))
+        else:
+            # Anything after the unique field can never break a tie.
+            pairs = pairs[:[field for field, _ in pairs].index(self.tie_breaker) + 1]
+
+        return pairs
+
+    def get_seek_filter(self, position: list, reverse: bool) -> Q:
+        """
+        Build `(a, b, c) > (x, y, z)` for mixed sort directions as
+        `a > x OR (a = x AND b > y) OR (a = x AND b = y AND c > z)`.
+
+        The leading `a >= x` is redundant but lets the database start an index range scan.
+        """
+        seek = Q()
+        equal = Q()
+        for (field, descending), value in zip(self.ordering, position):
+            lookup = 'lt' if descending ^ reverse else 'gt'
+            seek |= equal & Q(**{f'{field}__{lookup}': value})
+            equal &= Q(**{field: value})
+
+        first_field, first_descending = self.ordering[0]
+        leading = Q(**{f'{first_field}__{"lte" if first_descending ^ reverse else "gte"}': position[0]})
+        return leading & seek
+
+    @staticmethod
+    def order_by_expression(field: str, descending: bool) -> str:
+        return f'-{field}' if descending else field
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(False, self.page[-1])
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            # Walked past the end, start over from the first page.
+            return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param, '')
+        return self.encode_cursor(True, self.page[0])
+
+    def encode_cursor(self, reverse: bool, row) -> str:
+        # Rows are model instances, or dicts for the views serving `values()` (apps.common.values)
+        position = [self.serialize_value(row[field] if isinstance(row, dict) else getattr(row, field))
+                    for field, _ in self.ordering]
+        payload = json.dumps({'r': int(reverse), 'p': position, 'o': self.ordering_key()}, separators=(',', ':'))
+        token = base64.urlsafe_b64encode(payload.encode()).decode()
+        return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param, token)
+
+    def decode_cursor(self, request) -> tuple[bool, list | None]:
+        token = request.query_params.get(self.cursor_query_param)
+        if not token:
+            return False, None
+
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(token.encode()))
+            reverse, position, ordering = bool(payload['r']), payload['p'], payload['o']
+        except (TypeError, ValueError, KeyError, binascii.Error):
+            raise NotFound(self.invalid_cursor_message)
+
+        # A cursor is only meaningful for the ordering it was issued for.
+        if ordering != self.ordering_key() or not isinstance(position, list):
+            raise NotFound(self.invalid_cursor_message)
+
+        return reverse, position
+
+    def parse_position(self, position: list, model) -> list:
+        """The cursor's values as the Python values of the ordering fields, a 404 when they aren't valid."""
+        if len(position) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        try:
+            values = []
+            for (field, _), value in zip(self.ordering, position):
+                # Cursors only hold strings and integers, and the ordering fields aren't nullable.
+                if type(value) not in (str, int):
+                    raise ValueError(value)
+                values.append(model._meta.get_field(field).to_python(value))
+        except (TypeError, ValueError, DjangoValidationError):
+            raise NotFound(self.invalid_cursor_message)
+        return values
+
+    def ordering_key(self) -> str:
+        return ','.join(self.order_by_expression(field, descending) for field, descending in self.ordering)
+
+    @staticmethod
+    def serialize_value(value):
+        if isinstance(value, (datetime, date)):
+            return value.isoformat()
+        return value
+
+
+class OptionalKeysetPagination(LimitOffsetPagination):
+    """
+    `LimitOffsetPagination` by default, keyset pagination when the client opts in.
+
+    Sending a `cursor` query parameter (empty for the first page) switches the request to
+    `KeysetPagination`; existing clients keep getting `count`/`offset` pages.
+    """
+
+    keyset_class = KeysetPagination
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = None
+        if self.keyset_class.cursor_query_param in request.query_params:
+            self.keyset = self.keyset_class()
+            return self.keyset.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """`paginate_queryset` for async views, counting and fetching with the async ORM."""
+        self.keyset = None
+        if self.keyset_class.cursor_query_param in request.query_params:
+            self.keyset = self.keyset_class()
+            return await self.keyset.apaginate_queryset(queryset, request, view)
+
+        self.request = request
+        self.limit = self.get_limit(request)
+        if self.limit is None:
+            return None
+
+        self.count = await queryset.acount()
+        self.offset = self.get_offset(request)
+        if self.count > self.limit and self.template is not None:
+            self.display_page_controls = True
+
+        if self.count == 0 or self.offset > self.count:
+            return []
+        return [row async for row in queryset[self.offset:self.offset + self.limit]]
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+    def get_schema_operation_parameters(self, view):
+        parameters = super().get_schema_operation_parameters(view)
+        names = {parameter['name'] for parameter in parameters}
+        return parameters + [parameter for parameter in self.keyset_class().get_schema_operation_parameters(view)
+                             if parameter['name'] not in names]
@@ -0,0 +1,31 @@
+import orjson
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    `JSONRenderer` output encoded with orjson, several times faster on large responses.
+
+    Dates, decimals, lazy strings and the other types orjson doesn't encode like DRF are
+    handed to DRF's encoder, so responses stay byte for byte the same. Indented output (the
+    browsable API, an `indent` media type parameter), settings orjson can't honour and data
+    it can't encode go through `JSONRenderer`.
+    """
+
+    options = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+    default = JSONEncoder().default
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if self.ensure_ascii or not self.compact or self.get_indent(accepted_media_type, renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+        if data is None:
+            return b""
+
+        try:
+            content = orjson.dumps(data, default=self.default, option=self.options)
+        except orjson.JSONEncodeError:
+            # Integers over 64 bits, for example
+            return super().render(data, accepted_media_type, renderer_context)
+        # Escaped by `JSONRenderer` too, they end lines in JavaScript.
+        return content.replace(b"\xe2\x80\xa8", b"\\u2028").replace(b"\xe2\x80\xa9", b"\\u2029")
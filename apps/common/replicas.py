@@ -0,0 +1,129 @@
+"""
+Read replicas for the views that opt in with `ReplicaReadMixin`.
+
+Replicas are the database aliases in `settings.REPLICA_DATABASES`. Everything else reads
+from and writes to the primary (`default`), so a view only reads from a replica when it
+asks for it, and only for safe (read-only) requests. A replica is skipped while it lags
+more than `REPLICA_MAX_LAG` seconds behind the primary, and a client that just wrote reads
+from the primary for `REPLICA_STICKY_SECONDS`, so it always sees its own writes.
+"""
+import hashlib
+import random
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+from rest_framework.permissions import SAFE_METHODS
+
+# Alias reads go to for the current request, None for the primary. A context variable, so
+# the ORM calls async views run in `sync_to_async` threads see it too.
+read_alias = ContextVar('read_alias', default=None)
+
+_lag_lock = threading.Lock()
+_lag_checks = {}
+
+
+class ReplicaRouter:
+    """Routes reads to `read_alias` when a view set it, and every write to the primary."""
+
+    def db_for_read(self, model, **hints):
+        return read_alias.get()
+
+    def db_for_write(self, model, **hints):
+        # Explicit, otherwise Django would save an instance read from a replica back to it.
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *settings.REPLICA_DATABASES}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas get the schema through replication.
+        if db in settings.REPLICA_DATABASES:
+            return False
+        return None
+
+
+def replication_lag(alias: str) -> float:
+    """Seconds `alias` lags behind the primary, infinite when it can't be reached."""
+    connection = connections[alias]
+    if connection.vendor != 'postgresql':
+        return 0.0
+    try:
+        with connection.cursor() as cursor:
+            # An idle primary writes nothing, so a replica that replayed everything it
+            # received isn't lagging however old its last replayed transaction is.
+            cursor.execute("SELECT CASE WHEN NOT pg_is_in_recovery() "
+                           "OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+                           "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())::float, "
+                           "'Infinity') END")
+            return float(cursor.fetchone()[0])
+    except DatabaseError:
+        return float('inf')
+
+
+def current_lag(alias: str) -> float:
+    """`replication_lag`, measured at most once per `REPLICA_LAG_CHECK_INTERVAL` per process."""
+    now = time.monotonic()
+    with _lag_lock:
+        checked = _lag_checks.get(alias)
+    if checked is not None and now - checked[0] < settings.REPLICA_LAG_CHECK_INTERVAL:
+        return checked[1]
+
+    lag = replication_lag(alias)
+    with _lag_lock:
+        _lag_checks[alias] = (now, lag)
+    return lag
+
+
+def client_key(request) -> str:
+    """Who a request comes from: its bearer token, or its address for anonymous requests."""
+    authorization = request.META.get('HTTP_AUTHORIZATION')
+    if authorization:
+        return 'token:' + hashlib.sha256(authorization.encode()).hexdigest()
+    return 'ip:' + request.META.get('REMOTE_ADDR', '')
+
+
+def pin_key(request) -> str:
+    return f'replicas:pin:{client_key(request)}'
+
+
+def pin_to_primary(request):
+    cache.set(pin_key(request), True, timeout=settings.REPLICA_STICKY_SECONDS)
+
+
+def choose_read_alias(request) -> str | None:
+    """The replica to read from for a request, None to read from the primary."""
+    if not settings.REPLICA_DATABASES or request.method not in SAFE_METHODS:
+        return None
+    if cache.get(pin_key(request)):
+        return None
+
+    replicas = [alias for alias in settings.REPLICA_DATABASES if current_lag(alias) <= settings.REPLICA_MAX_LAG]
+    return random.choice(replicas) if replicas else None
+
+
+@contextmanager
+def reading_from(alias: str | None):
+    token = read_alias.set(alias)
+    try:
+        yield
+    finally:
+        read_alias.reset(token)
+
+
+class ReplicaReadMixin:
+    """
+    Serve the safe requests of a view from a replica. Only for views whose reads may be a
+    couple of seconds stale, like analytics and lists.
+    """
+
+    def dispatch(self, request, *args, **kwargs):
+        with reading_from(choose_read_alias(request)):
+            return super().dispatch(request, *args, **kwargs)
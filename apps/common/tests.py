@@ -1,13 +1,32 @@
+import asyncio
 import json
+import tempfile
+from decimal import Decimal
+from pathlib import Path
+from unittest import mock
 
+from asgiref.sync import sync_to_async
 from django.contrib.auth.models import User
-from django.http import JsonResponse
-from django.test import RequestFactory, TestCase
+from django.http import HttpResponse, JsonResponse
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+from django.test import RequestFactory, TestCase, override_settings
 from django.urls import path
+from django.utils import timezone
+from django.utils.translation import gettext_lazy
+from rest_framework import serializers
+from rest_framework.renderers import JSONRenderer
 from rest_framework.reverse import reverse
 from rest_framework.test import APIClient
 
-from apps.common.middlewares import ApiMiddleware
+from apps.common.cache import InstrumentedLocMemCache
+from apps.common.events import Event, LocalBroker, get_broker, publish_on_commit
+from apps.common.metrics import MetricsRegistry, get_registry
+from apps.common.renderers import FastJSONRenderer
+from apps.common.middlewares import ApiMiddleware, ProfilingMiddleware
+from apps.common.replicas import ReplicaRouter, choose_read_alias, pin_to_primary, reading_from
+from apps.common.values import ValuesSerializer, ordering_columns
 
 
 class TestCommon(TestCase):
@@ -66,3 +85,348 @@ class ApiMiddlewareExceptionTestCase(TestCase):
         self.assertIn("detail", content)
         self.assertEqual(content["exception"], "Test exception")
         self.assertEqual(content["detail"], "Something Went Wrong. Please contact support")
+
+
+
+def view_with_queries(request):
+    list(User.objects.all())
+    list(User.objects.filter(is_staff=True))
+    return HttpResponse("ok")
+
+
+class ProfilingMiddlewareTestCase(TestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.middleware = ProfilingMiddleware(self.get_response)
+
+    def get_response(self, request):
+        # What the handler does between the middleware and the view
+        self.middleware.process_view(request, view_with_queries, (), {})
+        return view_with_queries(request)
+
+    def call(self, request):
+        request.resolver_match = None
+        return self.middleware(request)
+
+    def test_server_timing_header_reports_queries(self):
+        response = self.call(self.factory.get("/profiled/"))
+
+        self.assertIn('db;dur=', response["Server-Timing"])
+        self.assertIn('desc="2 queries"', response["Server-Timing"])
+        self.assertIn("total;dur=", response["Server-Timing"])
+
+    def test_logs_structured_line(self):
+        with self.assertLogs("apps.profiling", level="INFO") as logs:
+            self.call(self.factory.get("/profiled/"))
+
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record["queries"], 2)
+        self.assertEqual(record["status"], 200)
+        self.assertEqual(record["response_bytes"], 2)
+        self.assertEqual(record["path"], "/profiled/")
+
+    def test_dumps_cprofile_stats_for_sampled_slow_requests(self):
+        with tempfile.TemporaryDirectory() as dump_dir:
+            with override_settings(PROFILING_SAMPLE_RATE=1.0, PROFILING_SLOW_REQUEST_MS=0, PROFILING_DUMP_DIR=dump_dir):
+                self.call(self.factory.get("/profiled/"))
+
+            self.assertEqual(len(list(Path(dump_dir).glob("*.prof"))), 1)
+
+    def test_does_not_dump_fast_requests(self):
+        with tempfile.TemporaryDirectory() as dump_dir:
+            with override_settings(PROFILING_SAMPLE_RATE=1.0, PROFILING_SLOW_REQUEST_MS=60000,
+                                   PROFILING_DUMP_DIR=dump_dir):
+                self.call(self.factory.get("/profiled/"))
+
+            self.assertEqual(list(Path(dump_dir).glob("*.prof")), [])
+
+    async def test_counts_queries_of_async_views(self):
+        async def get_response(request):
+            # The ORM runs in a `sync_to_async` thread, not on the event loop
+            return await sync_to_async(view_with_queries)(request)
+
+        middleware = ProfilingMiddleware(get_response)
+        request = self.factory.get("/profiled/")
+        request.resolver_match = None
+
+        response = await middleware(request)
+
+        self.assertIn('desc="2 queries"', response["Server-Timing"])
+
+    def test_api_response_has_server_timing(self):
+        response = APIClient().get("/api/tasks/list/")
+
+        self.assertIn("serialize;dur=", response["Server-Timing"])
+        self.assertIn("render;dur=", response["Server-Timing"])
+
+
+class MetricsTestCase(TestCase):
+    def test_registry_renders_counters_and_histograms(self):
+        # arrange
+        registry = MetricsRegistry()
+
+        # act
+        registry.inc("emails_sent_total", 3)
+        registry.observe("http_request_duration_seconds", 0.02, route="health_view")
+        registry.observe("http_request_duration_seconds", 7, route="health_view")
+        output = registry.render()
+
+        # assert
+        self.assertIn("# TYPE emails_sent_total counter\nemails_sent_total 3\n", output)
+        self.assertIn('http_request_duration_seconds_bucket{route="health_view",le="0.01"} 0\n', output)
+        self.assertIn('http_request_duration_seconds_bucket{route="health_view",le="0.025"} 1\n', output)
+        self.assertIn('http_request_duration_seconds_bucket{route="health_view",le="+Inf"} 2\n', output)
+        self.assertIn('http_request_duration_seconds_count{route="health_view"} 2\n', output)
+        self.assertIn('http_request_duration_seconds_sum{route="health_view"} 7.02\n', output)
+
+    def test_registry_aggregates_processes(self):
+        with tempfile.TemporaryDirectory() as metrics_dir:
+            # arrange
+            other_process = MetricsRegistry()
+            other_process.inc("cache_hits_total", 3, cache="default")
+            other_process.observe("db_query_duration_seconds", 0.001, alias="default")
+            Path(metrics_dir, "metrics-1.json").write_text(json.dumps(other_process.snapshot()))
+            registry = MetricsRegistry(metrics_dir)
+
+            # act
+            registry.inc("cache_hits_total", cache="default")
+            registry.inc("cache_misses_total", cache="default")
+            registry.observe("db_query_duration_seconds", 0.001, alias="default")
+            output = registry.render()
+
+        # assert
+        self.assertIn('cache_hits_total{cache="default"} 4\n', output)
+        self.assertIn('cache_hit_ratio{cache="default"} 0.8\n', output)
+        self.assertIn('db_query_duration_seconds_count{alias="default"} 2\n', output)
+
+    def test_archive_folds_exited_processes_into_one_file(self):
+        with tempfile.TemporaryDirectory() as metrics_dir:
+            # arrange
+            for pid in (1, 2):
+                exited = MetricsRegistry()
+                exited.inc("emails_sent_total", 2)
+                Path(metrics_dir, f"metrics-{pid}.json").write_text(json.dumps(exited.snapshot()))
+            registry = MetricsRegistry(metrics_dir)
+
+            # act
+            registry.archive(1)
+            registry.archive(2)
+            files = sorted(path.name for path in Path(metrics_dir).iterdir())
+            output = registry.render()
+
+        # assert
+        self.assertEqual(files, ["metrics-archive.json"])
+        self.assertIn("emails_sent_total 4\n", output)
+
+    def test_cache_counts_hits_and_misses(self):
+        # arrange
+        cache = InstrumentedLocMemCache("metrics-test", {"METRICS_NAME": "metrics-test"})
+        cache.set("a", 1)
+        counters = get_registry().counters
+        hits = counters.get(("cache_hits_total", (("cache", "metrics-test"),)), 0)
+        misses = counters.get(("cache_misses_total", (("cache", "metrics-test"),)), 0)
+
+        # act
+        self.assertEqual(cache.get("a"), 1)
+        self.assertEqual(cache.get("b", "default"), "default")
+        self.assertEqual(cache.get_many(["a", "b", "c"]), {"a": 1})
+
+        # assert
+        self.assertEqual(counters[("cache_hits_total", (("cache", "metrics-test"),))] - hits, 2)
+        self.assertEqual(counters[("cache_misses_total", (("cache", "metrics-test"),))] - misses, 3)
+
+    def test_metrics_view_reports_requests_per_route(self):
+        # arrange
+        client = APIClient()
+        client.force_authenticate(user=User.objects.create(username="metrics"))
+        client.get(reverse("task_list_details"))
+
+        # act
+        response = client.get(reverse("metrics_view"))
+
+        # assert
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response["Content-Type"].startswith("text/plain"))
+        content = response.content.decode()
+        self.assertIn('http_request_duration_seconds_count{method="GET",route="task_list_details",status="2xx"}', content)
+        self.assertIn("db_query_duration_seconds_bucket", content)
+
+
+@override_settings(REPLICA_DATABASES=["replica_1", "replica_2"], REPLICA_MAX_LAG=2)
+class ReplicaTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.lags = {"replica_1": 0.5, "replica_2": 0.5}
+        patcher = mock.patch("apps.common.replicas.current_lag", side_effect=lambda alias: self.lags[alias])
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_reads_go_to_a_replica_that_keeps_up(self):
+        # arrange
+        self.lags["replica_1"] = 30
+        request = RequestFactory().get("/api/tasks/list/")
+
+        # act
+        alias = choose_read_alias(request)
+
+        # assert
+        self.assertEqual(alias, "replica_2")
+
+    def test_reads_go_to_the_primary_when_every_replica_lags(self):
+        # arrange
+        self.lags.update(replica_1=30, replica_2=float("inf"))
+
+        # act
+        alias = choose_read_alias(RequestFactory().get("/api/tasks/list/"))
+
+        # assert
+        self.assertIsNone(alias)
+
+    def test_writes_and_pinned_clients_use_the_primary(self):
+        # arrange
+        factory = RequestFactory()
+        pin_to_primary(factory.get("/", HTTP_AUTHORIZATION="Bearer writer"))
+
+        # act
+        post_alias = choose_read_alias(factory.post("/api/tasks/"))
+        pinned_alias = choose_read_alias(factory.get("/", HTTP_AUTHORIZATION="Bearer writer"))
+        other_alias = choose_read_alias(factory.get("/", HTTP_AUTHORIZATION="Bearer reader"))
+
+        # assert
+        self.assertIsNone(post_alias)
+        self.assertIsNone(pinned_alias)
+        self.assertIn(other_alias, ["replica_1", "replica_2"])
+
+    def test_successful_write_pins_the_client(self):
+        # arrange
+        client = APIClient()
+        client.force_authenticate(user=User.objects.create(username="writer"))
+
+        # act
+        response = client.post(reverse("tasks-list"), {"title": "Replicated", "description": "Read it back"}, format="json")
+
+        # assert
+        self.assertEqual(response.status_code, 201)
+        self.assertIsNone(choose_read_alias(RequestFactory().get("/", REMOTE_ADDR="127.0.0.1")))
+
+    def test_router_reads_from_the_chosen_alias_and_writes_to_the_primary(self):
+        # arrange
+        router = ReplicaRouter()
+
+        # act
+        with reading_from("replica_1"):
+            read, write = router.db_for_read(User), router.db_for_write(User)
+        read_outside = router.db_for_read(User)
+
+        # assert
+        self.assertEqual((read, write, read_outside), ("replica_1", "default", None))
+        self.assertFalse(router.allow_migrate("replica_1", "tasks"))
+
+
+class EventsTestCase(TestCase):
+    async def test_broker_delivers_events_to_their_users_and_staff(self):
+        # arrange
+        broker = LocalBroker()
+        mine, staff, other = broker.subscribe(1), broker.subscribe(2, see_all=True), broker.subscribe(3)
+        event = Event("task.assigned", {"task_id": 7}, frozenset({1}))
+
+        # act
+        # Published from another thread, like the sync views do
+        await sync_to_async(broker.publish, thread_sensitive=False)(event)
+
+        # assert
+        self.assertEqual(await mine.get(1), event)
+        self.assertEqual(await staff.get(1), event)
+        self.assertIsNone(await other.get(0.01))
+
+    @override_settings(EVENTS_QUEUE_SIZE=1)
+    async def test_subscription_overflows_when_its_client_falls_behind(self):
+        # arrange
+        broker = LocalBroker()
+        subscription = broker.subscribe(1)
+
+        # act
+        for task_id in (1, 2):
+            broker.publish(Event("task.assigned", {"task_id": task_id}, frozenset({1})))
+        await asyncio.sleep(0)
+
+        # assert
+        self.assertTrue(subscription.overflowed)
+        self.assertEqual((await subscription.get(1)).data, {"task_id": 1})
+
+    def test_events_are_published_once_the_transaction_commits(self):
+        # arrange
+        published = []
+
+        # act
+        with mock.patch.object(get_broker(), "publish", published.append):
+            with self.captureOnCommitCallbacks() as callbacks, transaction.atomic():
+                publish_on_commit("task.assigned", {"task_id": 7}, [1, None])
+            before_commit = list(published)
+            callbacks[0]()
+
+        # assert
+        self.assertEqual(before_commit, [])
+        self.assertEqual(published, [Event("task.assigned", {"task_id": 7}, frozenset({1}))])
+        # What `RedisBroker` sends through the channel
+        self.assertEqual(Event.decode(published[0].encode()), published[0])
+
+
+class UserRowSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = User
+        fields = ("id", "username", "is_staff", "date_joined", "last_login")
+
+
+class ValuesSerializerTestCase(TestCase):
+    def test_renders_rows_like_the_serializer(self):
+        # arrange
+        User.objects.create(username="never-logged-in")
+        User.objects.create(username="logged-in", is_staff=True, last_login=timezone.now())
+        queryset = User.objects.order_by("id")
+
+        # act
+        with timezone.override("Europe/Bucharest"):
+            expected = UserRowSerializer(queryset, many=True).data
+            data = ValuesSerializer(UserRowSerializer).serialize(queryset)
+
+        # assert
+        self.assertEqual(data, expected)
+        self.assertIsNone(data[0]["last_login"])
+
+    def test_rejects_fields_values_cant_render(self):
+        class NestedSerializer(serializers.ModelSerializer):
+            groups = serializers.StringRelatedField(many=True)
+
+            class Meta:
+                model = User
+                fields = ("id", "groups")
+
+        with self.assertRaises(ImproperlyConfigured):
+            ValuesSerializer(NestedSerializer)
+
+    def test_ordering_columns_include_the_pk(self):
+        self.assertEqual(ordering_columns(User.objects.order_by("-username", "pk")), ["username", "id", "id"])
+        self.assertEqual(ordering_columns(User.objects.all()), ["id"])
+
+
+class FastJSONRendererTestCase(TestCase):
+    def test_renders_like_the_json_renderer(self):
+        # arrange
+        data = {
+            "at": timezone.now(),
+            "day": timezone.now().date(),
+            "amount": Decimal("1.50"),
+            "label": gettext_lazy("Invalid cursor"),
+            "text": "line\u2028separator ț",
+            1: [None, True, 1.5, (1, 2)],
+        }
+
+        # act
+        content = FastJSONRenderer().render(data)
+        indented = FastJSONRenderer().render(data, "application/json; indent=2")
+
+        # assert
+        self.assertEqual(content, JSONRenderer().render(data))
+        self.assertEqual(indented, JSONRenderer().render(data, "application/json; indent=2"))
+        self.assertEqual(FastJSONRenderer().render(None), b"")
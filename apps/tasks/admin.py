@@ -1,6 +1,6 @@
 from django.contrib import admin
 
-from apps.tasks.models import TimeLog
+from apps.tasks.models import TimeLog, OutboxEmail
 
 
 # Register your models here.
@@ -11,4 +11,17 @@ class TimeLogAdmin(admin.ModelAdmin):
         "start_time",
         "end_time",
         "duration"
-    )
\ No newline at end of file
+    )
+
+
+@admin.register(OutboxEmail)
+class OutboxEmailAdmin(admin.ModelAdmin):
+    list_display = (
+        "recipient",
+        "subject",
+        "status",
+        "attempts",
+        "next_attempt_at",
+        "sent_at"
+    )
+    list_filter = ("status",)
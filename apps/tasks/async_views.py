@@ -0,0 +1,234 @@
+"""
+Async versions of the read-heavy task endpoints, served under `/api/tasks/async/` when the
+project runs under ASGI (`DjangoProject.asgi`).
+
+DRF views are synchronous, so these are plain Django async views that reuse the DRF
+serializers, filters and paginators of their sync counterparts and return the same JSON.
+Queries go through the async ORM, so a worker keeps serving other requests while one
+waits on the database. `AsyncTaskEventsView` streams task events, which only ASGI can serve.
+"""
+import json
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.handlers.asgi import ASGIRequest
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Sum
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.views import View
+from rest_framework import exceptions
+from rest_framework.request import Request
+
+from apps.common.conditional import conditional_response, is_conditional, set_validators
+from apps.common.events import Event, get_broker
+from apps.common.helpers import optimize_queryset_for_serializer
+from apps.common.renderers import FastJSONRenderer
+from apps.common.replicas import choose_read_alias, reading_from
+from apps.common.values import collection_etag, ordering_columns, values_serializer
+from apps.users.authentication import CachedJWTAuthentication
+from .cache import acached_analytics
+from .conditional import TaskValidators
+from .models import Task
+from .periods import PERIOD_QUERY_PARAM, Period, parse_period
+from .serializers import CommentSerializer, TaskDetailsSerializer, TaskDurationSerializer, TimeLogSerializer
+from .views import LastMontLoggedTimeDurationView, TaskListDetailsView, TasksListDurationView, TopTasksLastMonthView
+
+
+class AsyncAPIView(View):
+    """
+    The parts of DRF's `APIView` these endpoints need: JWT authentication (anonymous requests
+    are allowed, like the sync views), DRF exceptions turned into JSON error responses and a
+    DRF `Request` wrapper for filters and paginators.
+    """
+    http_method_names = ['get', 'options']
+    authenticator = CachedJWTAuthentication()
+    renderer = FastJSONRenderer()
+    media_type = renderer.media_type
+
+    # See `apps.common.replicas.ReplicaReadMixin`.
+    read_from_replica = False
+
+    async def dispatch(self, request, *args, **kwargs):
+        self.drf_request = Request(request)
+        alias = None
+        if self.read_from_replica and settings.REPLICA_DATABASES:
+            alias = await sync_to_async(choose_read_alias)(request)
+
+        with reading_from(alias):
+            try:
+                await self.authenticate(request)
+                return await super().dispatch(request, *args, **kwargs)
+            except Http404:
+                return self.error_response(exceptions.NotFound())
+            except exceptions.APIException as e:
+                return self.error_response(e)
+
+    async def authenticate(self, request):
+        # Looking the user up may query the cache or the database, so the sync authenticator runs in a
+        # thread. Like in DRF the user only comes from the token, replacing the lazy session user of
+        # `AuthenticationMiddleware`.
+        result = await sync_to_async(self.authenticator.authenticate)(self.drf_request)
+        self.drf_request.user, self.drf_request.auth = result or (AnonymousUser(), None)
+
+    def render(self, data, status=200) -> HttpResponse:
+        return HttpResponse(self.renderer.render(data), status=status, content_type=self.media_type)
+
+    def error_response(self, exc: exceptions.APIException) -> HttpResponse:
+        data = exc.detail if isinstance(exc.detail, (list, dict)) else {'detail': exc.detail}
+        response = self.render(data, status=exc.status_code)
+        if isinstance(exc, (exceptions.NotAuthenticated, exceptions.AuthenticationFailed)):
+            response['WWW-Authenticate'] = self.authenticator.authenticate_header(self.drf_request)
+        return response
+
+
+async def aget_object_or_404(queryset, **kwargs):
+    try:
+        return await queryset.aget(**kwargs)
+    except queryset.model.DoesNotExist:
+        raise Http404
+
+
+class AsyncTaskDetailView(AsyncAPIView):
+    async def get(self, request, pk):
+        validators = TaskValidators('detail', self.media_type)
+        if (response := await validators.anot_modified(request, pk)) is not None:
+            return response
+        queryset = optimize_queryset_for_serializer(Task.objects.all(), TaskDetailsSerializer)
+        task = await aget_object_or_404(queryset, pk=pk)
+        return validators.apply(self.render(TaskDetailsSerializer(task).data), task)
+
+
+class AsyncTaskCommentsView(AsyncAPIView):
+    async def get(self, request, pk):
+        validators = TaskValidators('comments', self.media_type)
+        if (response := await validators.anot_modified(request, pk)) is not None:
+            return response
+        task = await aget_object_or_404(Task.objects.only(*validators.columns), pk=pk)
+        comments = [comment async for comment in task.comments.all()]
+        return validators.apply(self.render(CommentSerializer(comments, many=True).data), task)
+
+
+class AsyncTaskTimeLogsView(AsyncAPIView):
+    async def get(self, request, pk):
+        validators = TaskValidators('time-logs', self.media_type)
+        if (response := await validators.anot_modified(request, pk)) is not None:
+            return response
+        task = await aget_object_or_404(Task.objects.only(*validators.columns), pk=pk)
+        time_logs = [time_log async for time_log in task.time_logs.all()]
+        return validators.apply(self.render(TimeLogSerializer(time_logs, many=True).data), task)
+
+
+class AsyncTaskListView(AsyncAPIView):
+    """`TaskListDetailsView` (filters, search, ordering and both pagination styles)."""
+
+    read_from_replica = True
+
+    async def get(self, request):
+        view = TaskListDetailsView(request=self.drf_request, format_kwarg=None, args=(), kwargs={})
+        serializer = values_serializer(view.get_serializer_class())
+        # `TaskFilter` validates `user_id` with a query, so the filters run in a thread.
+        queryset = await sync_to_async(view.filter_queryset)(view.get_queryset())
+        rows = serializer.values(queryset, *ordering_columns(queryset, view), *view.etag_columns)
+        paginator = view.paginator
+        page = await paginator.apaginate_queryset(rows, self.drf_request, view=view)
+        items = [row async for row in rows] if page is None else page
+        envelope = None if page is None else paginator.get_paginated_response([]).data
+        etag = collection_etag(self.media_type, envelope, items, view.etag_columns)
+        if is_conditional(request) and (response := conditional_response(request, etag)) is not None:
+            return response
+
+        data = serializer.to_representation(items)
+        return set_validators(self.render(data if page is None else paginator.get_paginated_response(data).data), etag)
+
+
+class AsyncTopTasksView(AsyncAPIView):
+    read_from_replica = True
+
+    async def get(self, request):
+        period = parse_period(request.GET.get(PERIOD_QUERY_PARAM))
+        return self.render(await acached_analytics('top-tasks', period.key, lambda: self.compute(period)))
+
+    @staticmethod
+    async def compute(period: Period) -> list:
+        serializer = values_serializer(TaskDurationSerializer)
+        rows = [row async for row in serializer.values(TopTasksLastMonthView.top_tasks(period))]
+        return serializer.to_representation(rows)
+
+
+class AsyncTasksDurationView(AsyncAPIView):
+    read_from_replica = True
+
+    async def get(self, request):
+        return self.render(await acached_analytics('tasks-duration', 'all', self.compute))
+
+    @staticmethod
+    async def compute() -> list:
+        serializer = values_serializer(TaskDurationSerializer)
+        rows = [row async for row in serializer.values(TasksListDurationView.durations())]
+        return serializer.to_representation(rows)
+
+
+class AsyncLastMonthLoggedTimeDurationView(AsyncAPIView):
+    read_from_replica = True
+
+    async def get(self, request):
+        user_id = request.user.id
+        period = parse_period(request.GET.get(PERIOD_QUERY_PARAM))
+        data = await acached_analytics('last-month-duration', period.key,
+                                       lambda: self.compute(user_id, period), user_id=user_id)
+        return self.render(data)
+
+    @staticmethod
+    async def compute(user_id, period: Period) -> dict:
+        durations = LastMontLoggedTimeDurationView.logged_durations(user_id, period)
+        total = (await durations.aaggregate(Sum('duration')))['duration__sum']
+        return LastMontLoggedTimeDurationView.summarize(total)
+
+
+def server_sent_event(event_type: str, data: dict) -> str:
+    return f'event: {event_type}\ndata: {json.dumps(data, cls=DjangoJSONEncoder)}\n\n'
+
+
+class AsyncTaskEventsView(AsyncAPIView):
+    """
+    Server-sent events (`apps.tasks.events`) of the authenticated user's tasks, of every task
+    for staff. A stream ends after `EVENTS_STREAM_MAX_SECONDS`, or with an `overflow` event once
+    the client fell `EVENTS_QUEUE_SIZE` events behind, and `EventSource` reconnects. Events
+    aren't replayed: reconnected clients catch up from the change feed (`apps.tasks.changes`).
+    """
+
+    async def get(self, request):
+        if not isinstance(request, ASGIRequest):
+            # A WSGI worker would be held for the whole stream.
+            return self.render({'detail': 'Event streams are only served under ASGI.'}, status=501)
+        user = self.drf_request.user
+        if not user.is_authenticated:
+            raise exceptions.NotAuthenticated()
+
+        response = StreamingHttpResponse(self.stream(user.id, user.is_staff), content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        # Keeps nginx from buffering the stream
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+    @staticmethod
+    async def stream(user_id, see_all: bool):
+        broker = get_broker()
+        subscription = broker.subscribe(user_id, see_all)
+        deadline = time.monotonic() + settings.EVENTS_STREAM_MAX_SECONDS
+        try:
+            # Comments, sent to open the stream and keep idle connections alive
+            yield ': connected\n\n'
+            while (remaining := deadline - time.monotonic()) > 0:
+                if subscription.overflowed:
+                    yield server_sent_event('overflow', {})
+                    return
+                event: Event | None = await subscription.get(min(remaining, settings.EVENTS_KEEPALIVE_SECONDS))
+                if event is not None:
+                    yield server_sent_event(event.type, event.data)
+                elif remaining > settings.EVENTS_KEEPALIVE_SECONDS:
+                    yield ': keepalive\n\n'
+        finally:
+            broker.unsubscribe(subscription)
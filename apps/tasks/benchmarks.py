@@ -0,0 +1,364 @@
+import http.client
+import json
+import math
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.renderers import JSONRenderer
+from rest_framework_simplejwt.tokens import AccessToken
+
+from apps.common.renderers import FastJSONRenderer
+from apps.common.values import values_serializer
+from .changes import format_token
+from .models import ChangeLog, Task
+from .serializers import TaskDurationSerializer, TasksSerializer
+from .views import TasksListDurationView
+
+BENCHMARK_USERNAME = 'benchmark'
+# How far behind the latest change the `changes` scenario syncs from
+CHANGES_BEHIND = 100
+
+
+@dataclass
+class Scenario:
+    """
+    One endpoint to drive: `path(context, i)` builds the url of the i-th request. `writes`
+    scenarios leave rows behind in the database under test, they only run when asked for.
+    """
+    name: str
+    path: Callable[['BenchmarkContext', int], str]
+    method: str = 'get'
+    data: Callable[['BenchmarkContext', int], dict] | None = None
+    writes: bool = False
+
+
+@dataclass
+class BenchmarkContext:
+    task_ids: list[int]
+    token: str
+    changes_since: str = '0-0'
+
+    def task_id(self, i: int) -> int:
+        return self.task_ids[i % len(self.task_ids)]
+
+
+@dataclass
+class ScenarioResult:
+    name: str
+    latencies: list[float] = field(default_factory=list)
+    queries: int | None = 0
+    errors: int = 0
+    elapsed: float = 0.0
+    rows_scanned: int | None = None
+    connections: int | None = None
+
+    def summary(self) -> dict:
+        count = len(self.latencies)
+        return {
+            'requests': count,
+            'errors': self.errors,
+            'rps': round(count / self.elapsed, 1) if self.elapsed else None,
+            'p50_ms': round(percentile(self.latencies, 50) * 1000, 2),
+            'p95_ms': round(percentile(self.latencies, 95) * 1000, 2),
+            'p99_ms': round(percentile(self.latencies, 99) * 1000, 2),
+            'queries_per_request': None if self.queries is None else round(self.queries / count, 2) if count else 0,
+            'rows_scanned_per_request': round(self.rows_scanned / count, 1)
+            if count and self.rows_scanned is not None else None,
+            'connections_per_request': round(self.connections / count, 2)
+            if count and self.connections is not None else None,
+        }
+
+
+SCENARIOS = [
+    Scenario('list', lambda ctx, i: reverse('task_list_details')),
+    Scenario('list-cursor', lambda ctx, i: reverse('task_list_details') + '?cursor='),
+    Scenario('detail', lambda ctx, i: reverse('tasks-detail', args=[ctx.task_id(i)])),
+    Scenario('search', lambda ctx, i: reverse('task_list_details') + '?search=deploy'),
+    Scenario('comments', lambda ctx, i: reverse('tasks-comments', args=[ctx.task_id(i)])),
+    Scenario('comment', lambda ctx, i: reverse('tasks-comment', args=[ctx.task_id(i)]), 'post',
+             lambda ctx, i: {'comment': f'benchmark comment {i}'}, writes=True),
+    Scenario('changes', lambda ctx, i: reverse('task_changes') + f'?since={ctx.changes_since}'),
+    Scenario('time-logs', lambda ctx, i: reverse('tasks-time-logs', args=[ctx.task_id(i)])),
+    # start-timer and stop-timer run back to back over the same tasks
+    Scenario('start-timer', lambda ctx, i: reverse('tasks-start-timer', args=[ctx.task_id(i)]), 'post',
+             writes=True),
+    Scenario('stop-timer', lambda ctx, i: reverse('tasks-stop-timer', args=[ctx.task_id(i)]), 'put', writes=True),
+    Scenario('top-tasks', lambda ctx, i: reverse('top_tasks_last_month')),
+    Scenario('top-tasks-30d', lambda ctx, i: reverse('top_tasks_last_month') + '?period=last_30d'),
+    Scenario('last-month-duration', lambda ctx, i: reverse('last_month_logged_time_duration')),
+    Scenario('duration', lambda ctx, i: reverse('tasks_list_duration')),
+    # One 10k-row page, mostly serialization and rendering
+    Scenario('list-10k', lambda ctx, i: reverse('task_list_details') + '?limit=10000'),
+    # The async endpoints, only async when the server runs under ASGI
+    Scenario('async-list', lambda ctx, i: reverse('async_task_list_details')),
+    Scenario('async-detail', lambda ctx, i: reverse('async_task_detail', args=[ctx.task_id(i)])),
+]
+
+
+def benchmark_host() -> str:
+    """A host name `ALLOWED_HOSTS` accepts, so requests aren't rejected before the view."""
+    return next((host for host in settings.ALLOWED_HOSTS if host != '*' and not host.startswith('.')), 'localhost')
+
+
+def percentile(values: list[float], pct: float) -> float:
+    """Nearest-rank percentile."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[max(math.ceil(pct / 100 * len(ordered)) - 1, 0)]
+
+
+def prepare_context(requests: int, using: str = DEFAULT_DB_ALIAS) -> BenchmarkContext:
+    """
+    Pick the tasks to drive (one per request so timers never collide), a JWT for them and the
+    change feed token to sync from.
+    """
+    user, _ = User.objects.using(using).get_or_create(username=BENCHMARK_USERNAME)
+    task_ids = list(Task.objects.using(using).order_by('-id').values_list('id', flat=True)[:requests])
+    if not task_ids:
+        raise ValueError('No tasks to benchmark, seed the database first')
+    behind = ChangeLog.objects.db_manager(using).settled().reverse().values_list('transaction_id', 'id')
+    position = next(iter(behind[CHANGES_BEHIND:CHANGES_BEHIND + 1]), (0, 0))
+    return BenchmarkContext(task_ids=task_ids, token=str(AccessToken.for_user(user)),
+                            changes_since=format_token(position))
+
+
+class ClientTransport:
+    """Sends requests through the in-process test client and counts their queries."""
+
+    def __init__(self, context: BenchmarkContext, using: str = DEFAULT_DB_ALIAS):
+        self.client = Client(raise_request_exception=False, SERVER_NAME=benchmark_host(),
+                             HTTP_AUTHORIZATION=f'Bearer {context.token}')
+        self.using = using
+
+    def send(self, method: str, path: str, body: str | None) -> tuple[int, int]:
+        kwargs = {'data': body, 'content_type': 'application/json'} if body is not None else {}
+        with CaptureQueriesContext(connections[self.using]) as captured:
+            response = getattr(self.client, method)(path, **kwargs)
+        return response.status_code, len(captured)
+
+    def close(self):
+        pass
+
+
+class HTTPTransport:
+    """Sends requests to a running server over one keep-alive connection. Queries aren't visible."""
+
+    def __init__(self, context: BenchmarkContext, base_url: str):
+        url = urlsplit(base_url)
+        connection_class = http.client.HTTPSConnection if url.scheme == 'https' else http.client.HTTPConnection
+        self.connection = connection_class(url.hostname, url.port, timeout=60)
+        self.prefix = url.path.rstrip('/')
+        self.headers = {'Authorization': f'Bearer {context.token}', 'Content-Type': 'application/json'}
+
+    def send(self, method: str, path: str, body: str | None) -> tuple[int, None]:
+        try:
+            self.connection.request(method.upper(), self.prefix + path, body=body, headers=self.headers)
+            response = self.connection.getresponse()
+            response.read()
+        except (OSError, http.client.HTTPException):
+            # Dropped connection (e.g. a recycled worker), counted as an error and reopened.
+            self.connection.close()
+            return 599, None
+        return response.status, None
+
+    def close(self):
+        self.connection.close()
+
+
+def run_scenario(scenario: Scenario, context: BenchmarkContext, requests: int, concurrency: int = 1,
+                 using: str = DEFAULT_DB_ALIAS, base_url: str | None = None) -> ScenarioResult:
+    """
+    Send `requests` requests for `scenario` from `concurrency` clients, in-process or, with
+    `base_url`, over HTTP to a running server.
+
+    With a concurrency of 1 the requests run in the calling thread, which keeps them inside
+    the test transaction when run from a `TestCase`.
+    """
+    result = ScenarioResult(scenario.name, queries=None if base_url else 0)
+    lock = threading.Lock()
+    counter = iter(range(requests))
+    before = database_statistics(using)
+
+    def worker():
+        transport = HTTPTransport(context, base_url) if base_url else ClientTransport(context, using)
+        latencies, queries, errors = [], 0, 0
+        try:
+            while True:
+                with lock:
+                    i = next(counter, None)
+                if i is None:
+                    break
+                body = json.dumps(scenario.data(context, i)) if scenario.data else None
+
+                started = time.perf_counter()
+                status_code, query_count = transport.send(scenario.method, scenario.path(context, i), body)
+                latencies.append(time.perf_counter() - started)
+                queries += query_count or 0
+                if status_code >= 400:
+                    errors += 1
+        finally:
+            transport.close()
+            if concurrency > 1:
+                connections.close_all()
+
+        with lock:
+            result.latencies += latencies
+            if result.queries is not None:
+                result.queries += queries
+            result.errors += errors
+
+    started = time.perf_counter()
+    if concurrency > 1:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            for future in [pool.submit(worker) for _ in range(concurrency)]:
+                future.result()
+    else:
+        worker()
+    result.elapsed = time.perf_counter() - started
+
+    after = database_statistics(using)
+    if before is not None and after is not None:
+        result.rows_scanned = after['rows_scanned'] - before['rows_scanned']
+        if after['connections'] is not None:
+            result.connections = after['connections'] - before['connections']
+    return result
+
+
+def run_benchmark(requests: int = 100, concurrency: int = 1, scenarios: list[str] | None = None,
+                  using: str = DEFAULT_DB_ALIAS, base_url: str | None = None, cores: int | None = None,
+                  include_writes: bool = False) -> dict:
+    """
+    Run the scenarios and summarize them. `cores` (the cores of the server under test, this
+    machine's by default) turns requests per second into requests per second per core, which
+    compares server setups on different hardware. The scenarios that write (comments, time
+    logs) only run with `include_writes`, and what they write is kept.
+    """
+    selected = [s for s in SCENARIOS if scenarios is None or s.name in scenarios]
+    if not include_writes:
+        writing = [s.name for s in selected if s.writes]
+        if writing and scenarios is not None:
+            raise ValueError(f'Scenarios {", ".join(writing)} write to the database, they need include_writes')
+        selected = [s for s in selected if not s.writes]
+    context = prepare_context(requests, using)
+    cores = cores or os.cpu_count() or 1
+
+    results = {}
+    for scenario in selected:
+        summary = run_scenario(scenario, context, requests, concurrency, using, base_url).summary()
+        summary['rps_per_core'] = round(summary['rps'] / cores, 1) if summary['rps'] else None
+        results[scenario.name] = summary
+
+    return {
+        'meta': {
+            'requests': requests,
+            'concurrency': concurrency,
+            'tasks': Task.objects.using(using).count(),
+            'vendor': connections[using].vendor,
+            'target': base_url or 'in-process',
+            'cores': cores,
+        },
+        'scenarios': results,
+    }
+
+
+def database_statistics(using: str = DEFAULT_DB_ALIAS) -> dict | None:
+    """
+    Totals so far of the tuples read by sequential and index scans and of the connections
+    opened to the database (PostgreSQL statistics only, connections need PostgreSQL 14).
+    """
+    connection = connections[using]
+    if connection.vendor != 'postgresql':
+        return None
+
+    with connection.cursor() as cursor:
+        if connection.pg_version >= 150000:
+            # Statistics of this backend are otherwise flushed at most once per second.
+            cursor.execute('SELECT pg_stat_force_next_flush()')
+        cursor.execute('SELECT pg_stat_clear_snapshot()')
+        cursor.execute('SELECT COALESCE(SUM(seq_tup_read), 0) + COALESCE(SUM(idx_tup_fetch), 0) '
+                       'FROM pg_stat_user_tables')
+        statistics = {'rows_scanned': int(cursor.fetchone()[0]), 'connections': None}
+        if connection.pg_version >= 140000:
+            cursor.execute('SELECT sessions FROM pg_stat_database WHERE datname = current_database()')
+            statistics['connections'] = int(cursor.fetchone()[0])
+        return statistics
+
+
+def compare_to_baseline(results: dict, baseline: dict, tolerance: float = 0.2) -> list[str]:
+    """
+    List the regressions of `results` against a stored baseline.
+
+    Latency may grow by `tolerance` (a fraction) before it counts as a regression. Query
+    counts are deterministic, so any increase is reported.
+    """
+    regressions = []
+    for name, current in results['scenarios'].items():
+        previous = baseline.get('scenarios', {}).get(name)
+        if previous is None:
+            continue
+        for metric in ('p50_ms', 'p95_ms', 'p99_ms'):
+            if previous.get(metric) and current[metric] > previous[metric] * (1 + tolerance):
+                regressions.append(f'{name}: {metric} {current[metric]} > baseline {previous[metric]}')
+        queries, previous_queries = current['queries_per_request'], previous.get('queries_per_request', math.inf)
+        if None not in (queries, previous_queries) and queries > previous_queries:
+            regressions.append(f'{name}: queries_per_request {current["queries_per_request"]} '
+                               f'> baseline {previous["queries_per_request"]}')
+    return regressions
+
+
+# Payloads of `run_serialization_benchmark`: a task list page and the durations analytics
+SERIALIZATION_PAYLOADS = {
+    'list': (TasksSerializer, lambda: Task.objects.order_by('-id')),
+    'duration': (TaskDurationSerializer, TasksListDurationView.durations),
+}
+
+
+def run_serialization_benchmark(rows: int = 10000, repeat: int = 5, using: str = DEFAULT_DB_ALIAS) -> dict:
+    """
+    Time fetching, serializing and rendering `rows` rows of each payload, best of `repeat`
+    runs: `drf` with model serializers and `JSONRenderer` as the views used to, `values` with
+    `ValuesSerializer` and `FastJSONRenderer` as they do now. Both must render the same bytes.
+    """
+    results = {}
+    for name, (serializer_class, queryset) in SERIALIZATION_PAYLOADS.items():
+        page = queryset().using(using)[:rows]
+        ways = {
+            'drf': (lambda rows: serializer_class(rows, many=True).data, JSONRenderer()),
+            'values': (lambda rows: values_serializer(serializer_class).serialize(rows), FastJSONRenderer()),
+        }
+        summaries, contents = {}, {}
+        for way, (serialize, renderer) in ways.items():
+            serialize_times, render_times = [], []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                # A fresh queryset, so every run queries
+                data = serialize(page.all())
+                serialized = time.perf_counter()
+                contents[way] = renderer.render(data)
+                render_times.append(time.perf_counter() - serialized)
+                serialize_times.append(serialized - started)
+            total = min(serialize_times) + min(render_times)
+            summaries[way] = {
+                'rows': len(data),
+                'serialize_ms': round(min(serialize_times) * 1000, 2),
+                'render_ms': round(min(render_times) * 1000, 2),
+                'rows_per_second': round(len(data) / total) if total else None,
+            }
+        if contents['drf'] != contents['values']:
+            raise AssertionError(f'The {name} payload renders differently from values() rows')
+        summaries['speedup'] = round(summaries['values']['rows_per_second'] / summaries['drf']['rows_per_second'], 1) \
+            if summaries['drf']['rows_per_second'] else None
+        results[name] = summaries
+    return {'meta': {'rows': rows, 'repeat': repeat, 'vendor': connections[using].vendor}, 'payloads': results}
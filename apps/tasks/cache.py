@@ -0,0 +1,171 @@
+import asyncio
+import math
+import time
+import uuid
+from typing import Awaitable, Callable
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from apps.common.replicas import read_alias
+
+GLOBAL_SCOPE = 'global'
+ALL_USERS_SCOPE = 'users'
+
+
+def version_key(scope: str) -> str:
+    return f'analytics:version:{scope}'
+
+
+def user_scope(user_id: int) -> str:
+    return f'user:{user_id}'
+
+
+def get_versions(scopes: list[str]) -> list[int]:
+    """Current version of each scope, initializing the missing ones."""
+    keys = [version_key(scope) for scope in scopes]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            # Start from the clock rather than 1, so a version evicted from the cache never
+            # comes back with a value that old entries were stored under.
+            cache.add(key, time.time_ns(), timeout=None)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+async def aget_versions(scopes: list[str]) -> list[int]:
+    keys = [version_key(scope) for scope in scopes]
+    versions = await cache.aget_many(keys)
+    for key in keys:
+        if key not in versions:
+            await cache.aadd(key, time.time_ns(), timeout=None)
+            versions[key] = await cache.aget(key)
+    return [versions[key] for key in keys]
+
+
+def bump_versions(scopes: list[str]) -> None:
+    # A new version is the time of the bump, so `entry_timeout` knows how recent it is.
+    now = time.time_ns()
+    cache.set_many({version_key(scope): now for scope in scopes}, timeout=None)
+
+
+def entry_timeout(versions: list[int]) -> int:
+    """
+    How long to keep an entry computed at `versions`. An entry computed on a read replica
+    shortly after a write may not include it yet, so it's only kept until the replica has
+    caught up (`REPLICA_MAX_LAG`), the next computation then sees the write.
+    """
+    if read_alias.get() is not None and time.time_ns() - max(versions) < settings.REPLICA_MAX_LAG * 1e9:
+        return math.ceil(settings.REPLICA_MAX_LAG)
+    return settings.ANALYTICS_CACHE_TIMEOUT
+
+
+def invalidate_analytics(user_ids=None, all_users: bool = False) -> None:
+    """
+    Invalidate the cached analytics that depend on tasks and time logs.
+
+    Global analytics (top tasks, task durations) are always invalidated. Per-user analytics
+    are invalidated for `user_ids`, or for every user with `all_users` when the affected
+    users aren't known. Call it after writes that bypass model signals (bulk writes, COPY).
+
+    Versions are bumped right away, so reads later in the same transaction miss, and again
+    on commit, so entries computed concurrently from pre-commit data are never served.
+    """
+    scopes = [GLOBAL_SCOPE]
+    if all_users:
+        scopes.append(ALL_USERS_SCOPE)
+    scopes += [user_scope(user_id) for user_id in user_ids or () if user_id is not None]
+
+    bump_versions(scopes)
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(lambda: bump_versions(scopes))
+
+
+def analytics_scopes(user_id: int | None) -> list[str]:
+    return [GLOBAL_SCOPE] if user_id is None else [ALL_USERS_SCOPE, user_scope(user_id)]
+
+
+def analytics_keys(name: str, period: str, user_id: int | None, versions: list[int]) -> tuple[str, str, str]:
+    """The entry, stale entry and lock keys of an analytic at the given scope versions."""
+    base_key = f'analytics:{name}:{period}:{"all" if user_id is None else user_id}'
+    return f'{base_key}:{".".join(map(str, versions))}', f'{base_key}:stale', f'{base_key}:lock'
+
+
+def cached_analytics(name: str, period: str, compute: Callable[[], object], user_id: int | None = None):
+    """
+    Return the value of the `name` analytic for `period` (and `user_id` for per-user ones),
+    computing it with `compute` on a miss.
+
+    Entries are keyed by the versions of the scopes they depend on, so they stay valid
+    until a relevant write bumps a version, not for a fixed time. A miss is recomputed by a
+    single caller holding a lock (`cache.add`); concurrent callers serve the previous value
+    meanwhile, or wait for the lock holder when there is none.
+    """
+    versions = get_versions(analytics_scopes(user_id))
+    key, stale_key, lock_key = analytics_keys(name, period, user_id, versions)
+
+    value = cache.get(key)
+    if value is not None:
+        return value
+
+    token = uuid.uuid4().hex
+    lock_timeout = settings.ANALYTICS_CACHE_LOCK_TIMEOUT
+    if not cache.add(lock_key, token, timeout=lock_timeout):
+        stale = cache.get(stale_key)
+        if stale is not None:
+            return stale
+
+        # Nothing to fall back to, wait for the caller holding the lock.
+        deadline = time.monotonic() + lock_timeout
+        while time.monotonic() < deadline:
+            time.sleep(0.05)
+            value = cache.get(key)
+            if value is not None:
+                return value
+        return compute()
+
+    try:
+        value = compute()
+        cache.set(key, value, timeout=entry_timeout(versions))
+        cache.set(stale_key, value, timeout=settings.ANALYTICS_CACHE_TIMEOUT)
+    finally:
+        if cache.get(lock_key) == token:
+            cache.delete(lock_key)
+    return value
+
+
+async def acached_analytics(name: str, period: str, compute: Callable[[], Awaitable[object]],
+                            user_id: int | None = None):
+    """`cached_analytics` for async views, sharing its entries. `compute` is a coroutine function."""
+    versions = await aget_versions(analytics_scopes(user_id))
+    key, stale_key, lock_key = analytics_keys(name, period, user_id, versions)
+
+    value = await cache.aget(key)
+    if value is not None:
+        return value
+
+    token = uuid.uuid4().hex
+    lock_timeout = settings.ANALYTICS_CACHE_LOCK_TIMEOUT
+    if not await cache.aadd(lock_key, token, timeout=lock_timeout):
+        stale = await cache.aget(stale_key)
+        if stale is not None:
+            return stale
+
+        deadline = time.monotonic() + lock_timeout
+        while time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+            value = await cache.aget(key)
+            if value is not None:
+                return value
+        return await compute()
+
+    try:
+        value = await compute()
+        await cache.aset(key, value, timeout=entry_timeout(versions))
+        await cache.aset(stale_key, value, timeout=settings.ANALYTICS_CACHE_TIMEOUT)
+    finally:
+        if await cache.aget(lock_key) == token:
+            await cache.adelete(lock_key)
+    return value
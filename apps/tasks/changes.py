@@ -0,0 +1,129 @@
+"""
+The change feed of `GET /api/tasks/changes?since=<token>`: the tasks, comments and time logs
+written since `token`. Clients stay in sync by downloading what changed instead of every task.
+
+Every write to those models adds a `ChangeLog` row in its own transaction (model signals, and
+explicit calls in the bulk, import and timer paths that bypass them). A token is the position
+`<transaction id>-<change id>` of the last change a client got. Changes are read in that order
+and only once every transaction before them has finished (`ChangeLogManager.settled`), so a
+transaction that commits late can't land behind a token already handed out. A long running
+write transaction holds the feed back until it ends.
+
+A page carries the current state of every object changed in it, once however often it changed,
+and under `deleted` the ids of the ones that no longer exist. A task is also sent when one of its
+comments or time logs changed, which changes its counters. Without `since` the page is empty
+and only carries the token to start from: fetch it before downloading the full task list, then
+sync from it.
+
+Changes are kept `CHANGE_LOG_RETENTION_DAYS`, `manage.py prune_changes` deletes older ones but
+the latest of them. A client whose token's change was deleted, or with the `0-0` token of an
+empty log that has since grown older than that, missed changes: it gets `410 Gone` and must
+download the full task list again, with a new token.
+"""
+import re
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+from rest_framework import status
+from rest_framework.exceptions import APIException, ValidationError
+
+from apps.common.helpers import optimize_queryset_for_serializer
+from .models import ChangeKind, ChangeLog, Comment, Task, TimeLog
+from .serializers import CommentChangeSerializer, TaskChangeSerializer, TimeLogChangeSerializer
+
+SINCE_QUERY_PARAM = 'since'
+LIMIT_QUERY_PARAM = 'limit'
+MAX_CHANGES = 1000
+TOKEN_PATTERN = re.compile(r'^(\d+)-(\d+)$')
+
+# Response key, model and serializer of each kind of change
+FEEDS = {
+    ChangeKind.TASK: ('tasks', Task, TaskChangeSerializer),
+    ChangeKind.COMMENT: ('comments', Comment, CommentChangeSerializer),
+    ChangeKind.TIME_LOG: ('time_logs', TimeLog, TimeLogChangeSerializer),
+}
+
+
+class ResyncRequired(APIException):
+    status_code = status.HTTP_410_GONE
+    default_detail = _('Changes since this token are no longer kept, download every task again.')
+    default_code = 'resync_required'
+
+
+def retention_cutoff():
+    """Changes made before this may have been pruned."""
+    return timezone.now() - timedelta(days=settings.CHANGE_LOG_RETENTION_DAYS)
+
+
+def check_retained(position: tuple[int, int]) -> None:
+    """Raise `ResyncRequired` when changes after the token at `position` may have been pruned."""
+    if position == (0, 0):
+        oldest = ChangeLog.objects.order_by('transaction_id', 'id').values_list('created_at', flat=True).first()
+        retained = oldest is None or oldest >= retention_cutoff()
+    else:
+        # Pruning deletes every change before the one it keeps, so the change of a token
+        # still being there means none after it was deleted.
+        retained = ChangeLog.objects.filter(id=position[1]).exists()
+    if not retained:
+        raise ResyncRequired()
+
+
+def parse_token(value: str) -> tuple[int, int]:
+    match = TOKEN_PATTERN.match(value)
+    if not match:
+        raise ValidationError({SINCE_QUERY_PARAM: _('Expected a token returned as `next` by this endpoint.')})
+    return int(match.group(1)), int(match.group(2))
+
+
+def format_token(position: tuple[int, int]) -> str:
+    return f'{position[0]}-{position[1]}'
+
+
+def parse_limit(value: str | None) -> int:
+    if value is None:
+        return MAX_CHANGES
+    if not value.isdigit() or not 1 <= int(value) <= MAX_CHANGES:
+        raise ValidationError({LIMIT_QUERY_PARAM: _('Expected a number from 1 to %(max)d.') % {'max': MAX_CHANGES}})
+    return int(value)
+
+
+def read_changes(since: str | None, limit: str | None = None) -> dict:
+    """The page of at most `limit` changes after the `since` token, see the module docstring."""
+    settled = ChangeLog.objects.settled()
+    if since is None:
+        latest = settled.reverse().values_list('transaction_id', 'id').first()
+        return changes_page(latest or (0, 0), [], has_more=False)
+
+    transaction_id, change_id = parse_token(since)
+    limit = parse_limit(limit)
+    check_retained((transaction_id, change_id))
+    changes = list(settled
+                   .filter(transaction_id__gte=transaction_id)
+                   .exclude(transaction_id=transaction_id, id__lte=change_id)
+                   .values_list('transaction_id', 'id', 'kind', 'object_id', 'task_id')[:limit + 1])
+    has_more = len(changes) > limit
+    changes = changes[:limit]
+    position = changes[-1][:2] if changes else (transaction_id, change_id)
+    return changes_page(position, changes, has_more)
+
+
+def changes_page(position: tuple[int, int], changes: list[tuple], has_more: bool) -> dict:
+    changed = defaultdict(set)
+    for change in changes:
+        kind, object_id, task_id = change[2:]
+        changed[kind].add(object_id)
+        changed[ChangeKind.TASK].add(task_id)
+
+    page = {'next': format_token(position), 'has_more': has_more}
+    deleted = {}
+    for kind, (key, model, serializer_class) in FEEDS.items():
+        ids = changed[kind]
+        objects = list(optimize_queryset_for_serializer(model.objects.filter(pk__in=ids).order_by('pk'),
+                                                        serializer_class)) if ids else []
+        page[key] = serializer_class(objects, many=True).data
+        deleted[key] = sorted(ids - {obj.pk for obj in objects})
+    page['deleted'] = deleted
+    return page
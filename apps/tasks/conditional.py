@@ -0,0 +1,83 @@
+"""
+`ETag` and `Last-Modified` of a task's detail, comments and time logs (`apps.common.conditional`).
+
+They come from the task row alone: `updated_at`, and the `comments_version` and
+`time_logs_version` counters bumped with every change to the task's comments or time logs, at
+`children_updated_at`. A conditional request reads them in one query and gets a 304 without
+the nested queries and serialization of the full response when they match. Other requests
+compute them from the task the view loads anyway, for no extra query.
+"""
+from datetime import datetime
+
+from django.http import HttpResponse
+
+from apps.common.conditional import conditional_response, is_conditional, make_etag, set_validators
+from apps.users.serializers import UserSerializer
+from .models import Task
+
+# The user fields the detail renders
+USER_COLUMNS = tuple(f'user__{field.source}' for field in UserSerializer().fields.values() if not field.write_only)
+
+# The columns of the task each representation changes with
+ETAG_COLUMNS = {
+    'detail': ('updated_at', 'comments_version', 'time_logs_version', 'user_id', *USER_COLUMNS),
+    'comments': ('comments_version',),
+    'time-logs': ('time_logs_version',),
+}
+# and those the latest of is its modification time (comments and time logs have no timestamps).
+# `children_updated_at` moves with both kinds of children, so it's not part of the ETags.
+LAST_MODIFIED_COLUMNS = {
+    'detail': ('updated_at', 'children_updated_at'),
+    'comments': ('children_updated_at',),
+    'time-logs': ('children_updated_at',),
+}
+# Columns of `TasksSerializer` rows that change whenever the row's rendering does
+LIST_ETAG_COLUMNS = ('id', 'updated_at', 'comments_version', 'time_logs_version')
+
+
+class TaskValidators:
+    """The validators of a representation of a task (`detail`, `comments` or `time-logs`) in a media type."""
+
+    def __init__(self, representation: str, media_type: str):
+        self.representation = representation
+        self.media_type = media_type
+        self.etag_columns = ETAG_COLUMNS[representation]
+        self.last_modified_columns = LAST_MODIFIED_COLUMNS[representation]
+        self.columns = list(dict.fromkeys(self.etag_columns + self.last_modified_columns))
+
+    def of_row(self, row: dict) -> tuple[str, datetime | None]:
+        etag = make_etag(self.representation, self.media_type, [row[column] for column in self.etag_columns])
+        modified = [row[column] for column in self.last_modified_columns if row[column] is not None]
+        return etag, max(modified, default=None)
+
+    def of_task(self, task: Task) -> tuple[str, datetime | None]:
+        """From a loaded task, its user too for the detail."""
+        row = {}
+        for column in self.columns:
+            value = task
+            for name in column.split('__'):
+                value = getattr(value, name) if value is not None else None
+            row[column] = value
+        return self.of_row(row)
+
+    def queryset(self, pk):
+        return Task.objects.filter(pk=pk).values(*self.columns)
+
+    def not_modified(self, request, pk) -> HttpResponse | None:
+        """The 304 to a conditional request for a task that hasn't changed, None otherwise."""
+        if not is_conditional(request):
+            return None
+        row = self.queryset(pk).first()
+        # A missing task gets the view's 404.
+        return None if row is None else conditional_response(request, *self.of_row(row))
+
+    async def anot_modified(self, request, pk) -> HttpResponse | None:
+        """`not_modified` for async views."""
+        if not is_conditional(request):
+            return None
+        row = await self.queryset(pk).afirst()
+        return None if row is None else conditional_response(request, *self.of_row(row))
+
+    def apply(self, response, task: Task):
+        """Set the validators of `task` on the response it was rendered into."""
+        return set_validators(response, *self.of_task(task))
@@ -0,0 +1,40 @@
+"""
+The task events of `GET /api/tasks/async/events/`, see `apps.common.events`. Each is published
+once the write commits, to the task's user (both users for a reassignment) and staff.
+"""
+from apps.common.events import publish_on_commit
+from .models import Comment, Task, TimeLog
+
+TASK_STATUS_CHANGED = 'task.status_changed'
+TASK_ASSIGNED = 'task.assigned'
+COMMENT_CREATED = 'comment.created'
+TIMER_STARTED = 'timer.started'
+TIMER_STOPPED = 'timer.stopped'
+
+
+def task_status_changed(task: Task):
+    publish_on_commit(TASK_STATUS_CHANGED, {'task_id': task.id, 'status': task.status,
+                                            'updated_at': task.updated_at}, [task.user_id])
+
+
+def task_assigned(task: Task, previous_user_id: int | None):
+    publish_on_commit(TASK_ASSIGNED, {'task_id': task.id, 'user_id': task.user_id,
+                                      'previous_user_id': previous_user_id}, [task.user_id, previous_user_id])
+
+
+def comment_created(comment: Comment, task: Task):
+    publish_on_commit(COMMENT_CREATED, {'task_id': task.id, 'comment_id': comment.id, 'content': comment.content},
+                      [task.user_id])
+
+
+def timer_started(time_log: TimeLog):
+    """`time_log` as returned by `TimeLogManager.start_timer`, carrying `task_user_id`."""
+    publish_on_commit(TIMER_STARTED, {'task_id': time_log.task_id, 'time_log_id': time_log.id,
+                                      'start_time': time_log.start_time}, [time_log.task_user_id])
+
+
+def timer_stopped(time_log: TimeLog):
+    """`time_log` as returned by `TimeLogManager.stop_timer`, carrying `task_user_id`."""
+    publish_on_commit(TIMER_STOPPED, {'task_id': time_log.task_id, 'time_log_id': time_log.id,
+                                      'start_time': time_log.start_time, 'end_time': time_log.end_time,
+                                      'duration': time_log.duration}, [time_log.task_user_id])
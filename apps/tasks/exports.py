@@ -0,0 +1,81 @@
+import csv
+import io
+from datetime import date, datetime
+from typing import Iterable, Iterator
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import F, QuerySet
+from rest_framework.exceptions import ValidationError
+
+from apps.common.bulk import chunked
+from .filters import TaskFilter
+from .models import Task, TimeLog
+
+EXPORT_CHUNK_SIZE = 2000
+
+EXPORT_COLUMNS = {
+    'tasks': ('id', 'title', 'description', 'status', 'created_at', 'updated_at', 'user_id', 'username',
+              'comment_count'),
+    'time-logs': ('id', 'task_id', 'start_time', 'end_time', 'duration'),
+}
+
+CONTENT_TYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson; charset=utf-8',
+}
+
+
+def filter_tasks(params) -> QuerySet:
+    """Tasks matching `TaskFilter` for `params` (query params or a plain dict)."""
+    filterset = TaskFilter(params, queryset=Task.objects.all())
+    if not filterset.is_valid():
+        raise ValidationError(filterset.errors)
+    return filterset.qs
+
+
+def export_rows(kind: str, params, chunk_size: int = EXPORT_CHUNK_SIZE) -> Iterator[tuple]:
+    """
+    Stream the rows of the `kind` export (`tasks` or `time-logs`) as tuples of `EXPORT_COLUMNS`.
+
+    Rows come from a server-side cursor in primary key order, `chunk_size` at a time, so memory
+    stays flat and the first row is available right away. Comment counts are the tasks'
+    `comment_count` counters.
+    """
+    tasks = filter_tasks(params)
+
+    if kind == 'tasks':
+        queryset = tasks.annotate(username=F('user__username'))
+    else:
+        queryset = TimeLog.objects.all()
+        if tasks.query.has_filters():
+            queryset = queryset.filter(task__in=tasks.values('pk'))
+
+    return queryset.order_by('id').values_list(*EXPORT_COLUMNS[kind]).iterator(chunk_size=chunk_size)
+
+
+def render_export(kind: str, export_format: str, rows: Iterable[tuple],
+                  chunk_size: int = EXPORT_CHUNK_SIZE) -> Iterator[str]:
+    """Render rows as CSV (with a header) or NDJSON, one string per chunk of rows."""
+    columns = EXPORT_COLUMNS[kind]
+
+    if export_format == 'ndjson':
+        encoder = DjangoJSONEncoder()
+        for chunk in chunked(rows, chunk_size):
+            yield ''.join(encoder.encode(dict(zip(columns, row))) + '\n' for row in chunk)
+        return
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    yield buffer.getvalue()
+    for chunk in chunked(rows, chunk_size):
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows([_csv_value(value) for value in row] for row in chunk)
+        yield buffer.getvalue()
+
+
+def _csv_value(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
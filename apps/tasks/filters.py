@@ -1,4 +1,12 @@
-﻿import django_filters
+﻿import re
+
+import django_filters
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db import connection
+from django.db.models import F
+from rest_framework.filters import SearchFilter
+
+from apps.common.pagination import KeysetPagination
 from .models import Task
 
 
@@ -6,3 +14,47 @@ class TaskFilter(django_filters.FilterSet):
     class Meta:
         model = Task
         fields = ['title', 'user_id', 'status']
+
+
+def build_prefix_tsquery(terms: list[str]) -> str:
+    """Turn search terms into a raw tsquery matching every word as a prefix, e.g. `dep:* & fix:*`."""
+    words = [word for term in terms for word in re.findall(r'\w+', term)]
+    return ' & '.join(f'{word}:*' for word in words)
+
+
+class TaskSearchFilter(SearchFilter):
+    """
+    `?search=` backed by the `Task.search_vector` GIN index on PostgreSQL.
+
+    Every word is matched as a prefix, so partial words still find tasks like the `ILIKE`
+    search did. Results are ranked (title matches first) unless the client asked for an
+    explicit ordering or is walking a keyset cursor. Other databases, and searches made of
+    stopwords only (`the`), which the index has no lexemes for, use `SearchFilter`.
+    """
+
+    search_config = 'english'
+
+    def filter_queryset(self, request, queryset, view):
+        if connection.vendor != 'postgresql':
+            return super().filter_queryset(request, queryset, view)
+
+        tsquery = build_prefix_tsquery(self.get_search_terms(request))
+        if not tsquery:
+            return queryset
+        if not self.has_lexemes(tsquery):
+            return super().filter_queryset(request, queryset, view)
+
+        query = SearchQuery(tsquery, search_type='raw', config=self.search_config)
+        queryset = queryset.filter(search_vector=query)
+
+        if 'ordering' in request.query_params or KeysetPagination.cursor_query_param in request.query_params:
+            return queryset
+        return (queryset
+                .annotate(search_rank=SearchRank(F('search_vector'), query))
+                .order_by('-search_rank', '-id'))
+
+    def has_lexemes(self, tsquery: str) -> bool:
+        """Whether `tsquery` keeps a word once stopwords are dropped, it matches nothing otherwise."""
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT numnode(to_tsquery(%s::regconfig, %s)) > 0', [self.search_config, tsquery])
+            return cursor.fetchone()[0]
@@ -0,0 +1,174 @@
+import random
+from collections import defaultdict
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.utils import timezone
+
+from apps.common.bulk import chunked, copy_rows, supports_copy
+from .cache import invalidate_analytics
+from .models import ChangeKind, ChangeLog, Comment, StatusEnum, Task, TaskDurationRollup, TimeLog, month_bucket
+
+VERBS = ('Fix', 'Review', 'Deploy', 'Write', 'Refactor', 'Test', 'Document', 'Plan', 'Migrate', 'Design')
+NOUNS = ('login page', 'billing report', 'api client', 'database index', 'release notes', 'search form',
+         'user settings', 'email template', 'backup job', 'dashboard')
+WORDS = ('the', 'task', 'needs', 'more', 'work', 'before', 'release', 'after', 'review', 'customer', 'asked',
+         'about', 'this', 'again', 'blocked', 'by', 'infra', 'done', 'except', 'tests', 'see', 'ticket')
+
+
+class TaskDataGenerator:
+    """
+    Generates load-test users, tasks, comments and time logs.
+
+    Rows are built in memory one chunk of tasks at a time and written with PostgreSQL `COPY`
+    (or `bulk_create` on other databases), so memory stays bounded and tens of millions of
+    rows load in minutes. Time logs and comments are attached to the generated tasks and
+    tasks are assigned to a fixed pool of users, existing users are reused first.
+
+    Writes bypass model signals, so the duration rollups and counters of the new tasks are
+    computed while generating and written alongside them, the new rows are added to the change
+    log and the cached analytics are invalidated once done.
+    """
+
+    def __init__(self, users=1000, logs_per_task=2, comments_per_task=0, seed=None, chunk_size=5000,
+                 use_copy=None, using=DEFAULT_DB_ALIAS):
+        self.users = users
+        self.logs_per_task = logs_per_task
+        self.comments_per_task = comments_per_task
+        self.chunk_size = chunk_size
+        self.using = using
+        self.use_copy = supports_copy(using) if use_copy is None else use_copy
+        self.random = random.Random(seed)
+        self.now = timezone.now()
+        self.counts = defaultdict(int)
+
+    def generate(self, tasks: int, progress=None) -> dict:
+        user_ids = self.ensure_users(self.users)
+
+        for size in self.chunk_sizes(tasks):
+            with transaction.atomic(using=self.using):
+                self.write_chunk(size, user_ids)
+            if progress:
+                progress(dict(self.counts))
+
+        invalidate_analytics(all_users=True)
+        return dict(self.counts)
+
+    def chunk_sizes(self, total: int):
+        while total > 0:
+            size = min(self.chunk_size, total)
+            total -= size
+            yield size
+
+    def ensure_users(self, count: int) -> list[int]:
+        """Return `count` user ids, creating only the users that don't exist yet."""
+        user_ids = list(User.objects.using(self.using).order_by('id').values_list('id', flat=True)[:count])
+        missing = count - len(user_ids)
+        if missing <= 0:
+            return user_ids
+
+        token = '%08x' % self.random.getrandbits(32)
+        password = make_password(None)
+        for chunk in chunked(range(missing), self.chunk_size):
+            created = User.objects.using(self.using).bulk_create([
+                User(username=f'loadtest_{token}_{i}', email=f'loadtest_{token}_{i}@example.com',
+                     password=password, date_joined=self.now)
+                for i in chunk
+            ])
+            self.counts['users'] += len(created)
+
+        return list(User.objects.using(self.using).order_by('id').values_list('id', flat=True)[:count])
+
+    def write_chunk(self, size: int, user_ids: list[int]):
+        tasks = [self.build_task(user_ids) for _ in range(size)]
+        task_logs = []
+        for task in tasks:
+            logs = [self.build_time_log(task['created_at']) for _ in range(self.logs_per_task)]
+            task_logs.append(logs)
+            task.update(comment_count=self.comments_per_task, total_logged_minutes=sum(log['duration'] for log in logs),
+                        open_timer=False, last_activity_at=max((log['end_time'] for log in logs), default=None),
+                        comments_version=0, time_logs_version=0)
+        task_ids = self.write_tasks(tasks)
+
+        time_logs, comments = [], []
+        rollups = defaultdict(lambda: [0, 0])
+        for task_id, logs in zip(task_ids, task_logs):
+            for time_log in logs:
+                time_log['task_id'] = task_id
+                time_logs.append(time_log)
+                rollup = rollups[(task_id, month_bucket(time_log['start_time']))]
+                rollup[0] += time_log['duration']
+                rollup[1] += 1
+            for _ in range(self.comments_per_task):
+                comments.append({'task_id': task_id, 'content': self.sentence(12)})
+
+        self.write(TimeLog, time_logs)
+        self.write(Comment, comments)
+        self.write(TaskDurationRollup, [
+            {'task_id': task_id, 'month': month, 'duration': duration, 'log_count': log_count}
+            for (task_id, month), (duration, log_count) in rollups.items()
+        ])
+        self.record_changes(task_ids)
+
+        self.counts['tasks'] += len(tasks)
+        self.counts['time_logs'] += len(time_logs)
+        self.counts['comments'] += len(comments)
+
+    def write_tasks(self, tasks: list[dict]) -> list[int]:
+        if not self.use_copy:
+            created = Task.objects.using(self.using).bulk_create([Task(**task) for task in tasks])
+            return [task.id for task in created]
+
+        # COPY can't return generated keys, so reserve the ids from the sequence up front.
+        with connections[self.using].cursor() as cursor:
+            cursor.execute("SELECT nextval(pg_get_serial_sequence(%s, 'id')) FROM generate_series(1, %s)",
+                           [Task._meta.db_table, len(tasks)])
+            task_ids = [row[0] for row in cursor.fetchall()]
+
+        for task_id, task in zip(task_ids, tasks):
+            task['id'] = task_id
+        self.write(Task, tasks)
+        return task_ids
+
+    def write(self, model, rows: list[dict]):
+        if not rows:
+            return
+        if self.use_copy:
+            columns = list(rows[0])
+            copy_rows(model._meta.db_table, columns, (tuple(row[c] for c in columns) for row in rows), self.using)
+        else:
+            model.objects.using(self.using).bulk_create([model(**row) for row in rows], batch_size=1000)
+
+    def record_changes(self, task_ids: list[int]):
+        changes = ChangeLog.objects.db_manager(self.using)
+        changes.record_tasks(task_ids)
+        # COPY doesn't return the ids of the comments and time logs
+        for kind, model in ((ChangeKind.COMMENT, Comment), (ChangeKind.TIME_LOG, TimeLog)):
+            changes.record_query(kind, model.objects.using(self.using).filter(task_id__in=task_ids))
+
+    def build_task(self, user_ids: list[int]) -> dict:
+        created_at = self.now - timedelta(seconds=self.random.randint(0, 365 * 24 * 3600))
+        return {
+            'title': f'{self.random.choice(VERBS)} {self.random.choice(NOUNS)} #{self.random.randint(1, 99999)}',
+            'description': self.sentence(20),
+            'status': self.random.choice(StatusEnum.values),
+            'created_at': created_at,
+            'updated_at': created_at + timedelta(minutes=self.random.randint(0, 60 * 24 * 30)),
+            'user_id': self.random.choice(user_ids) if user_ids else None,
+        }
+
+    def build_time_log(self, created_at) -> dict:
+        span = max(int((self.now - created_at).total_seconds()), 1)
+        start_time = created_at + timedelta(seconds=self.random.randint(0, span))
+        duration = self.random.randint(15, 8 * 60)
+        return {
+            'start_time': start_time,
+            'end_time': start_time + timedelta(minutes=duration),
+            'duration': duration,
+        }
+
+    def sentence(self, max_words: int) -> str:
+        words = self.random.choices(WORDS, k=self.random.randint(3, max_words))
+        return ' '.join(words).capitalize() + '.'
@@ -0,0 +1,223 @@
+import csv
+import json
+from collections import defaultdict
+from typing import IO, Iterator
+
+from django.contrib.auth.models import User
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections, transaction
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from apps.common.bulk import advance_sequence, chunked, copy_rows, supports_copy
+from .cache import invalidate_analytics
+from .models import ChangeKind, ChangeLog, Task, TaskDurationRollup, TimeLog
+from .serializers import TaskImportSerializer, TimeLogImportSerializer
+
+IMPORT_CHUNK_SIZE = 5000
+MAX_REPORTED_ERRORS = 1000
+
+IMPORT_COLUMNS = {
+    'tasks': ('id', 'title', 'description', 'status', 'created_at', 'updated_at', 'user_id'),
+    'time-logs': ('task_id', 'start_time', 'end_time', 'duration'),
+}
+
+
+def parse_rows(stream: IO[str], import_format: str) -> Iterator[tuple[int, dict | None, str | None]]:
+    """
+    Yield `(row number, data, parse error)` for every row of a CSV (with a header) or NDJSON
+    text stream, one line at a time. Empty CSV cells are left out, like absent keys.
+    """
+    if import_format == 'ndjson':
+        for number, line in enumerate(stream, start=1):
+            if not line.strip():
+                continue
+            try:
+                data = json.loads(line)
+            except ValueError as e:
+                yield number, None, f'Invalid JSON: {e}'
+                continue
+            if not isinstance(data, dict):
+                yield number, None, 'Expected a JSON object'
+                continue
+            yield number, data, None
+        return
+
+    for number, row in enumerate(csv.DictReader(stream), start=1):
+        yield number, {key: value for key, value in row.items() if key and value not in ('', None)}, None
+
+
+class TaskImporter:
+    """
+    Loads `tasks` or `time-logs` from CSV/NDJSON, in chunks of `chunk_size` rows.
+
+    Each chunk is validated with the API serializers (`TimeLogSerializer` rules, so a zero
+    duration is computed from start and end) plus one query for the referenced rows. Invalid
+    rows are reported and skipped. Valid rows are written in one transaction per chunk: on
+    PostgreSQL they are `COPY`-ed into a temporary staging table and merged with a single
+    `INSERT ... SELECT` (plus a set-based update of the duration rollups), elsewhere they go
+    through `bulk_create`. The counters of the tasks that got time logs are then recomputed and
+    the written rows are added to the change log.
+    A chunk that still fails to write is reported row by row and the load moves on.
+
+    Tasks with an `id` update the existing task (or are created with that id), so time logs
+    can reference the ids of the system being migrated from.
+    """
+
+    def __init__(self, kind: str, chunk_size=IMPORT_CHUNK_SIZE, use_copy=None, using=DEFAULT_DB_ALIAS,
+                 max_errors=MAX_REPORTED_ERRORS):
+        self.kind = kind
+        self.model = Task if kind == 'tasks' else TimeLog
+        self.change_kind = ChangeKind.TASK if kind == 'tasks' else ChangeKind.TIME_LOG
+        self.serializer = (TaskImportSerializer if kind == 'tasks' else TimeLogImportSerializer)()
+        self.columns = IMPORT_COLUMNS[kind]
+        # Columns an imported task overwrites on an existing one
+        self.update_columns = [column for column in self.columns if column not in ('id', 'created_at')]
+        # COPY bypasses model defaults, so absent columns are filled in here
+        self.defaults = {column: self.model._meta.get_field(column).get_default() for column in self.columns}
+        # and columns that aren't imported (the task counters) are written with their defaults
+        self.unimported_defaults = {field.column: field.get_default() for field in self.model._meta.concrete_fields
+                                    if field.column not in self.columns and field.has_default()}
+        self.chunk_size = chunk_size
+        self.using = using
+        self.use_copy = supports_copy(using) if use_copy is None else use_copy
+        self.max_errors = max_errors
+        self.counts = defaultdict(int)
+        self.errors = []
+
+    def run(self, stream: IO[str], import_format: str, progress=None) -> dict:
+        for chunk in chunked(parse_rows(stream, import_format), self.chunk_size):
+            rows = self.validate_chunk(chunk)
+            if rows:
+                self.write_chunk(rows)
+            if progress:
+                progress(self.summary())
+
+        if self.counts['imported']:
+            # COPY and bulk_create skip the signals that invalidate the analytics
+            invalidate_analytics(all_users=True)
+        return {**self.summary(), 'errors': sorted(self.errors, key=lambda error: error['row'])}
+
+    def summary(self) -> dict:
+        return {name: self.counts[name] for name in ('rows', 'imported', 'skipped', 'failed')}
+
+    def add_error(self, number: int, errors):
+        self.counts['failed'] += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append({'row': number, 'errors': errors})
+
+    def validate_chunk(self, chunk: list) -> list[tuple[int, dict]]:
+        valid = []
+        for number, data, error in chunk:
+            self.counts['rows'] += 1
+            if error:
+                self.add_error(number, {'non_field_errors': [error]})
+                continue
+            try:
+                valid.append((number, self.serializer.run_validation(data)))
+            except ValidationError as e:
+                self.add_error(number, e.detail)
+
+        return self.check_references(valid)
+
+    def check_references(self, rows: list[tuple[int, dict]]) -> list[tuple[int, dict]]:
+        """Drop rows referencing missing users/tasks, and tasks whose id repeats within the chunk."""
+        field, model = ('user_id', User) if self.kind == 'tasks' else ('task_id', Task)
+        ids = {attrs[field] for _, attrs in rows if attrs.get(field) is not None}
+        existing = set(model.objects.using(self.using).filter(id__in=ids).values_list('id', flat=True))
+
+        checked, seen_ids = [], set()
+        for number, attrs in rows:
+            if attrs.get(field) is not None and attrs[field] not in existing:
+                self.add_error(number, {field: [f'{model.__name__} {attrs[field]} does not exist.']})
+            elif attrs.get('id') is not None and attrs['id'] in seen_ids:
+                self.add_error(number, {'id': [f'Task {attrs["id"]} appears more than once in this chunk.']})
+            else:
+                seen_ids.add(attrs.get('id'))
+                checked.append((number, attrs))
+        return checked
+
+    def write_chunk(self, rows: list[tuple[int, dict]]):
+        now = timezone.now()
+        values = []
+        for _, attrs in rows:
+            if self.kind == 'tasks':
+                attrs.setdefault('created_at', now)
+                attrs.setdefault('updated_at', attrs['created_at'])
+            values.append(tuple(attrs.get(column, self.defaults[column]) for column in self.columns))
+
+        try:
+            with transaction.atomic(using=self.using):
+                if self.kind == 'tasks':
+                    # Generated ids, those of the chunk's tasks without one too, come after the imported ones.
+                    ids = [attrs['id'] for _, attrs in rows if attrs.get('id') is not None]
+                    advance_sequence(Task._meta.db_table, max(ids, default=None), self.using)
+                if self.use_copy:
+                    imported = self.copy_and_merge(values)
+                else:
+                    imported = self.bulk_create(values)
+                    if self.kind == 'time-logs':
+                        TaskDurationRollup.objects.rebuild(task_ids={attrs['task_id'] for _, attrs in rows})
+                if self.kind == 'time-logs':
+                    task_ids = {attrs['task_id'] for _, attrs in rows}
+                    Task.objects.db_manager(self.using).refresh_counters(task_ids=task_ids)
+                    # Logs that leave the counters as they were still change the task's time logs.
+                    Task.objects.db_manager(self.using).bump_versions(task_ids, ChangeKind.TIME_LOG)
+                ChangeLog.objects.db_manager(self.using).record(self.change_kind, imported)
+        except DatabaseError as e:
+            for number, _ in rows:
+                self.add_error(number, {'non_field_errors': [f'Could not write the chunk: {e}']})
+            return
+
+        self.counts['imported'] += len(imported)
+        self.counts['skipped'] += len(rows) - len(imported)
+
+    def bulk_create(self, values: list[tuple]) -> list[tuple[int, int]]:
+        """Write the rows and return the `(id, task id)` of each."""
+        objects = [self.model(**dict(zip(self.columns, row))) for row in values]
+        manager = self.model.objects.using(self.using)
+        if self.kind == 'tasks':
+            with_id = [task for task in objects if task.id is not None]
+            manager.bulk_create(with_id, batch_size=1000, update_conflicts=True, unique_fields=['id'],
+                                update_fields=self.update_columns)
+            manager.bulk_create([task for task in objects if task.id is None], batch_size=1000)
+        else:
+            manager.bulk_create(objects, batch_size=1000)
+        return [(obj.id, obj.id if self.kind == 'tasks' else obj.task_id) for obj in objects]
+
+    def copy_and_merge(self, values: list[tuple]) -> list[tuple[int, int]]:
+        connection = connections[self.using]
+        quote = connection.ops.quote_name
+        table = self.model._meta.db_table
+        staging = quote(f'import_{table}')
+        columns = ', '.join(quote(column) for column in self.columns)
+
+        with connection.cursor() as cursor:
+            cursor.execute(f'CREATE TEMPORARY TABLE {staging} ON COMMIT DROP AS '
+                           f'SELECT {columns} FROM {quote(table)} WITH NO DATA')
+            copy_rows(f'import_{table}', list(self.columns), values, self.using)
+
+            if self.kind == 'time-logs':
+                # The join drops logs whose task was deleted since the chunk was validated.
+                cursor.execute(f'INSERT INTO {quote(table)} ({columns}) '
+                               f'SELECT {", ".join(f"s.{quote(column)}" for column in self.columns)} '
+                               f'FROM {staging} s JOIN {quote(Task._meta.db_table)} t ON t.id = s.task_id '
+                               f'RETURNING id, task_id')
+                imported = cursor.fetchall()
+                TaskDurationRollup.objects.db_manager(self.using).add_from_table(f'import_{table}')
+            else:
+                cursor.execute("SELECT pg_get_serial_sequence(%s, 'id')", [table])
+                sequence = cursor.fetchone()[0]
+                updates = ', '.join(f'{quote(column)} = EXCLUDED.{quote(column)}' for column in self.update_columns)
+                values = ', '.join(quote(column) for column in self.columns if column != 'id')
+                defaults = ''.join(f', {quote(column)}' for column in self.unimported_defaults)
+                placeholders = ', %s' * len(self.unimported_defaults)
+                cursor.execute(f'INSERT INTO {quote(table)} ({columns}{defaults}) '
+                               f'SELECT COALESCE(id, nextval(%s)), {values}{placeholders} FROM {staging} '
+                               f'ON CONFLICT (id) DO UPDATE SET {updates} RETURNING id, id AS task_id',
+                               [sequence, *self.unimported_defaults.values()])
+                imported = cursor.fetchall()
+
+            # ON COMMIT DROP doesn't fire when the chunk runs in a savepoint of an outer transaction.
+            cursor.execute(f'DROP TABLE {staging}')
+        return imported
+
@@ -0,0 +1,75 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.tasks.benchmarks import SCENARIOS, compare_to_baseline, run_benchmark
+from apps.tasks.generators import TaskDataGenerator
+from apps.tasks.models import Task
+
+
+class Command(BaseCommand):
+    help = ('Benchmarks the task API endpoints with concurrent in-process clients, or over HTTP with --url. '
+            'Only read-only scenarios run unless --include-writes is given')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tasks', type=int, default=0,
+                            help='Seed the database up to this many tasks before benchmarking')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--requests', type=int, default=200, help='Requests per scenario')
+        parser.add_argument('--concurrency', type=int, default=8, help='Concurrent clients')
+        parser.add_argument('--scenario', action='append', dest='scenarios',
+                            choices=[scenario.name for scenario in SCENARIOS],
+                            help='Only run the given scenario (can be repeated)')
+        parser.add_argument('--include-writes', action='store_true',
+                            help='Also run the scenarios that add comments and time logs to the tasks, which '
+                                 'stay in the database: only use it on a benchmark database')
+        parser.add_argument('--url', help='Benchmark the server running at this base URL, e.g. http://localhost:8000. '
+                                          'It must use the same database as this command')
+        parser.add_argument('--cores', type=int,
+                            help='Cores of the server under test, for requests/sec per core (default: this machine)')
+        parser.add_argument('--baseline', help='Compare against this baseline JSON file')
+        parser.add_argument('--tolerance', type=float, default=0.2,
+                            help='Allowed latency growth over the baseline, as a fraction')
+        parser.add_argument('--save-baseline', help='Write the results to this JSON file')
+
+    def handle(self, *args, **options):
+        missing = options['tasks'] - Task.objects.count()
+        if missing > 0:
+            self.stdout.write(f'Seeding {missing} tasks')
+            TaskDataGenerator(seed=options['seed'], comments_per_task=2).generate(missing)
+
+        try:
+            results = run_benchmark(options['requests'], options['concurrency'], options['scenarios'],
+                                    base_url=options['url'], cores=options['cores'],
+                                    include_writes=options['include_writes'])
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        self.write_table(results)
+
+        if options['save_baseline']:
+            with open(options['save_baseline'], 'w') as f:
+                json.dump(results, f, indent=2)
+            self.stdout.write(f'Saved baseline to {options["save_baseline"]}')
+
+        if options['baseline']:
+            with open(options['baseline']) as f:
+                baseline = json.load(f)
+            regressions = compare_to_baseline(results, baseline, options['tolerance'])
+            if regressions:
+                for regression in regressions:
+                    self.stdout.write(self.style.ERROR(regression))
+                raise CommandError(f'{len(regressions)} regressions against {options["baseline"]}')
+            self.stdout.write(self.style.SUCCESS('No regressions against the baseline'))
+
+    def write_table(self, results):
+        meta = results['meta']
+        self.stdout.write(f'{meta["tasks"]} tasks on {meta["vendor"]}, {meta["requests"]} requests per scenario, '
+                          f'concurrency {meta["concurrency"]}, {meta["target"]} on {meta["cores"]} cores')
+        columns = {'requests': 'requests', 'errors': 'errors', 'rps': 'rps', 'rps_per_core': 'rps/core',
+                   'p50_ms': 'p50 ms', 'p95_ms': 'p95 ms',
+                   'p99_ms': 'p99 ms', 'queries_per_request': 'queries/req', 'rows_scanned_per_request': 'rows/req',
+                   'connections_per_request': 'conns/req'}
+        self.stdout.write(f'{"scenario":<20}' + ''.join(f'{label:>12}' for label in columns.values()))
+        for name, summary in results['scenarios'].items():
+            self.stdout.write(f'{name:<20}' + ''.join(f'{str(summary[column]):>12}' for column in columns))
@@ -0,0 +1,42 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from apps.tasks.benchmarks import run_serialization_benchmark
+from apps.tasks.generators import TaskDataGenerator
+from apps.tasks.models import Task
+
+
+class Command(BaseCommand):
+    help = ('Compares fetching, serializing and rendering large pages with DRF model serializers '
+            'and with values() rows and the orjson renderer')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tasks', type=int, default=0,
+                            help='Seed the database up to this many tasks before benchmarking')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--rows', type=int, default=10000, help='Rows per page')
+        parser.add_argument('--repeat', type=int, default=5, help='Runs per payload, the best one counts')
+        parser.add_argument('--json', action='store_true', help='Print the results as JSON')
+
+    def handle(self, *args, **options):
+        missing = options['tasks'] - Task.objects.count()
+        if missing > 0:
+            self.stdout.write(f'Seeding {missing} tasks')
+            TaskDataGenerator(seed=options['seed'], comments_per_task=2).generate(missing)
+
+        results = run_serialization_benchmark(options['rows'], options['repeat'])
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+
+        meta = results['meta']
+        self.stdout.write(f'Pages of {meta["rows"]} rows on {meta["vendor"]}, best of {meta["repeat"]} runs')
+        columns = {'rows': 'rows', 'serialize_ms': 'serialize ms', 'render_ms': 'render ms',
+                   'rows_per_second': 'rows/sec'}
+        self.stdout.write(f'{"payload":<20}' + ''.join(f'{label:>14}' for label in columns.values()))
+        for name, payload in results['payloads'].items():
+            for way in ('drf', 'values'):
+                self.stdout.write(f'{f"{name} ({way})":<20}' +
+                                  ''.join(f'{str(payload[way][column]):>14}' for column in columns))
+            self.stdout.write(f'{f"{name} speedup":<20}{str(payload["speedup"]) + "x":>14}')
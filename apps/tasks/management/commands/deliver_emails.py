@@ -0,0 +1,84 @@
+import signal
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.mail import get_connection
+from django.core.management.base import BaseCommand
+from django.db import connection as db_connection
+
+from apps.tasks.outbox import deliver_pending
+
+
+class Command(BaseCommand):
+    """
+    SIGTERM (a container stop) and Ctrl-C let every worker finish the email it is sending,
+    hand the rest of its batch back to the outbox and exit.
+    """
+    help = 'Delivers queued notification emails from the outbox'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4, help='Number of delivery threads')
+        parser.add_argument('--batch-size', type=int, default=settings.EMAIL_OUTBOX_BATCH_SIZE,
+                            help='Emails claimed and sent per batch')
+        parser.add_argument('--poll-interval', type=float, default=5.0,
+                            help='Seconds to wait when the outbox is empty')
+        parser.add_argument('--once', action='store_true', help='Drain the outbox once and exit')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        stop = threading.Event()
+        previous_handler = signal.signal(signal.SIGTERM, lambda signum, frame: stop.set())
+        try:
+            if options['once']:
+                sent, failed = self.drain(batch_size, stop)
+                self.stdout.write(self.style.SUCCESS(f'Delivered {sent} emails, {failed} scheduled for retry'))
+                return
+            self.run_workers(max(options['workers'], 1), batch_size, options['poll_interval'], stop)
+        finally:
+            signal.signal(signal.SIGTERM, previous_handler)
+
+    def run_workers(self, workers, batch_size, poll_interval, stop):
+        self.stdout.write(f'Starting {workers} email delivery workers')
+
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='outbox') as pool:
+            for _ in range(workers):
+                pool.submit(self.work, stop, batch_size, poll_interval)
+            try:
+                while not stop.wait(1):
+                    pass
+            except KeyboardInterrupt:
+                stop.set()
+            # Leaving the block waits for the workers to finish their current email.
+            self.stdout.write('Stopping email delivery workers')
+
+    @staticmethod
+    def drain(batch_size, stop):
+        sent = failed = 0
+        connection = get_connection(fail_silently=False)
+        try:
+            while not stop.is_set():
+                batch_sent, batch_failed = deliver_pending(batch_size, connection, stop)
+                if not batch_sent and not batch_failed:
+                    return sent, failed
+                sent += batch_sent
+                failed += batch_failed
+            return sent, failed
+        finally:
+            connection.close()
+
+    def work(self, stop, batch_size, poll_interval):
+        # Each worker keeps its own SMTP connection open while there is work to do
+        # and drops it when the outbox is empty, so idle servers don't time us out.
+        try:
+            while not stop.is_set():
+                try:
+                    sent, failed = self.drain(batch_size, stop)
+                except Exception as e:
+                    self.stderr.write(self.style.ERROR(f'Email delivery failed: {e}'))
+                    sent = failed = 0
+                if sent or failed:
+                    self.stdout.write(f'Delivered {sent} emails, {failed} scheduled for retry')
+                stop.wait(poll_interval)
+        finally:
+            db_connection.close()
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.exceptions import ValidationError
+
+from apps.tasks.exports import CONTENT_TYPES, EXPORT_CHUNK_SIZE, EXPORT_COLUMNS, export_rows, render_export
+
+
+class Command(BaseCommand):
+    help = 'Streams tasks or time logs as CSV or NDJSON, filtered like the tasks list'
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=list(EXPORT_COLUMNS))
+        parser.add_argument('--format', dest='export_format', choices=list(CONTENT_TYPES), default='csv')
+        parser.add_argument('--output', '-o', help='File to write to, stdout by default')
+        parser.add_argument('--filter', action='append', default=[], metavar='FIELD=VALUE',
+                            help='TaskFilter parameter, e.g. status=open (can be repeated)')
+        parser.add_argument('--chunk-size', type=int, default=EXPORT_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        params = {}
+        for item in options['filter']:
+            field, separator, value = item.partition('=')
+            if not separator:
+                raise CommandError(f'Invalid filter "{item}", expected FIELD=VALUE')
+            params[field] = value
+
+        try:
+            rows = export_rows(options['kind'], params, options['chunk_size'])
+        except ValidationError as e:
+            raise CommandError(f'Invalid filter: {e.detail}')
+
+        chunks = render_export(options['kind'], options['export_format'], rows, options['chunk_size'])
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8', newline='') as output:
+                output.writelines(chunks)
+        else:
+            for chunk in chunks:
+                self.stdout.write(chunk, ending='')
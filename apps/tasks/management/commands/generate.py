@@ -1,19 +1,37 @@
 ﻿from django.core.management.base import BaseCommand, CommandError
 
-from apps.tasks.factories import TaskFactory, TimeLogFactory
+from apps.tasks.generators import TaskDataGenerator
 
 
 class Command(BaseCommand):
-    help = 'Generates in db tasks and time logs'
+    help = 'Generates in db users, tasks, comments and time logs'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tasks', type=int, default=25000, help='Number of tasks to create')
+        parser.add_argument('--users', type=int, default=1000,
+                            help='Size of the user pool tasks are assigned to, existing users are reused')
+        parser.add_argument('--logs-per-task', type=int, default=2)
+        parser.add_argument('--comments-per-task', type=int, default=0)
+        parser.add_argument('--seed', type=int, default=None, help='Random seed for reproducible data')
+        parser.add_argument('--chunk-size', type=int, default=5000, help='Tasks written per transaction')
+        parser.add_argument('--no-copy', action='store_true', help='Use bulk_create instead of COPY on PostgreSQL')
 
     def handle(self, *args, **options):
+        self.verbosity = options['verbosity']
+        generator = TaskDataGenerator(
+            users=options['users'],
+            logs_per_task=options['logs_per_task'],
+            comments_per_task=options['comments_per_task'],
+            seed=options['seed'],
+            chunk_size=options['chunk_size'],
+            use_copy=False if options['no_copy'] else None,
+        )
 
         try:
-            TaskFactory.create_batch(25000)
-            TimeLogFactory.create_batch(50000)
+            counts = generator.generate(options['tasks'], progress=self.report_progress)
 
             self.stdout.write(
-                self.style.SUCCESS('Successfully generated tasks and time logs in db')
+                self.style.SUCCESS(f'Successfully generated {self.format_counts(counts)} in db')
             )
 
         except Exception as e:
@@ -21,3 +39,12 @@ class Command(BaseCommand):
                 self.style.ERROR('Some errors occurred at generation tasks and time logs in db.')
             )
             raise CommandError(f'Error: {e}')
+
+    def report_progress(self, counts):
+        if self.verbosity > 1:
+            self.stdout.write(f'Generated {self.format_counts(counts)}')
+
+    @staticmethod
+    def format_counts(counts):
+        return ', '.join(f'{counts.get(name, 0)} {name.replace("_", " ")}'
+                         for name in ('users', 'tasks', 'comments', 'time_logs'))
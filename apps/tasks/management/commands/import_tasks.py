@@ -0,0 +1,49 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.tasks.imports import IMPORT_CHUNK_SIZE, IMPORT_COLUMNS, TaskImporter
+
+
+class Command(BaseCommand):
+    help = 'Imports tasks or time logs from a CSV or NDJSON file, skipping and reporting invalid rows'
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=list(IMPORT_COLUMNS))
+        parser.add_argument('path', help='CSV (with a header row) or NDJSON file')
+        parser.add_argument('--format', dest='import_format', choices=('csv', 'ndjson'),
+                            help='Defaults to ndjson for .ndjson/.jsonl files, csv otherwise')
+        parser.add_argument('--chunk-size', type=int, default=IMPORT_CHUNK_SIZE, help='Rows written per transaction')
+        parser.add_argument('--no-copy', action='store_true', help='Use bulk_create instead of COPY on PostgreSQL')
+
+    def handle(self, *args, **options):
+        self.verbosity = options['verbosity']
+        path = options['path']
+        import_format = options['import_format'] or ('ndjson' if path.endswith(('.ndjson', '.jsonl')) else 'csv')
+        importer = TaskImporter(
+            options['kind'],
+            chunk_size=options['chunk_size'],
+            use_copy=False if options['no_copy'] else None,
+        )
+
+        try:
+            with open(path, encoding='utf-8-sig', newline='') as stream:
+                result = importer.run(stream, import_format, progress=self.report_progress)
+        except OSError as e:
+            raise CommandError(f'Error: {e}')
+
+        for error in result['errors']:
+            self.stderr.write(f'Row {error["row"]}: {json.dumps(error["errors"])}')
+        if result['failed'] > len(result['errors']):
+            self.stderr.write(f'... and {result["failed"] - len(result["errors"])} more invalid rows')
+
+        message = f'Imported {self.format_counts(result)}'
+        self.stdout.write(self.style.SUCCESS(message) if not result['failed'] else self.style.WARNING(message))
+
+    def report_progress(self, counts):
+        if self.verbosity > 1:
+            self.stdout.write(f'Processed {self.format_counts(counts)}')
+
+    @staticmethod
+    def format_counts(counts):
+        return ', '.join(f'{counts[name]} {name}' for name in ('rows', 'imported', 'skipped', 'failed'))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from apps.tasks.changes import retention_cutoff
+from apps.tasks.models import ChangeLog
+
+
+class Command(BaseCommand):
+    help = ('Deletes the change feed entries older than CHANGE_LOG_RETENTION_DAYS, clients that synced before '
+            'then are told to resync. Run it daily, from cron for example')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=10000)
+
+    def handle(self, *args, **options):
+        deleted = ChangeLog.objects.prune(retention_cutoff(), batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} changes'))
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from apps.tasks.cache import invalidate_analytics
+from apps.tasks.models import TaskDurationRollup
+
+
+class Command(BaseCommand):
+    help = 'Recomputes the per-task monthly duration rollups from the raw time logs'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--task', type=int, action='append', dest='task_ids',
+                            help='Only rebuild the given task id (can be repeated)')
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        written = TaskDurationRollup.objects.rebuild(task_ids=options['task_ids'], chunk_size=options['chunk_size'])
+        invalidate_analytics(all_users=True)
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {written} duration rollups'))
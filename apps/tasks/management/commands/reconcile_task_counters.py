@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from apps.tasks.models import Task
+
+
+class Command(BaseCommand):
+    help = 'Recomputes the comment and logged time counters of tasks from their comments and time logs'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--task', type=int, action='append', dest='task_ids',
+                            help='Only reconcile the given task id (can be repeated)')
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        refreshed = Task.objects.refresh_counters(task_ids=options['task_ids'], chunk_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(f'Fixed the counters of {refreshed} tasks'))
@@ -0,0 +1,56 @@
+# Generated by Django 4.2.30 on 2026-10-18 09:07
+
+from django.db import migrations, models
+from django.db.models import Count, DateField, Sum
+from django.db.models.functions import TruncMonth
+import django.db.models.deletion
+
+
+def backfill_rollups(apps, schema_editor):
+    TimeLog = apps.get_model('tasks', 'TimeLog')
+    TaskDurationRollup = apps.get_model('tasks', 'TaskDurationRollup')
+
+    rows = (TimeLog.objects
+            .filter(duration__isnull=False)
+            .annotate(bucket=TruncMonth('start_time', output_field=DateField()))
+            .values('task_id', 'bucket')
+            .annotate(total_duration=Sum('duration'), total_logs=Count('id'))
+            .order_by())
+
+    TaskDurationRollup.objects.bulk_create(
+        (TaskDurationRollup(task_id=row['task_id'], month=row['bucket'],
+                            duration=row['total_duration'], log_count=row['total_logs'])
+         for row in rows.iterator()),
+        batch_size=2000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0004_outboxemail'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TaskDurationRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(blank=True, null=True)),
+                ('duration', models.BigIntegerField(default=0)),
+                ('log_count', models.IntegerField(default=0)),
+                ('task', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='duration_rollups', to='tasks.task')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['month', 'task'], name='rollup_month_task_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='taskdurationrollup',
+            constraint=models.UniqueConstraint(fields=('task', 'month'), name='unique_task_month_rollup'),
+        ),
+        migrations.AddConstraint(
+            model_name='taskdurationrollup',
+            constraint=models.UniqueConstraint(condition=models.Q(('month__isnull', True)), fields=('task',), name='unique_task_undated_rollup'),
+        ),
+        migrations.RunPython(backfill_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.2.30 on 2026-10-18 09:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0005_taskdurationrollup'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['created_at', 'id'], name='task_created_at_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['status', 'id'], name='task_status_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['title', 'id'], name='task_title_id_idx'),
+        ),
+    ]
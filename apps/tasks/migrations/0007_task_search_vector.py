@@ -0,0 +1,56 @@
+# Generated by Django 4.2.30 on 2026-10-18 09:09
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+SEARCH_VECTOR_SQL = """
+CREATE FUNCTION tasks_task_search_vector_update() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector :=
+        setweight(to_tsvector('pg_catalog.english', coalesce(NEW.title, '')), 'A') ||
+        setweight(to_tsvector('pg_catalog.english', coalesce(NEW.description, '')), 'B');
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER tasks_task_search_vector_trigger
+    BEFORE INSERT OR UPDATE OF title, description, search_vector ON tasks_task
+    FOR EACH ROW EXECUTE FUNCTION tasks_task_search_vector_update();
+
+UPDATE tasks_task SET search_vector = NULL;
+
+CREATE INDEX task_search_vector_idx ON tasks_task USING gin (search_vector);
+"""
+
+DROP_SEARCH_VECTOR_SQL = """
+DROP INDEX IF EXISTS task_search_vector_idx;
+DROP TRIGGER IF EXISTS tasks_task_search_vector_trigger ON tasks_task;
+DROP FUNCTION IF EXISTS tasks_task_search_vector_update();
+"""
+
+
+def create_search_trigger(apps, schema_editor):
+    # Full-text search is PostgreSQL only, other backends fall back to ILIKE search.
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(SEARCH_VECTOR_SQL)
+
+
+def drop_search_trigger(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(DROP_SEARCH_VECTOR_SQL)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0006_task_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='task',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(create_search_trigger, drop_search_trigger),
+    ]
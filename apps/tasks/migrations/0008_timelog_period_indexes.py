@@ -0,0 +1,21 @@
+# Generated by Django 4.2.30 on 2026-10-18 09:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0007_task_search_vector'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='timelog',
+            index=models.Index(fields=['task', 'start_time'], name='timelog_task_start_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='timelog',
+            index=models.Index(fields=['start_time'], include=('task', 'duration'), name='timelog_start_duration_idx'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 4.2.30 on 2026-10-18 10:00
+
+from django.db import migrations, models
+from django.db.models import Count, F, Max
+
+
+def close_duplicate_open_timers(apps, schema_editor):
+    # Only the latest timer of a task stays running. The older ones end where they started
+    # and keep no duration, so they still add nothing to the logged time.
+    TimeLog = apps.get_model('tasks', 'TimeLog')
+    open_timers = TimeLog.objects.filter(start_time__isnull=False, end_time__isnull=True, duration__isnull=True)
+    duplicated = (open_timers.values('task_id').annotate(latest_id=Max('id'), timers=Count('id'))
+                  .filter(timers__gt=1).order_by())
+    for row in duplicated.iterator():
+        open_timers.filter(task_id=row['task_id']).exclude(id=row['latest_id']).update(end_time=F('start_time'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0008_timelog_period_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(close_duplicate_open_timers, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='timelog',
+            constraint=models.UniqueConstraint(condition=models.Q(('duration__isnull', True), ('end_time__isnull', True), ('start_time__isnull', False)), fields=('task',), name='unique_open_timer'),
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 4.2.30 on 2026-10-18 10:05
+
+from django.db import migrations, models
+from django.db.models import Count, Exists, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def backfill_counters(apps, schema_editor):
+    Task = apps.get_model('tasks', 'Task')
+    Comment = apps.get_model('tasks', 'Comment')
+    TimeLog = apps.get_model('tasks', 'TimeLog')
+
+    comments = Comment.objects.filter(task=OuterRef('pk')).order_by()
+    time_logs = TimeLog.objects.filter(task=OuterRef('pk')).order_by()
+    Task.objects.filter(Exists(comments) | Exists(time_logs)).update(
+        comment_count=Coalesce(Subquery(comments.values('task').annotate(total=Count('id')).values('total')), 0),
+        total_logged_minutes=Coalesce(Subquery(time_logs.filter(duration__isnull=False).values('task')
+                                               .annotate(total=Sum('duration')).values('total')), 0),
+        open_timer=Exists(time_logs.filter(start_time__isnull=False, end_time__isnull=True, duration__isnull=True)),
+        last_activity_at=Subquery(time_logs.annotate(at=Coalesce('end_time', 'start_time'))
+                                  .filter(at__isnull=False).order_by('-at').values('at')[:1]),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0009_timelog_unique_open_timer'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='task',
+            name='comment_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='task',
+            name='last_activity_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='task',
+            name='open_timer',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.AddField(
+            model_name='task',
+            name='total_logged_minutes',
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 4.2.30 on 2026-10-18 10:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0010_task_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChangeLog',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('task', 'Task'), ('comment', 'Comment'), ('time_log', 'Time Log')], max_length=10)),
+                ('object_id', models.BigIntegerField()),
+                ('task_id', models.BigIntegerField()),
+                ('transaction_id', models.BigIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['transaction_id', 'id'], name='changelog_position_idx')],
+            },
+        ),
+    ]
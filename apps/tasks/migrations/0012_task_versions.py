@@ -0,0 +1,28 @@
+# Generated by Django 4.2.30 on 2026-10-18 10:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0011_changelog'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='task',
+            name='children_updated_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='task',
+            name='comments_version',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='task',
+            name='time_logs_version',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+    ]
@@ -1,10 +1,31 @@
+from datetime import date, datetime
+from typing import Iterable
+
 from django.contrib.auth.models import User
-from django.core.mail import send_mail
-from django.db import models
+from django.contrib.postgres.search import SearchVectorField
+from django.db import IntegrityError, connections, models, router, transaction
+from django.db.models import Count, DateField, Exists, F, OuterRef, Q, Subquery, Sum
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Coalesce, TruncMonth
+from django.utils import timezone
+
+from apps.common.bulk import chunked
 
 
 # Create your models here.
 
+NOTIFICATION_SENDER = 'expeditor@exemplu.com'
+
+
+def month_bucket(value: datetime | None) -> date | None:
+    """Return the first day of the month `value` falls into, in the current time zone."""
+    if value is None:
+        return None
+    if timezone.is_naive(value):
+        value = timezone.make_aware(value)
+    return timezone.localtime(value).date().replace(day=1)
+
+
 class StatusEnum(models.TextChoices):
     OPEN = 'open'
     IN_PROGRESS = 'in_progress'
@@ -13,67 +34,553 @@ class StatusEnum(models.TextChoices):
     ARCHIVED = 'archived'
 
 
-class Task(models.Model):
+# Denormalized from the task's comments and time logs, only ever written with `TaskManager`
+# updates so that concurrent writes add up. The versions count the changes to each kind of
+# children, for the HTTP validators of apps.tasks.conditional.
+COUNTER_FIELDS = ('comment_count', 'total_logged_minutes', 'open_timer', 'last_activity_at',
+                  'comments_version', 'time_logs_version', 'children_updated_at')
+
+
+class AtomicSaveModel(models.Model):
+    """
+    Saves the row and runs its `post_save` receivers (counters, rollups, change log) in one
+    transaction, like Django already does for deletes.
+    """
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        using = kwargs.get('using') or router.db_for_write(type(self), instance=self)
+        with transaction.atomic(using=using, savepoint=False):
+            super().save(*args, **kwargs)
+
+
+class TaskManager(models.Manager):
+    def record_activity(self, task_id: int, kind: str, comments: int = 0, minutes: int = 0, open_timer=None,
+                        touch: bool = True) -> None:
+        """
+        Record that a comment or time log (`kind`) of a task changed: bump its version and apply
+        comment and logged minutes deltas to its counters, in one `UPDATE`.
+        `open_timer` is a bool or an expression, None to leave it. `touch` sets `last_activity_at`.
+        Not logged as a change of the task, the change feed resends a task with its comments and
+        time logs.
+        """
+        changes = version_bumps(kind)
+        if comments:
+            changes['comment_count'] = F('comment_count') + comments
+        if minutes:
+            changes['total_logged_minutes'] = F('total_logged_minutes') + minutes
+        if open_timer is not None:
+            changes['open_timer'] = open_timer
+        if touch:
+            changes['last_activity_at'] = changes['children_updated_at']
+        self.filter(pk=task_id).update(**changes)
+
+    def bump_versions(self, task_ids: Iterable[int], kind: str) -> None:
+        """Record that comments or time logs (`kind`) of tasks were written without `record_activity`."""
+        self.filter(pk__in=task_ids).update(**version_bumps(kind))
+
+    def refresh_counters(self, task_ids=None, chunk_size: int = 2000) -> int:
+        """
+        Recompute the counters of `task_ids` (every task by default) from the comments and time
+        logs, and return the number of tasks that were off. `last_activity_at` can't be
+        recomputed (comments have no timestamps), it's only filled in from the time logs when empty.
+        The versions of the tasks that change are bumped.
+        """
+        tasks = self.all() if task_ids is None else self.filter(pk__in=task_ids)
+        counters = task_counters()
+        stale = (tasks.annotate(**{f'actual_{name}': expression for name, expression in counters.items()})
+                 .exclude(comment_count=F('actual_comment_count'),
+                          total_logged_minutes=F('actual_total_logged_minutes'),
+                          open_timer=F('actual_open_timer'))
+                 .values_list('pk', flat=True))
+
+        refreshed = 0
+        for chunk in chunked(list(stale), chunk_size):
+            with transaction.atomic(using=self.write_db):
+                refreshed += self.filter(pk__in=chunk).update(
+                    **counters, **version_bumps(ChangeKind.COMMENT, ChangeKind.TIME_LOG))
+                ChangeLog.objects.db_manager(self.write_db).record_tasks(chunk)
+
+        unfilled = (tasks.filter(last_activity_at__isnull=True).annotate(latest=latest_time_log())
+                    .filter(latest__isnull=False).values_list('pk', flat=True))
+        for chunk in chunked(list(unfilled), chunk_size):
+            with transaction.atomic(using=self.write_db):
+                self.filter(pk__in=chunk).update(last_activity_at=latest_time_log(),
+                                                 **version_bumps(ChangeKind.TIME_LOG))
+                ChangeLog.objects.db_manager(self.write_db).record_tasks(chunk)
+        return refreshed
+
+    @property
+    def write_db(self) -> str:
+        return self._db or router.db_for_write(self.model)
+
+
+def version_bumps(*kinds: str) -> dict:
+    """The updates recording that children of `kinds` (`ChangeKind.COMMENT`, `ChangeKind.TIME_LOG`) changed."""
+    changes = {VERSION_FIELDS[kind]: F(VERSION_FIELDS[kind]) + 1 for kind in kinds}
+    changes['children_updated_at'] = timezone.now()
+    return changes
+
+
+def task_counters() -> dict:
+    """Expressions computing the counters of the outer task from its comments and time logs."""
+    def total(queryset, aggregate):
+        return Coalesce(Subquery(queryset.order_by().values('task').annotate(total=aggregate).values('total')), 0)
+
+    return {
+        'comment_count': total(Comment.objects.filter(task=OuterRef('pk')), Count('id')),
+        'total_logged_minutes': total(TimeLog.objects.filter(task=OuterRef('pk'), duration__isnull=False),
+                                      Sum('duration')),
+        'open_timer': open_timer_exists(),
+    }
+
+
+def open_timer_exists() -> Exists:
+    return Exists(TimeLog.objects.filter(OPEN_TIMER, task=OuterRef('pk')))
+
+
+def latest_time_log() -> Subquery:
+    return Subquery(TimeLog.objects.filter(task=OuterRef('pk')).annotate(at=Coalesce('end_time', 'start_time'))
+                    .filter(at__isnull=False).order_by('-at').values('at')[:1])
+
+
+class Task(AtomicSaveModel):
     title = models.CharField(max_length=255)
     description = models.TextField()
     status = models.CharField(choices=StatusEnum.choices, max_length=20, default=StatusEnum.OPEN, db_index=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, related_name='tasks')
+    # Maintained by a database trigger on PostgreSQL, see migration 0007. Stays empty elsewhere.
+    search_vector = SearchVectorField(null=True, editable=False)
+    comment_count = models.IntegerField(default=0, editable=False)
+    total_logged_minutes = models.BigIntegerField(default=0, editable=False)
+    open_timer = models.BooleanField(default=False, editable=False)
+    last_activity_at = models.DateTimeField(null=True, blank=True, editable=False)
+    # Bumped with every change to the task's comments and time logs, see `TaskManager.record_activity`
+    comments_version = models.IntegerField(default=0, editable=False)
+    time_logs_version = models.IntegerField(default=0, editable=False)
+    children_updated_at = models.DateTimeField(null=True, blank=True, editable=False)
+
+    objects = TaskManager()
+
+    class Meta:
+        indexes = [
+            # Keyset pagination seeks on (ordering field, id)
+            models.Index(fields=['created_at', 'id'], name='task_created_at_id_idx'),
+            models.Index(fields=['status', 'id'], name='task_status_id_idx'),
+            models.Index(fields=['title', 'id'], name='task_title_id_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the owner when loaded, so a reassignment can invalidate both users' analytics.
+        if 'user_id' not in instance.get_deferred_fields():
+            instance._loaded_user_id = instance.user_id
+        return instance
 
-    def task_completed_email(self):
+    def save(self, *args, **kwargs):
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            # Saving a loaded task must not write back counters that changed since it was loaded.
+            deferred = self.get_deferred_fields()
+            kwargs['update_fields'] = [field.attname for field in self._meta.concrete_fields
+                                       if not field.primary_key and field.name not in COUNTER_FIELDS
+                                       and field.attname not in deferred]
+        super().save(*args, **kwargs)
+
+    def task_completed_email(self, commit=True):
         user_to_notify = self.user
-        if user_to_notify is None or user_to_notify.email is None:
-            return
-        user_email = user_to_notify.email
+        if user_to_notify is None or not user_to_notify.email:
+            return None
 
-        send_mail(
+        return OutboxEmail.queue(
             f'Subject: Task completed: {self.title}',
             f'Hello {user_to_notify.username} \n\nTask you are assigned was set as completed\n\nTask: {self.title}\nDescription: {self.description}\nStatus: {self.status}\n',
-            'expeditor@exemplu.com',
-            [f'{user_email}'],
-            fail_silently=False,
+            user_to_notify.email,
+            commit=commit,
         )
 
-    def task_commented_email(self, comment):
+    def task_commented_email(self, comment, commit=True):
         user_to_notify = self.user
-        if user_to_notify is None or user_to_notify.email is None:
-            return
-        user_email = user_to_notify.email
+        if user_to_notify is None or not user_to_notify.email:
+            return None
 
-        send_mail(
+        return OutboxEmail.queue(
             f'Subject: Comment add to task: {self.title}',
             f'Hello {user_to_notify.username} \n\nA new comment was added to task you are assigned.\n\nTask: {self.title}\nDescription: {self.description}\nStatus: {self.status}\nNew Comment: {comment}',
-            'expeditor@exemplu.com',
-            [f'{user_email}'],
-            fail_silently=False,
+            user_to_notify.email,
+            commit=commit,
         )
 
-    def user_assigned_to_task_email(self):
+    def user_assigned_to_task_email(self, commit=True):
         user_to_notify = self.user
-        if user_to_notify is None or user_to_notify.email is None:
-            return
-        user_email = user_to_notify.email
+        if user_to_notify is None or not user_to_notify.email:
+            return None
 
-        send_mail(
+        return OutboxEmail.queue(
             f'Subject: You have been assigned a new task: {self.title}',
             f'Hello {user_to_notify.username} \n\nThis message is to inform you that you have been assigned to a new task. The task details are as follows:\n\nTask: {self.title}\nDescription: {self.description}\nStatus: {self.status}\nCreated At: {self.created_at}',
-            'expeditor@exemplu.com',
-            [f'{user_email}'],
-            fail_silently=False,
+            user_to_notify.email,
+            commit=commit,
         )
 
     def __str__(self):
         return self.title
 
 
-class Comment(models.Model):
+class Comment(AtomicSaveModel):
     content = models.TextField(max_length=250)
     task = models.ForeignKey(Task, on_delete=models.CASCADE, related_name='comments')
 
 
-class TimeLog(models.Model):
+# A timer started with `start-timer` and not stopped yet. Logged time always has a duration.
+OPEN_TIMER = Q(start_time__isnull=False, end_time__isnull=True, duration__isnull=True)
+# The index predicate Django generates for OPEN_TIMER. SQLite only infers the index for
+# ON CONFLICT from the very same expression.
+OPEN_TIMER_SQL = 'duration IS NULL AND end_time IS NULL AND start_time IS NOT NULL'
+
+# Whole minutes from the `start_time` column to the timestamp passed as parameter
+ELAPSED_MINUTES_SQL = {
+    'postgresql': 'FLOOR(EXTRACT(EPOCH FROM %s - start_time) / 60)::integer',
+    'sqlite': 'CAST(ROUND((julianday(%s) - julianday(start_time)) * 86400000) / 60000 AS INTEGER)',
+}
+
+
+class TimeLogManager(models.Manager):
+    """
+    Timers as single statements: the `unique_open_timer` index lets one of two concurrent
+    starts insert, and the conditional update lets one of two concurrent stops close the timer.
+    The task's counters and the change log are updated in the same transaction.
+    """
+
+    def start_timer(self, task_id: int, now: datetime = None) -> 'TimeLog | None':
+        """
+        Start a timer on a task, None if the task doesn't exist or has a timer running. The
+        returned log carries its task's `task_user_id`.
+        """
+        time_logs, tasks = self.quoted_tables()
+        sql = (f'INSERT INTO {time_logs} (task_id, start_time) SELECT id, %s FROM {tasks} WHERE id = %s '
+               f'ON CONFLICT (task_id) WHERE {OPEN_TIMER_SQL} DO NOTHING '
+               f'RETURNING id, task_id, start_time, end_time, duration, '
+               f'(SELECT user_id FROM {tasks} WHERE {tasks}.id = task_id) AS task_user_id')
+        now = now or timezone.now()
+        with transaction.atomic(using=self.write_db):
+            time_log = self.first_row(sql, [now, task_id])
+            if time_log is not None:
+                ChangeLog.objects.db_manager(self.write_db).record(ChangeKind.TIME_LOG, [(time_log.id, task_id)])
+                Task.objects.db_manager(self.write_db).record_activity(task_id, ChangeKind.TIME_LOG, open_timer=True)
+        return time_log
+
+    def stop_timer(self, task_id: int, now: datetime = None) -> 'TimeLog | None':
+        """
+        Stop the timer running on a task and add its minutes to the rollups and the task's
+        counters, None if no timer is running. The returned log carries its task's `task_user_id`.
+        """
+        now = now or timezone.now()
+        time_logs, tasks = self.quoted_tables()
+        minutes = ELAPSED_MINUTES_SQL[connections[self.write_db].vendor]
+        sql = (f'UPDATE {time_logs} SET end_time = %s, duration = {minutes} '
+               f'WHERE task_id = %s AND {OPEN_TIMER_SQL} '
+               f'RETURNING id, task_id, start_time, end_time, duration, '
+               f'(SELECT user_id FROM {tasks} WHERE {tasks}.id = task_id) AS task_user_id')
+        with transaction.atomic(using=self.write_db):
+            time_log = self.first_row(sql, [now, now, task_id])
+            if time_log is not None:
+                # No post_save signal for this update
+                ChangeLog.objects.db_manager(self.write_db).record(ChangeKind.TIME_LOG, [(time_log.id, task_id)])
+                TaskDurationRollup.objects.db_manager(self.write_db).add(*time_log.rollup_contribution(), 1)
+                Task.objects.db_manager(self.write_db).record_activity(task_id, ChangeKind.TIME_LOG,
+                                                                       minutes=time_log.duration, open_timer=False)
+        return time_log
+
+    @property
+    def write_db(self) -> str:
+        return self._db or router.db_for_write(self.model)
+
+    def quoted_tables(self) -> tuple[str, str]:
+        quote = connections[self.write_db].ops.quote_name
+        return quote(self.model._meta.db_table), quote(Task._meta.db_table)
+
+    def first_row(self, sql: str, params: list) -> 'TimeLog | None':
+        # A raw queryset runs the statement once and converts the returned columns like a query would.
+        return next(iter(self.raw(sql, params, using=self.write_db)), None)
+
+
+class TimeLog(AtomicSaveModel):
     task = models.ForeignKey(Task, on_delete=models.CASCADE, related_name='time_logs')
     start_time = models.DateTimeField(null=True, blank=True)
     end_time = models.DateTimeField(null=True, blank=True)
     duration = models.IntegerField(null=True, blank=True)
+
+    objects = TimeLogManager()
+
+    class Meta:
+        constraints = [
+            # At most one running timer per task, see `TimeLogManager`
+            models.UniqueConstraint(fields=['task'], condition=OPEN_TIMER, name='unique_open_timer'),
+        ]
+        indexes = [
+            # Range scans of a task's (or a user's tasks') logs over a period
+            models.Index(fields=['task', 'start_time'], name='timelog_task_start_idx'),
+            # Covering index for period aggregates over all tasks (INCLUDE is PostgreSQL only)
+            models.Index(fields=['start_time'], include=['task', 'duration'], name='timelog_start_duration_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember what this row contributed to the duration rollup when it was loaded,
+        # so a later save only has to apply the difference.
+        if not instance.get_deferred_fields() & {'task_id', 'start_time', 'duration'}:
+            instance._rollup_contribution = instance.rollup_contribution()
+        return instance
+
+    @property
+    def is_open_timer(self) -> bool:
+        return self.start_time is not None and self.end_time is None and self.duration is None
+
+    def rollup_contribution(self) -> tuple | None:
+        """The `(task_id, month, duration)` this log adds to `TaskDurationRollup`, if any."""
+        if self.duration is None:
+            return None
+        return self.task_id, month_bucket(self.start_time), self.duration
+
+
+class TaskDurationRollupManager(models.Manager):
+    def add(self, task_id: int, month: date | None, duration: int, log_count: int) -> None:
+        """Atomically add `duration` minutes and `log_count` logs to a task's month bucket."""
+        bucket = self.filter(task_id=task_id, month=month)
+        updated = bucket.update(duration=F('duration') + duration, log_count=F('log_count') + log_count)
+
+        # Removing time from a bucket that doesn't exist (e.g. while its task is being
+        # deleted) is a no-op, only additions create new buckets.
+        if updated or log_count <= 0:
+            return
+
+        try:
+            with transaction.atomic():
+                self.create(task_id=task_id, month=month, duration=duration, log_count=log_count)
+        except IntegrityError:
+            # Another transaction created the bucket first, or the task is gone.
+            bucket.update(duration=F('duration') + duration, log_count=F('log_count') + log_count)
+
+    def add_from_table(self, table: str, join_tasks: bool = True, using: str = None) -> None:
+        """
+        Add the time logs held in `table` (with `task_id`, `start_time` and `duration`
+        columns, e.g. a staging table) to their buckets with one upsert per kind of bucket.
+
+        PostgreSQL only. Buckets use the current time zone, like `month_bucket`.
+        """
+        connection = connections[using or self.db]
+        quote = connection.ops.quote_name
+        rollups = quote(self.model._meta.db_table)
+        join = f'JOIN {quote(Task._meta.db_table)} t ON t.id = s.task_id' if join_tasks else ''
+        increment = (f'duration = {rollups}.duration + EXCLUDED.duration, '
+                     f'log_count = {rollups}.log_count + EXCLUDED.log_count')
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {rollups} (task_id, month, duration, log_count) '
+                f"SELECT s.task_id, date_trunc('month', s.start_time AT TIME ZONE %s)::date, "
+                f'SUM(s.duration), COUNT(*) FROM {quote(table)} s {join} '
+                f'WHERE s.start_time IS NOT NULL AND s.duration IS NOT NULL GROUP BY 1, 2 '
+                f'ON CONFLICT (task_id, month) DO UPDATE SET {increment}',
+                [timezone.get_current_timezone_name()])
+            cursor.execute(
+                f'INSERT INTO {rollups} (task_id, month, duration, log_count) '
+                f'SELECT s.task_id, NULL, SUM(s.duration), COUNT(*) FROM {quote(table)} s {join} '
+                f'WHERE s.start_time IS NULL AND s.duration IS NOT NULL GROUP BY 1 '
+                f'ON CONFLICT (task_id) WHERE month IS NULL DO UPDATE SET {increment}')
+
+    def rebuild(self, task_ids=None, chunk_size: int = 2000) -> int:
+        """Recompute rollups from the raw time logs and return the number of buckets written."""
+        time_logs = TimeLog.objects.filter(duration__isnull=False)
+        rollups = self.all()
+        if task_ids is not None:
+            time_logs = time_logs.filter(task_id__in=task_ids)
+            rollups = rollups.filter(task_id__in=task_ids)
+
+        rows = (time_logs
+                .annotate(bucket=TruncMonth('start_time', output_field=DateField()))
+                .values('task_id', 'bucket')
+                .annotate(total_duration=Sum('duration'), total_logs=Count('id'))
+                .order_by())
+
+        written = 0
+        with transaction.atomic():
+            rollups.delete()
+            chunk = []
+            for row in rows.iterator(chunk_size=chunk_size):
+                chunk.append(self.model(task_id=row['task_id'], month=row['bucket'],
+                                        duration=row['total_duration'], log_count=row['total_logs']))
+                if len(chunk) >= chunk_size:
+                    written += len(self.bulk_create(chunk))
+                    chunk = []
+            written += len(self.bulk_create(chunk))
+
+        return written
+
+
+class TaskDurationRollup(models.Model):
+    """Logged minutes per task and calendar month, kept in step with `TimeLog` writes."""
+    task = models.ForeignKey(Task, on_delete=models.CASCADE, related_name='duration_rollups')
+    month = models.DateField(null=True, blank=True)
+    duration = models.BigIntegerField(default=0)
+    log_count = models.IntegerField(default=0)
+
+    objects = TaskDurationRollupManager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['task', 'month'], name='unique_task_month_rollup'),
+            models.UniqueConstraint(fields=['task'], condition=Q(month__isnull=True),
+                                    name='unique_task_undated_rollup'),
+        ]
+        indexes = [
+            models.Index(fields=['month', 'task'], name='rollup_month_task_idx'),
+        ]
+
+
+class OutboxStatusEnum(models.TextChoices):
+    PENDING = 'pending'
+    SENT = 'sent'
+    FAILED = 'failed'
+
+
+class OutboxEmail(models.Model):
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    from_email = models.CharField(max_length=255)
+    recipient = models.EmailField()
+    status = models.CharField(choices=OutboxStatusEnum.choices, max_length=20, default=OutboxStatusEnum.PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['next_attempt_at'],
+                condition=models.Q(status=OutboxStatusEnum.PENDING),
+                name='outbox_pending_idx'),
+        ]
+
+    @classmethod
+    def queue(cls, subject, body, recipient, commit=True):
+        """Write a notification to the outbox in the caller's transaction.
+
+        Nothing is sent here; the `deliver_emails` command picks the row up once
+        the transaction has committed. With `commit=False` the unsaved email is
+        returned so callers can queue many at once with `bulk_create`.
+        """
+        email = cls(subject=subject, body=body, from_email=NOTIFICATION_SENDER, recipient=recipient)
+        if commit:
+            email.save()
+        return email
+
+    def __str__(self):
+        return f'{self.recipient}: {self.subject}'
+
+
+class ChangeKind(models.TextChoices):
+    TASK = 'task'
+    COMMENT = 'comment'
+    TIME_LOG = 'time_log'
+
+
+# The version field of a task counting the changes to its children of each kind
+VERSION_FIELDS = {ChangeKind.COMMENT: 'comments_version', ChangeKind.TIME_LOG: 'time_logs_version'}
+
+
+# The id of the current transaction, increasing in the order transactions start. SQLite runs
+# one write transaction at a time, so there the change ids alone are in commit order.
+CURRENT_TRANSACTION_SQL = {
+    'postgresql': 'pg_current_xact_id()::text::bigint',
+}
+# Every transaction with a lower id has finished, so no change can still appear below it.
+SETTLED_TRANSACTIONS_SQL = {
+    'postgresql': 'pg_snapshot_xmin(pg_current_snapshot())::text::bigint',
+}
+
+
+class CurrentTransaction(models.Func):
+    output_field = models.BigIntegerField()
+
+    def as_sql(self, compiler, connection, **extra_context):
+        return CURRENT_TRANSACTION_SQL.get(connection.vendor, '0'), []
+
+
+class ChangeLogManager(models.Manager):
+    def record(self, kind: str, changes: Iterable[tuple[int, int]]) -> None:
+        """Log writes to `kind` objects, given as `(object id, task id)`, in the caller's transaction."""
+        self.bulk_create([self.model(kind=kind, object_id=object_id, task_id=task_id,
+                                     transaction_id=CurrentTransaction())
+                          for object_id, task_id in changes], batch_size=1000)
+
+    def record_tasks(self, task_ids: Iterable[int]) -> None:
+        self.record(ChangeKind.TASK, ((task_id, task_id) for task_id in task_ids))
+
+    def record_query(self, kind: str, queryset) -> int:
+        """`record` the comments or time logs of `queryset` with one `INSERT ... SELECT`, for writes without ids."""
+        using = self._db or router.db_for_write(self.model)
+        connection = connections[using]
+        quote = connection.ops.quote_name
+        select, params = queryset.values_list('pk', 'task_id').query.get_compiler(using).as_sql()
+        sql = (f'INSERT INTO {quote(self.model._meta.db_table)} (kind, object_id, task_id, transaction_id, created_at) '
+               f'SELECT %s, changed.id, changed.task_id, {CURRENT_TRANSACTION_SQL.get(connection.vendor, "0")}, %s '
+               f'FROM ({select}) changed')
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [kind, timezone.now(), *params])
+            return cursor.rowcount
+
+    def settled(self):
+        """Changes no unfinished transaction can still appear before, in the order clients read them."""
+        changes = self.order_by('transaction_id', 'id')
+        vendor = connections[self.db].vendor
+        if vendor in SETTLED_TRANSACTIONS_SQL:
+            changes = changes.filter(transaction_id__lt=RawSQL(SETTLED_TRANSACTIONS_SQL[vendor], []))
+        return changes
+
+    def prune(self, before: datetime, batch_size: int = 10000) -> int:
+        """
+        Delete the changes made before `before` but the latest of them, kept to mark where the
+        deleted ones end (see `apps.tasks.changes`). Returns how many were deleted.
+        """
+        marker = self.filter(created_at__lt=before).order_by('-transaction_id', '-id').first()
+        if marker is None:
+            return 0
+        older = self.filter(Q(transaction_id__lt=marker.transaction_id)
+                            | Q(transaction_id=marker.transaction_id, id__lt=marker.id))
+        deleted = 0
+        while ids := list(older.values_list('id', flat=True)[:batch_size]):
+            deleted += self.filter(id__in=ids).delete()[0]
+        return deleted
+
+
+class ChangeLog(models.Model):
+    """
+    One row per write to a task, comment or time log, added in the writing transaction. Read
+    in `(transaction_id, id)` order by the change feed, see `apps.tasks.changes`.
+    """
+    kind = models.CharField(choices=ChangeKind.choices, max_length=10)
+    object_id = models.BigIntegerField()
+    # The task written or the one the comment or time log belongs to. Not a foreign key, the
+    # change outlives the task.
+    task_id = models.BigIntegerField()
+    transaction_id = models.BigIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    objects = ChangeLogManager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['transaction_id', 'id'], name='changelog_position_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.kind} {self.object_id}'
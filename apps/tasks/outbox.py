@@ -0,0 +1,130 @@
+import logging
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.utils import timezone
+
+from apps.common.metrics import get_registry
+from .models import OutboxEmail, OutboxStatusEnum
+
+logger = logging.getLogger(__name__)
+
+
+def backoff_delay(attempts: int) -> timedelta:
+    """Exponential backoff for the next delivery attempt, capped at one hour."""
+    seconds = settings.EMAIL_OUTBOX_BACKOFF_SECONDS * 2 ** max(attempts - 1, 0)
+    return timedelta(seconds=min(seconds, 3600))
+
+
+# Written after each delivery attempt
+RESULT_FIELDS = ['status', 'attempts', 'next_attempt_at', 'last_error', 'sent_at']
+
+
+def deliver_pending(batch_size: int = None, connection=None, stop: threading.Event = None) -> tuple[int, int]:
+    """
+    Deliver one batch of due outbox emails and return `(sent, failed)` counts.
+
+    The batch is claimed in a short transaction (see `claim_batch`) and sent outside of
+    it, each result written as soon as it's known, so a slow mail server holds no row lock
+    or open transaction. The whole batch goes over a single SMTP connection; pass
+    `connection` to keep it open across batches. Once `stop` is set, the email being sent
+    is finished and the rest of the batch handed back to the outbox.
+    """
+    batch = claim_batch(batch_size or settings.EMAIL_OUTBOX_BATCH_SIZE)
+    if not batch:
+        return 0, 0
+
+    sent, failed, unsent = _send_batch(batch, connection or get_connection(fail_silently=False),
+                                       close=connection is None, stop=stop)
+    if unsent:
+        OutboxEmail.objects.filter(pk__in=[email.pk for email in unsent]).update(next_attempt_at=timezone.now())
+
+    registry = get_registry()
+    registry.inc('emails_sent_total', sent)
+    registry.inc('emails_failed_total', failed)
+
+    return sent, failed
+
+
+def claim_batch(batch_size: int) -> list[OutboxEmail]:
+    """
+    Claim up to `batch_size` due emails by moving their `next_attempt_at` past the claim
+    timeout. Rows are locked with `SELECT ... FOR UPDATE SKIP LOCKED` only while they are
+    claimed, so several workers can drain the outbox concurrently without sending the same
+    email twice. Emails a worker claimed but never got to (it was killed) are due again
+    after the timeout.
+    """
+    now = timezone.now()
+    claimed_until = now + timedelta(seconds=settings.EMAIL_OUTBOX_CLAIM_SECONDS)
+    with transaction.atomic():
+        batch = list(
+            OutboxEmail.objects
+            .select_for_update(skip_locked=True)
+            .filter(status=OutboxStatusEnum.PENDING, next_attempt_at__lte=now)
+            .order_by('next_attempt_at', 'id')[:batch_size])
+        if batch:
+            OutboxEmail.objects.filter(pk__in=[email.pk for email in batch]).update(next_attempt_at=claimed_until)
+    for email in batch:
+        email.next_attempt_at = claimed_until
+    return batch
+
+
+def _send_batch(batch: list[OutboxEmail], connection, close: bool,
+                stop: threading.Event = None) -> tuple[int, int, list[OutboxEmail]]:
+    """Send the claimed emails, return the sent and failed counts and the emails left unsent."""
+    sent = failed = 0
+
+    try:
+        connection.open()
+    except Exception as e:
+        logger.warning('Could not open email connection: %s', e)
+        for email in batch:
+            _schedule_retry(email, e)
+        OutboxEmail.objects.bulk_update(batch, RESULT_FIELDS)
+        return 0, len(batch), []
+
+    try:
+        for index, email in enumerate(batch):
+            if stop is not None and stop.is_set():
+                return sent, failed, batch[index:]
+
+            message = EmailMessage(email.subject, email.body, email.from_email, [email.recipient])
+            try:
+                connection.send_messages([message])
+            except Exception as e:
+                logger.warning('Failed to deliver outbox email %s: %s', email.id, e)
+                _schedule_retry(email, e)
+                email.save(update_fields=RESULT_FIELDS)
+                failed += 1
+                # The connection may be broken, reconnect before the next message.
+                connection.close()
+                try:
+                    connection.open()
+                except Exception:
+                    pass
+                continue
+
+            email.status = OutboxStatusEnum.SENT
+            email.attempts += 1
+            email.sent_at = timezone.now()
+            email.last_error = ''
+            email.save(update_fields=RESULT_FIELDS)
+            sent += 1
+    finally:
+        if close:
+            connection.close()
+
+    return sent, failed, []
+
+
+def _schedule_retry(email: OutboxEmail, error: Exception) -> None:
+    email.attempts += 1
+    email.last_error = str(error)
+
+    if email.attempts >= settings.EMAIL_OUTBOX_MAX_ATTEMPTS:
+        email.status = OutboxStatusEnum.FAILED
+    else:
+        email.next_attempt_at = timezone.now() + backoff_delay(email.attempts)
@@ -0,0 +1,69 @@
+import re
+from dataclasses import dataclass
+from datetime import date, datetime, time, timedelta
+
+from dateutil.relativedelta import relativedelta
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import ValidationError
+
+PERIOD_QUERY_PARAM = 'period'
+DEFAULT_PERIOD = 'this_month'
+MONTH_PATTERN = re.compile(r'^(\d{4})-(\d{2})$')
+
+
+@dataclass(frozen=True)
+class Period:
+    """
+    The half-open date range `[start, end)` an analytics query covers.
+
+    Month-aligned periods can be answered from the monthly `TaskDurationRollup` buckets,
+    other periods have to scan the raw time logs.
+    """
+    key: str
+    start: date
+    end: date
+    month_aligned: bool
+
+    def start_time(self) -> datetime:
+        return timezone.make_aware(datetime.combine(self.start, time.min))
+
+    def end_time(self) -> datetime:
+        return timezone.make_aware(datetime.combine(self.end, time.min))
+
+    def time_log_filter(self, prefix: str = '') -> dict:
+        """Range lookups on `start_time`, sargable unlike `start_time__month`."""
+        return {f'{prefix}start_time__gte': self.start_time(), f'{prefix}start_time__lt': self.end_time()}
+
+    def rollup_filter(self, prefix: str = '') -> dict:
+        return {f'{prefix}month__gte': self.start, f'{prefix}month__lt': self.end}
+
+
+def month_period(month_start: date) -> Period:
+    return Period(month_start.strftime('%Y-%m'), month_start, month_start + relativedelta(months=1), True)
+
+
+def parse_period(value: str | None, today: date | None = None) -> Period:
+    """Parse `last_30d`, `this_month`, `last_month` or `YYYY-MM`, relative to the local date."""
+    today = today or timezone.localdate()
+    value = value or DEFAULT_PERIOD
+    this_month = today.replace(day=1)
+
+    if value == 'this_month':
+        return month_period(this_month)
+    if value == 'last_month':
+        return month_period(this_month - relativedelta(months=1))
+    if value == 'last_30d':
+        # Whole days, so the window (and its cache key) only moves once a day.
+        end = today + timedelta(days=1)
+        return Period(f'last_30d:{today.isoformat()}', end - timedelta(days=30), end, False)
+
+    match = MONTH_PATTERN.match(value)
+    if match and 1 <= int(match.group(2)) <= 12:
+        try:
+            return month_period(date(int(match.group(1)), int(match.group(2)), 1))
+        except (ValueError, OverflowError):
+            # Year 0, or a month ending past the last representable date
+            pass
+
+    raise ValidationError({PERIOD_QUERY_PARAM: _('Expected last_30d, this_month, last_month or YYYY-MM.')})
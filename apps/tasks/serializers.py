@@ -17,18 +17,42 @@ class TaskDetailsSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Task
-        fields = ('id', 'title', 'description', 'status', 'created_at', 'updated_at', 'user', 'comments')
+        fields = ('id', 'title', 'description', 'status', 'created_at', 'updated_at', 'user', 'comments',
+                  'comment_count', 'total_logged_minutes', 'open_timer', 'last_activity_at')
 
 
 class TasksSerializer(serializers.ModelSerializer):
     class Meta:
         model = Task
-        fields = ('id', 'title')
+        fields = ('id', 'title', 'comment_count', 'total_logged_minutes', 'open_timer', 'last_activity_at')
+
+
+class TaskChangeSerializer(serializers.ModelSerializer):
+    """A task in the change feed, which sends its comments separately."""
+
+    class Meta:
+        model = Task
+        fields = ('id', 'title', 'description', 'status', 'created_at', 'updated_at', 'user', 'comment_count',
+                  'total_logged_minutes', 'open_timer', 'last_activity_at')
+
+
+class CommentChangeSerializer(CommentSerializer):
+    class Meta(CommentSerializer.Meta):
+        fields = ('id', 'task', 'content')
+
+
+class BulkCompleteSerializer(serializers.Serializer):
+    ids = serializers.ListField(child=serializers.IntegerField(min_value=1), allow_empty=False, max_length=1000)
 
 
 class AssignUserSerializer(serializers.Serializer):
     user_id = serializers.PrimaryKeyRelatedField(queryset=User.objects.all(), source='user')
 
+    def update(self, instance, validated_data):
+        instance.user = validated_data['user']
+        instance.save()
+        return instance
+
 
 class AddCommentToTaskSerializer(serializers.Serializer):
     comment = serializers.CharField(max_length=250)
@@ -43,6 +67,43 @@ class TimeLogSerializer(serializers.ModelSerializer):
         model = TimeLog
         fields = ('id', 'start_time', 'end_time', 'duration')
 
+    def validate(self, attrs):
+        start_time, end_time = attrs.get('start_time'), attrs.get('end_time')
+        if start_time and end_time and end_time < start_time:
+            raise serializers.ValidationError({'end_time': 'end_time must not be before start_time'})
+
+        if not attrs['duration']:
+            # A zero duration means "compute it from start and end", in whole minutes.
+            if start_time is None or end_time is None:
+                raise serializers.ValidationError({'duration': 'start_time and end_time are required '
+                                                               'to compute the duration'})
+            attrs['duration'] = int((end_time - start_time).total_seconds() // 60)
+        return attrs
+
+
+class TimeLogChangeSerializer(TimeLogSerializer):
+    class Meta(TimeLogSerializer.Meta):
+        fields = ('id', 'task', 'start_time', 'end_time', 'duration')
+
+
+class TimeLogImportSerializer(TimeLogSerializer):
+    task_id = serializers.IntegerField(min_value=1)
+
+    class Meta(TimeLogSerializer.Meta):
+        fields = ('task_id', 'start_time', 'end_time', 'duration')
+
+
+class TaskImportSerializer(serializers.ModelSerializer):
+    # An existing id updates that task, so tasks keep their ids when migrated.
+    id = serializers.IntegerField(min_value=1, required=False)
+    user_id = serializers.IntegerField(min_value=1, required=False, allow_null=True)
+    created_at = serializers.DateTimeField(required=False)
+    updated_at = serializers.DateTimeField(required=False)
+
+    class Meta:
+        model = Task
+        fields = ('id', 'title', 'description', 'status', 'created_at', 'updated_at', 'user_id')
+
 
 class TaskDurationSerializer(serializers.Serializer):
     title = serializers.CharField(max_length=255)
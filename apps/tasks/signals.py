@@ -0,0 +1,119 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .cache import invalidate_analytics
+from .models import ChangeKind, ChangeLog, Comment, Task, TaskDurationRollup, TimeLog, open_timer_exists
+
+CHANGE_KINDS = {Comment: ChangeKind.COMMENT, TimeLog: ChangeKind.TIME_LOG}
+
+
+def invalidate_time_log_analytics(instance: TimeLog):
+    if TimeLog.task.is_cached(instance) and instance.task is not None:
+        invalidate_analytics(user_ids=[instance.task.user_id])
+    else:
+        # Looking the owner up would cost a query on every write.
+        invalidate_analytics(all_users=True)
+
+
+def update_task_counters(instance: TimeLog, previous: tuple | None, current: tuple | None, created: bool):
+    minutes = current[2] if current else 0
+    previous_task_id, previous_minutes = (previous[0], previous[2]) if previous else (None, 0)
+    if previous_task_id is not None and previous_task_id != instance.task_id:
+        # Moved to another task
+        Task.objects.record_activity(previous_task_id, ChangeKind.TIME_LOG, minutes=-previous_minutes,
+                                     open_timer=open_timer_exists(), touch=False)
+        ChangeLog.objects.record_tasks([previous_task_id])
+        previous_minutes = 0
+
+    if created:
+        open_timer = True if instance.is_open_timer else None
+    else:
+        # Whether the log was an open timer isn't remembered, look at the task's logs instead.
+        open_timer = open_timer_exists()
+    Task.objects.record_activity(instance.task_id, ChangeKind.TIME_LOG, minutes=minutes - previous_minutes,
+                                 open_timer=open_timer)
+
+
+@receiver(post_save, sender=TimeLog)
+def update_duration_rollup_on_save(sender, instance: TimeLog, created: bool, **kwargs):
+    if not created and not hasattr(instance, '_rollup_contribution'):
+        # Saved from an instance that wasn't loaded from the db, so we don't know what it
+        # contributed before. Recompute the task's buckets and counters instead of guessing.
+        TaskDurationRollup.objects.rebuild(task_ids=[instance.task_id])
+        Task.objects.refresh_counters(task_ids=[instance.task_id])
+        Task.objects.record_activity(instance.task_id, ChangeKind.TIME_LOG)
+        instance._rollup_contribution = instance.rollup_contribution()
+        invalidate_time_log_analytics(instance)
+        return
+
+    previous = None if created else instance._rollup_contribution
+    current = instance.rollup_contribution()
+    update_task_counters(instance, previous, current, created)
+    if previous == current:
+        return
+
+    if previous is not None:
+        task_id, month, duration = previous
+        TaskDurationRollup.objects.add(task_id, month, -duration, -1)
+    if current is not None:
+        task_id, month, duration = current
+        TaskDurationRollup.objects.add(task_id, month, duration, 1)
+
+    instance._rollup_contribution = current
+    invalidate_time_log_analytics(instance)
+
+
+@receiver(post_delete, sender=TimeLog)
+def update_duration_rollup_on_delete(sender, instance: TimeLog, **kwargs):
+    contribution = getattr(instance, '_rollup_contribution', instance.rollup_contribution())
+    if contribution is not None:
+        task_id, month, duration = contribution
+        TaskDurationRollup.objects.add(task_id, month, -duration, -1)
+        Task.objects.record_activity(task_id, ChangeKind.TIME_LOG, minutes=-duration, touch=False)
+        invalidate_time_log_analytics(instance)
+    else:
+        Task.objects.record_activity(instance.task_id, ChangeKind.TIME_LOG,
+                                     open_timer=False if instance.is_open_timer else None, touch=False)
+
+
+@receiver(post_save, sender=Comment)
+def count_comment_on_save(sender, instance: Comment, created: bool, **kwargs):
+    if created:
+        Task.objects.record_activity(instance.task_id, ChangeKind.COMMENT, comments=1)
+    else:
+        Task.objects.record_activity(instance.task_id, ChangeKind.COMMENT, touch=False)
+
+
+@receiver(post_delete, sender=Comment)
+def count_comment_on_delete(sender, instance: Comment, **kwargs):
+    Task.objects.record_activity(instance.task_id, ChangeKind.COMMENT, comments=-1, touch=False)
+
+
+@receiver([post_save, post_delete], sender=Task)
+@receiver([post_save, post_delete], sender=Comment)
+@receiver([post_save, post_delete], sender=TimeLog)
+def record_change(sender, instance, using: str, **kwargs):
+    if sender is Task:
+        ChangeLog.objects.db_manager(using).record_tasks([instance.pk])
+    else:
+        ChangeLog.objects.db_manager(using).record(CHANGE_KINDS[sender], [(instance.pk, instance.task_id)])
+
+
+@receiver(post_save, sender=Task)
+def invalidate_analytics_on_task_save(sender, instance: Task, created: bool, **kwargs):
+    if created:
+        # A new task has no time logs yet.
+        return
+
+    if not hasattr(instance, '_loaded_user_id'):
+        invalidate_analytics(all_users=True)
+    elif instance._loaded_user_id != instance.user_id:
+        invalidate_analytics(user_ids=[instance._loaded_user_id, instance.user_id])
+    else:
+        invalidate_analytics()
+    instance._loaded_user_id = instance.user_id
+
+
+@receiver(post_delete, sender=Task)
+def invalidate_analytics_on_task_delete(sender, instance: Task, **kwargs):
+    invalidate_analytics(user_ids=[instance.user_id])
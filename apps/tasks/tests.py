@@ -1,13 +1,77 @@
-from datetime import datetime
+import asyncio
+import base64
+import csv
+import json
+import os
+import signal
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from io import StringIO
+from pathlib import Path
+from smtplib import SMTPServerDisconnected
+from unittest import mock, skipUnless
 
 from dateutil.relativedelta import relativedelta
-from django.test import TestCase
+from django.contrib.auth.models import User
+from django.contrib.postgres.search import SearchQuery
+from django.core import mail
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.conf import settings
+from django.db import connection, transaction
+from django.test import AsyncClient, LiveServerTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.utils.http import http_date
 from django.urls import reverse
 from rest_framework import status
+from rest_framework.exceptions import ValidationError
 from rest_framework.test import APIClient
-
-from apps.tasks.factories import TaskFactory, CommentFactory, TimeLogFactory
-from apps.tasks.models import Task, Comment, TimeLog
+from rest_framework_simplejwt.tokens import AccessToken
+
+from apps.common.events import Event, get_broker
+from apps.tasks.benchmarks import compare_to_baseline, percentile, run_benchmark, run_serialization_benchmark
+from apps.common.middlewares import track_queries
+from apps.common.replicas import reading_from
+from apps.tasks import events
+from apps.tasks.cache import GLOBAL_SCOPE, cached_analytics, entry_timeout, get_versions, invalidate_analytics
+from apps.tasks.filters import build_prefix_tsquery
+from apps.tasks.factories import TaskFactory, CommentFactory, TimeLogFactory, UserFactory
+from apps.tasks.imports import TaskImporter
+from apps.tasks.models import (Task, Comment, TimeLog, OutboxEmail, OutboxStatusEnum, TaskDurationRollup,
+                               ChangeKind, ChangeLog, OPEN_TIMER, month_bucket)
+from apps.tasks.outbox import claim_batch, deliver_pending
+from apps.tasks.periods import PERIOD_QUERY_PARAM, Period, parse_period
+from apps.tasks.views import LastMontLoggedTimeDurationView, TopTasksLastMonthView
+
+
+class QueryBudgetMixin:
+    """
+    Query-count budgets for endpoints.
+
+    Unlike `assertNumQueries`, a budget is an upper bound, so an optimization never breaks the
+    test while an N+1 regression does. The failure message lists every query that ran.
+    """
+
+    @contextmanager
+    def assertQueryBudget(self, budget: int):
+        with CaptureQueriesContext(connection) as queries:
+            yield queries
+        if len(queries) > budget:
+            executed = '\n'.join(f'{i}. {query["sql"]}' for i, query in enumerate(queries, start=1))
+            self.fail(f'{len(queries)} queries executed, budget is {budget}:\n{executed}')
+
+    def assertEndpointQueryBudget(self, url: str, budget: int, params: dict = None):
+        client = APIClient()
+        with self.assertQueryBudget(budget):
+            response = client.get(url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response
 
 
 # Create your tests here.
@@ -141,7 +205,7 @@ class TaskTests(TestCase):
         # arrange
         client = APIClient()
         task = TaskFactory.create()
-        TimeLogFactory.create(task=task, start_time=datetime.now(), end_time=None)
+        TimeLogFactory.create(task=task, start_time=timezone.now(), end_time=None, duration=None)
 
         # act
         response = client.post(f'/api/tasks/{task.id}/start-timer/')
@@ -176,6 +240,50 @@ class TaskTests(TestCase):
         # assert
         self.assertEqual(response.status_code, status.HTTP_200_OK)
 
+    def test_stop_timer_logs_the_elapsed_minutes(self):
+        # arrange
+        client = APIClient()
+        task = TaskFactory.create()
+        TimeLogFactory.create(task=task, start_time=timezone.now() - timedelta(minutes=90, seconds=30),
+                              end_time=None, duration=None)
+
+        # act
+        response = client.put(f'/api/tasks/{task.id}/stop-timer/')
+        second_stop = client.put(f'/api/tasks/{task.id}/stop-timer/')
+
+        # assert
+        self.assertEqual(response.data['duration'], 90)
+        self.assertEqual(TaskDurationRollup.objects.get(task=task).duration, 90)
+        self.assertEqual(second_stop.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_timers_are_one_statement_each(self):
+        # arrange
+        client = APIClient()
+        task = TaskFactory.create()
+
+        # act
+        with CaptureQueriesContext(connection) as start:
+            client.post(f'/api/tasks/{task.id}/start-timer/')
+        with CaptureQueriesContext(connection) as stop:
+            client.put(f'/api/tasks/{task.id}/stop-timer/')
+
+        # assert
+        for queries in (start, stop):
+            timer_statements = [query for query in queries.captured_queries if 'tasks_timelog' in query['sql']]
+            self.assertEqual(len(timer_statements), 1)
+
+    def test_timer_of_missing_task_is_not_found(self):
+        # arrange
+        client = APIClient()
+
+        # act
+        start = client.post('/api/tasks/999999/start-timer/')
+        stop = client.put('/api/tasks/999999/stop-timer/')
+
+        # assert
+        self.assertEqual(start.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(stop.status_code, status.HTTP_404_NOT_FOUND)
+
     def test_task_get_time_logs_should_be_successfully(self):
         # arrange
         client = APIClient()
@@ -335,3 +443,1513 @@ class TaskTests(TestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(len(response.data['results']), 1)
         self.assertEqual(response.data['results'][0]['title'], "search title")
+
+
+@skipUnless(connection.vendor == 'postgresql', 'needs concurrent connections')
+class TimerConcurrencyTests(TransactionTestCase):
+    def test_concurrent_starts_open_one_timer(self):
+        # arrange
+        task = TaskFactory.create()
+        barrier = threading.Barrier(8)
+
+        def start():
+            try:
+                barrier.wait()
+                return TimeLog.objects.start_timer(task.id)
+            finally:
+                connection.close()
+
+        # act
+        with ThreadPoolExecutor(8) as executor:
+            started = [timer for timer in executor.map(lambda _: start(), range(8)) if timer is not None]
+
+        # assert
+        self.assertEqual(len(started), 1)
+        self.assertEqual(TimeLog.objects.filter(OPEN_TIMER, task=task).count(), 1)
+
+
+class OutboxTests(TestCase):
+    def test_task_complete_queues_email_instead_of_sending(self):
+        # arrange
+        client = APIClient()
+        task = TaskFactory.create()
+
+        # act
+        response = client.put(f'/api/tasks/{task.id}/complete/')
+
+        # assert
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(mail.outbox), 0)
+        queued = OutboxEmail.objects.get()
+        self.assertEqual(queued.recipient, task.user.email)
+        self.assertEqual(queued.status, OutboxStatusEnum.PENDING)
+
+    def test_task_comment_queues_email(self):
+        # arrange
+        client = APIClient()
+        task = TaskFactory.create()
+
+        # act
+        client.post(f'/api/tasks/{task.id}/comment/', {"comment": "test comment"}, format='json')
+
+        # assert
+        self.assertIn('New Comment: test comment', OutboxEmail.objects.get().body)
+
+    def test_deliver_pending_sends_and_marks_emails(self):
+        # arrange
+        tasks = TaskFactory.create_batch(3)
+        for task in tasks:
+            task.task_completed_email()
+
+        # act
+        sent, failed = deliver_pending()
+
+        # assert
+        self.assertEqual((sent, failed), (3, 0))
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertEqual(OutboxEmail.objects.filter(status=OutboxStatusEnum.SENT, sent_at__isnull=False).count(), 3)
+        self.assertEqual(deliver_pending(), (0, 0))
+
+    def test_deliver_pending_retries_with_backoff(self):
+        # arrange
+        TaskFactory.create().task_completed_email()
+
+        # act
+        with mock.patch('django.core.mail.backends.locmem.EmailBackend.send_messages',
+                        side_effect=SMTPServerDisconnected('gone')):
+            sent, failed = deliver_pending()
+
+        # assert
+        self.assertEqual((sent, failed), (0, 1))
+        queued = OutboxEmail.objects.get()
+        self.assertEqual(queued.status, OutboxStatusEnum.PENDING)
+        self.assertEqual(queued.attempts, 1)
+        self.assertEqual(queued.last_error, 'gone')
+        self.assertGreater(queued.next_attempt_at, timezone.now())
+        # not due yet, so the next pass leaves it alone
+        self.assertEqual(deliver_pending(), (0, 0))
+
+    def test_deliver_pending_gives_up_after_max_attempts(self):
+        # arrange
+        TaskFactory.create().task_completed_email()
+        OutboxEmail.objects.update(attempts=4)
+
+        # act
+        with mock.patch('django.core.mail.backends.locmem.EmailBackend.send_messages', side_effect=OSError('down')):
+            deliver_pending()
+
+        # assert
+        self.assertEqual(OutboxEmail.objects.get().status, OutboxStatusEnum.FAILED)
+
+    def test_deliver_emails_command_drains_outbox(self):
+        # arrange
+        for task in TaskFactory.create_batch(5):
+            task.user_assigned_to_task_email()
+        out = StringIO()
+
+        # act
+        call_command('deliver_emails', '--once', '--batch-size', '2', stdout=out)
+
+        # assert
+        self.assertEqual(len(mail.outbox), 5)
+        self.assertIn('Delivered 5 emails', out.getvalue())
+
+    def test_deliver_pending_sends_outside_the_claiming_transaction(self):
+        # arrange
+        for task in TaskFactory.create_batch(2):
+            task.task_completed_email()
+        outer_savepoints = list(connection.savepoint_ids)
+        during_send = []
+
+        def send_messages(messages):
+            during_send.append((list(connection.savepoint_ids), claim_batch(10)))
+            return len(messages)
+
+        # act
+        with mock.patch('django.core.mail.backends.locmem.EmailBackend.send_messages', side_effect=send_messages):
+            sent, failed = deliver_pending()
+
+        # assert
+        self.assertEqual((sent, failed), (2, 0))
+        # no transaction of its own around the sends, and the claimed emails aren't due for other workers
+        self.assertEqual(during_send, [(outer_savepoints, [])] * 2)
+        self.assertEqual(OutboxEmail.objects.filter(status=OutboxStatusEnum.SENT).count(), 2)
+
+    def test_deliver_emails_command_stops_on_sigterm(self):
+        # arrange
+        for task in TaskFactory.create_batch(3):
+            task.task_completed_email()
+        handler = signal.getsignal(signal.SIGTERM)
+
+        def send_messages(messages):
+            os.kill(os.getpid(), signal.SIGTERM)
+            return len(messages)
+
+        # act
+        with mock.patch('django.core.mail.backends.locmem.EmailBackend.send_messages', side_effect=send_messages):
+            call_command('deliver_emails', '--once', stdout=StringIO())
+
+        # assert: the email being sent is finished, the rest of the batch is due again
+        self.assertEqual(OutboxEmail.objects.filter(status=OutboxStatusEnum.SENT).count(), 1)
+        pending = OutboxEmail.objects.filter(status=OutboxStatusEnum.PENDING)
+        self.assertEqual(pending.filter(next_attempt_at__lte=timezone.now(), attempts=0).count(), 2)
+        self.assertEqual(signal.getsignal(signal.SIGTERM), handler)
+
+
+class TaskDurationRollupTests(TestCase):
+    def rollups(self, task):
+        return {r.month: (r.duration, r.log_count) for r in TaskDurationRollup.objects.filter(task=task)}
+
+    def test_time_log_writes_update_rollup_incrementally(self):
+        # arrange
+        task = TaskFactory.create()
+        now = timezone.now()
+        last_month = now - relativedelta(months=1)
+
+        # act
+        log = TimeLogFactory.create(task=task, start_time=now, duration=30)
+        TimeLogFactory.create(task=task, start_time=now, duration=60)
+        TimeLogFactory.create(task=task, start_time=last_month, duration=15)
+        TimeLogFactory.create(task=task, start_time=now, end_time=None, duration=None)
+
+        # assert
+        self.assertEqual(self.rollups(task), {month_bucket(now): (90, 2), month_bucket(last_month): (15, 1)})
+
+        # moving a log to another month and changing its duration moves its minutes
+        log = TimeLog.objects.get(id=log.id)
+        log.start_time = last_month
+        log.duration = 45
+        log.save()
+        self.assertEqual(self.rollups(task), {month_bucket(now): (60, 1), month_bucket(last_month): (60, 2)})
+
+        log.delete()
+        self.assertEqual(self.rollups(task), {month_bucket(now): (60, 1), month_bucket(last_month): (15, 1)})
+
+    def test_stop_timer_and_log_time_update_rollup(self):
+        # arrange
+        client = APIClient()
+        task = TaskFactory.create()
+        TimeLogFactory.create(task=task, start_time=timezone.now(), end_time=None, duration=None)
+
+        # act
+        client.put(f'/api/tasks/{task.id}/stop-timer/')
+        client.post(f'/api/tasks/{task.id}/log-time/', {
+            'start_time': '2025-07-22T10:30:00Z',
+            'end_time': '2025-07-22T11:30:00Z',
+            'duration': 0
+        }, format='json')
+
+        # assert
+        self.assertEqual(self.rollups(task)[month_bucket(datetime(2025, 7, 22, 10, 30))], (60, 1))
+        self.assertEqual(TaskDurationRollup.objects.filter(task=task).count(), 2)
+
+    def test_rebuild_matches_incremental_rollups(self):
+        # arrange
+        task = TaskFactory.create()
+        TimeLogFactory.create_batch(3, task=task, duration=20)
+        TimeLogFactory.create(task=task, start_time=None, end_time=None, duration=5)
+        expected = self.rollups(task)
+        TaskDurationRollup.objects.all().delete()
+
+        # act
+        call_command('rebuild_duration_rollups', stdout=StringIO())
+
+        # assert
+        self.assertEqual(self.rollups(task), expected)
+        self.assertEqual(sum(duration for duration, _ in expected.values()), 65)
+
+
+class TaskCounterTests(TestCase):
+    def counters(self, task) -> tuple:
+        task = Task.objects.get(id=task.id)
+        return task.comment_count, task.total_logged_minutes, task.open_timer
+
+    def test_comment_and_time_log_writes_update_counters(self):
+        # arrange
+        client = APIClient()
+        task = TaskFactory.create()
+
+        # act
+        client.post(f'/api/tasks/{task.id}/comment/', {'comment': 'first'}, format='json')
+        client.post(f'/api/tasks/{task.id}/log-time/', {'duration': 30}, format='json')
+        client.post(f'/api/tasks/{task.id}/start-timer/')
+        while_running = self.counters(task)
+        Task.objects.filter(id=task.id).update(last_activity_at=None)
+        TimeLog.objects.filter(OPEN_TIMER).update(start_time=timezone.now() - timedelta(minutes=15))
+        client.put(f'/api/tasks/{task.id}/stop-timer/')
+
+        # assert
+        self.assertEqual(while_running, (1, 30, True))
+        self.assertEqual(self.counters(task), (1, 45, False))
+        self.assertIsNotNone(Task.objects.get(id=task.id).last_activity_at)
+
+    def test_deletes_and_moves_update_counters(self):
+        # arrange
+        task, other_task = TaskFactory.create_batch(2)
+        comment = CommentFactory.create(task=task)
+        kept, moved = TimeLogFactory.create_batch(2, task=task, duration=20)
+
+        # act
+        comment.delete()
+        moved = TimeLog.objects.get(id=moved.id)
+        moved.task = other_task
+        moved.save()
+        TimeLog.objects.get(id=kept.id).delete()
+
+        # assert
+        self.assertEqual(self.counters(task), (0, 0, False))
+        self.assertEqual(self.counters(other_task), (0, 20, False))
+
+    def test_saving_a_loaded_task_keeps_newer_counters(self):
+        # arrange
+        task = Task.objects.get(id=TaskFactory.create().id)
+        CommentFactory.create(task=task)
+
+        # act
+        task.title = 'renamed'
+        task.save()
+
+        # assert
+        self.assertEqual(self.counters(task), (1, 0, False))
+        self.assertEqual(Task.objects.get(id=task.id).title, 'renamed')
+
+    def test_reconcile_command_fixes_drifted_counters(self):
+        # arrange
+        task = TaskFactory.create()
+        TimeLogFactory.create(task=task, duration=50)
+        TimeLogFactory.create(task=task, start_time=timezone.now(), end_time=None, duration=None)
+        Task.objects.update(comment_count=7, total_logged_minutes=0, open_timer=False)
+        out = StringIO()
+
+        # act
+        call_command('reconcile_task_counters', stdout=out)
+
+        # assert
+        self.assertEqual(self.counters(task), (0, 50, True))
+        self.assertIn('1 tasks', out.getvalue())
+
+    def test_logged_time_duration_reads_the_counter(self):
+        # arrange
+        client = APIClient()
+        task = TaskFactory.create()
+
+        # act
+        empty = client.get(f'/api/tasks/{task.id}/logged-time-duration/')
+        TimeLogFactory.create(task=task, duration=90)
+        logged = client.get(f'/api/tasks/{task.id}/logged-time-duration/')
+
+        # assert
+        self.assertEqual(empty.data, {'Total logged time in hours': 0})
+        self.assertEqual(logged.data, {'Total logged time in hours': 1.5})
+
+    def test_list_renders_counters_without_extra_queries(self):
+        # arrange
+        client = APIClient()
+        for task in TaskFactory.create_batch(3):
+            CommentFactory.create(task=task)
+
+        # act
+        with self.assertNumQueries(2):
+            response = client.get(reverse('task_list_details'))
+
+        # assert
+        self.assertEqual([task['comment_count'] for task in response.data['results']], [1, 1, 1])
+
+
+class ChangeFeedTests(TransactionTestCase):
+    # The feed waits for transactions to finish, so the writes can't run in the test's transaction.
+
+    def changes(self, client, since=None, **params) -> dict:
+        if since is not None:
+            params['since'] = since
+        response = client.get(reverse('task_changes'), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    def test_feed_returns_what_changed_since_the_token(self):
+        # arrange
+        client = APIClient()
+        untouched, updated, deleted = TaskFactory.create_batch(3)
+        deleted_comment = CommentFactory.create(task=deleted)
+        token = self.changes(client)['next']
+
+        # act
+        client.patch(f'/api/tasks/{updated.id}/', {'title': 'renamed'}, format='json')
+        client.post(f'/api/tasks/{updated.id}/comment/', {'comment': 'new'}, format='json')
+        client.post(f'/api/tasks/{updated.id}/start-timer/')
+        client.delete(f'/api/tasks/{deleted.id}/')
+        page = self.changes(client, token)
+        caught_up = self.changes(client, page['next'])
+
+        # assert
+        self.assertEqual([task['id'] for task in page['tasks']], [updated.id])
+        self.assertEqual(page['tasks'][0]['title'], 'renamed')
+        self.assertEqual(page['tasks'][0]['comment_count'], 1)
+        self.assertEqual([(comment['task'], comment['content']) for comment in page['comments']], [(updated.id, 'new')])
+        self.assertEqual([time_log['task'] for time_log in page['time_logs']], [updated.id])
+        self.assertEqual(page['deleted'], {'tasks': [deleted.id], 'comments': [deleted_comment.id], 'time_logs': []})
+        self.assertFalse(page['has_more'])
+        self.assertEqual((caught_up['next'], caught_up['tasks']), (page['next'], []))
+        self.assertNotIn(untouched.id, [task['id'] for task in page['tasks']])
+
+    def test_pages_follow_the_limit(self):
+        # arrange
+        client = APIClient()
+        token = self.changes(client)['next']
+        tasks = TaskFactory.create_batch(3)
+
+        # act
+        first = self.changes(client, token, limit=2)
+        second = self.changes(client, first['next'], limit=2)
+
+        # assert
+        self.assertEqual([task['id'] for task in first['tasks']], [task.id for task in tasks[:2]])
+        self.assertTrue(first['has_more'])
+        self.assertEqual([task['id'] for task in second['tasks']], [tasks[2].id])
+        self.assertFalse(second['has_more'])
+
+    def test_bulk_writes_are_logged(self):
+        # arrange
+        client = APIClient()
+        existing = TaskFactory.create(status='open')
+        token = self.changes(client)['next']
+
+        # act
+        created = client.post('/api/tasks/bulk/', [{'title': 'bulk', 'description': 'd'}], format='json')
+        client.put('/api/tasks/bulk-complete/', {'ids': [existing.id]}, format='json')
+        page = self.changes(client, token)
+
+        # assert
+        self.assertEqual(sorted(task['id'] for task in page['tasks']),
+                         sorted([existing.id, created.data['results'][0]['id']]))
+        self.assertEqual(Task.objects.get(id=existing.id).status, 'completed')
+
+    def test_invalid_params_are_rejected(self):
+        # arrange
+        client = APIClient()
+
+        # act
+        bad_token = client.get(reverse('task_changes'), {'since': 'latest'})
+        bad_limit = client.get(reverse('task_changes'), {'since': '0-0', 'limit': '0'})
+
+        # assert
+        self.assertEqual(bad_token.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('since', bad_token.data)
+        self.assertEqual(bad_limit.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('limit', bad_limit.data)
+
+    def test_tokens_of_pruned_changes_require_a_resync(self):
+        # arrange
+        client = APIClient()
+        empty_log_token = self.changes(client)['next']
+        old, last_old = TaskFactory.create(), TaskFactory.create()
+        pruned_token = self.changes(client, empty_log_token, limit=1)['next']
+        marker_token = self.changes(client, pruned_token)['next']
+        recent = TaskFactory.create()
+        ChangeLog.objects.filter(task_id__in=[old.id, last_old.id]).update(
+            created_at=timezone.now() - timedelta(days=settings.CHANGE_LOG_RETENTION_DAYS + 1))
+
+        # act
+        call_command('prune_changes', stdout=StringIO())
+        pruned = client.get(reverse('task_changes'), {'since': pruned_token})
+        empty_log = client.get(reverse('task_changes'), {'since': empty_log_token})
+        kept = self.changes(client, marker_token)
+
+        # assert
+        self.assertEqual(pruned.status_code, status.HTTP_410_GONE)
+        self.assertEqual(pruned.data['detail'].code, 'resync_required')
+        self.assertEqual(empty_log.status_code, status.HTTP_410_GONE)
+        self.assertEqual([task['id'] for task in kept['tasks']], [recent.id])
+        self.assertEqual(set(ChangeLog.objects.values_list('task_id', flat=True)), {last_old.id, recent.id})
+
+
+@skipUnless(connection.vendor == 'postgresql', 'needs concurrent connections')
+class ChangeFeedConcurrencyTests(TransactionTestCase):
+    def test_changes_wait_for_older_transactions_to_finish(self):
+        # arrange
+        client = APIClient()
+        token = client.get(reverse('task_changes')).data['next']
+        written, release = threading.Event(), threading.Event()
+
+        def write_slowly():
+            try:
+                with transaction.atomic():
+                    TaskFactory.create(title='slow')
+                    written.set()
+                    release.wait(10)
+            finally:
+                connection.close()
+
+        thread = threading.Thread(target=write_slowly)
+        thread.start()
+        written.wait(10)
+
+        # act
+        TaskFactory.create(title='fast')
+        while_open = client.get(reverse('task_changes'), {'since': token}).data
+        release.set()
+        thread.join()
+        after_commit = client.get(reverse('task_changes'), {'since': token}).data
+
+        # assert
+        self.assertEqual((while_open['tasks'], while_open['next']), ([], token))
+        self.assertEqual(sorted(task['title'] for task in after_commit['tasks']), ['fast', 'slow'])
+
+
+class KeysetPaginationTests(TestCase):
+    def walk(self, client, url, params):
+        pages, results = 0, []
+        response = client.get(url, params)
+        while True:
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertNotIn('count', response.data)
+            pages += 1
+            results += response.data['results']
+            if response.data['next'] is None:
+                return pages, results
+            response = client.get(response.data['next'])
+
+    def test_cursor_walk_returns_every_task_once(self):
+        # arrange
+        client = APIClient()
+        tasks = TaskFactory.create_batch(25)
+        for task in tasks[:12]:
+            task.status = 'open'
+            task.save()
+
+        for ordering in ('-id', 'status', '-status', 'title', 'created_at'):
+            # act
+            pages, results = self.walk(client, '/api/tasks/list/', {'cursor': '', 'limit': 4, 'ordering': ordering})
+
+            # assert
+            self.assertEqual(pages, 7)
+            self.assertEqual(sorted(r['id'] for r in results), sorted(t.id for t in tasks))
+
+    def test_cursor_previous_link_returns_previous_page(self):
+        # arrange
+        client = APIClient()
+        TaskFactory.create_batch(9)
+        first = client.get('/api/tasks/', {'cursor': '', 'limit': 3})
+        second = client.get(first.data['next'])
+
+        # act
+        response = client.get(second.data['previous'])
+
+        # assert
+        self.assertEqual(response.data['results'], first.data['results'])
+        self.assertIsNone(first.data['previous'])
+
+    def test_cursor_page_skips_count_query(self):
+        # arrange
+        client = APIClient()
+        TaskFactory.create_batch(5)
+        next_url = client.get('/api/tasks/list/', {'cursor': '', 'limit': 2}).data['next']
+
+        # act
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(next_url)
+
+        # assert
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn('COUNT(', queries[0]['sql'].upper())
+
+    def test_cursor_rejects_unsupported_ordering_and_bad_cursor(self):
+        client = APIClient()
+
+        response = client.get('/api/tasks/list/', {'cursor': '', 'ordering': 'description'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = client.get('/api/tasks/list/', {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_cursor_with_malformed_position_is_not_found(self):
+        # arrange
+        client = APIClient()
+
+        def cursor(ordering: str, position: list) -> str:
+            payload = json.dumps({'r': 0, 'p': position, 'o': ordering})
+            return base64.urlsafe_b64encode(payload.encode()).decode()
+
+        for ordering, position in (('-id', [{'a': 1}]), ('-id', [[1]]), ('-id', [None]), ('-id', [True]),
+                                   ('-id', ['x']), ('-id', [1, 2]), ('created_at,id', ['yesterday', 1]),
+                                   ('title,id', [{'a': 1}, 1])):
+            # act
+            query = {'cursor': cursor(ordering, position), 'ordering': ordering}
+            response = client.get('/api/tasks/list/', query)
+
+            # assert
+            self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND, position)
+
+    def test_offset_pagination_stays_default(self):
+        client = APIClient()
+        TaskFactory.create_batch(3)
+
+        response = client.get('/api/tasks/list/')
+
+        self.assertEqual(response.data['count'], 3)
+
+
+class TaskQueryBudgetTests(QueryBudgetMixin, TestCase):
+    def create_tasks(self, count):
+        tasks = TaskFactory.create_batch(count)
+        for task in tasks:
+            CommentFactory.create_batch(2, task=task)
+        return tasks
+
+    def test_task_list_query_count_does_not_grow_with_page_size(self):
+        # arrange
+        self.create_tasks(30)
+
+        # act / assert: count + tasks joined with users + comments prefetch
+        for limit in (10, 30):
+            response = self.assertEndpointQueryBudget('/api/tasks/', 3, {'limit': limit})
+            self.assertEqual(len(response.data['results']), limit)
+            self.assertEqual(len(response.data['results'][0]['comments']), 2)
+            self.assertIsNotNone(response.data['results'][0]['user'])
+
+    def test_task_detail_query_budget(self):
+        # arrange
+        task = self.create_tasks(1)[0]
+
+        # act / assert
+        self.assertEndpointQueryBudget(f'/api/tasks/{task.id}/', 2)
+
+    def test_task_cursor_page_query_budget(self):
+        # arrange
+        self.create_tasks(15)
+
+        # act / assert
+        self.assertEndpointQueryBudget('/api/tasks/', 2, {'cursor': '', 'limit': 15})
+
+    def test_query_budget_reports_overruns(self):
+        with self.assertRaisesMessage(AssertionError, '2 queries executed, budget is 1'):
+            with self.assertQueryBudget(1):
+                list(Task.objects.all())
+                list(Comment.objects.all())
+
+
+class TaskSearchTests(TestCase):
+    def test_build_prefix_tsquery(self):
+        self.assertEqual(build_prefix_tsquery(['deploy', 'fix-db']), 'deploy:* & fix:* & db:*')
+        self.assertEqual(build_prefix_tsquery(["':*&|!"]), '')
+
+    def test_search_matches_title_and_description_prefixes(self):
+        # arrange
+        client = APIClient()
+        TaskFactory.create(title='Deployment pipeline', description='nothing here')
+        TaskFactory.create(title='Other', description='deploying the release')
+        TaskFactory.create(title='Unrelated', description='unrelated')
+
+        # act
+        response = client.get('/api/tasks/list/', {'search': 'deploy'})
+
+        # assert
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['count'], 2)
+
+    @skipUnless(connection.vendor == 'postgresql', 'full-text search index is PostgreSQL only')
+    def test_search_uses_index_and_ranks_title_matches_first(self):
+        # arrange
+        client = APIClient()
+        description_match = TaskFactory.create(title='Other', description='deploy the release')
+        title_match = TaskFactory.create(title='Deploy pipeline', description='nothing here')
+
+        # act
+        response = client.get('/api/tasks/list/', {'search': 'deploy'})
+        with connection.cursor() as cursor:
+            cursor.execute('SET enable_seqscan = off')
+        plan = Task.objects.filter(
+            search_vector=SearchQuery('deploy:*', search_type='raw', config='english')).explain()
+
+        # assert
+        self.assertEqual([r['id'] for r in response.data['results']], [title_match.id, description_match.id])
+        self.assertIn('task_search_vector_idx', plan)
+
+    def test_stopword_only_search_falls_back_to_substring_match(self):
+        # arrange
+        client = APIClient()
+        match = TaskFactory.create(title='Fix the build', description='nothing here')
+        TaskFactory.create(title='Unrelated', description='unrelated')
+
+        # act
+        response = client.get('/api/tasks/list/', {'search': 'the'})
+
+        # assert
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([r['id'] for r in response.data['results']], [match.id])
+
+
+class BulkTaskTests(QueryBudgetMixin, TestCase):
+    def test_bulk_create_reports_per_item_results(self):
+        # arrange
+        client = APIClient()
+        payload = [
+            {"title": "first", "description": "d1", "status": "open"},
+            {"title": "second", "description": "d2", "status": "not-a-status"},
+            {"title": "third", "description": "d3"},
+        ]
+
+        # act: one INSERT for the tasks and one for their change log rows
+        with self.assertQueryBudget(4):
+            response = client.post('/api/tasks/bulk/', payload, format='json')
+
+        # assert
+        self.assertEqual(response.status_code, status.HTTP_207_MULTI_STATUS)
+        results = response.data['results']
+        self.assertEqual([r['status'] for r in results], ['created', 'error', 'created'])
+        self.assertIn('status', results[1]['errors'])
+        self.assertEqual(Task.objects.get(id=results[2]['id']).title, 'third')
+        self.assertEqual(Task.objects.count(), 2)
+
+    def test_bulk_create_rejects_non_list_payload(self):
+        response = APIClient().post('/api/tasks/bulk/', {"title": "x"}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_bulk_partial_update(self):
+        # arrange
+        client = APIClient()
+        tasks = TaskFactory.create_batch(3, status='open')
+        payload = [
+            {"id": tasks[0].id, "title": "renamed"},
+            {"id": tasks[1].id, "status": "in_progress"},
+            {"id": 0, "title": "missing"},
+        ]
+
+        # act
+        response = client.patch('/api/tasks/bulk/', payload, format='json')
+
+        # assert
+        self.assertEqual(response.status_code, status.HTTP_207_MULTI_STATUS)
+        self.assertEqual([r['status'] for r in response.data['results']], ['updated', 'updated', 'error'])
+        self.assertEqual(Task.objects.get(id=tasks[0].id).title, 'renamed')
+        self.assertEqual(Task.objects.get(id=tasks[1].id).status, 'in_progress')
+        self.assertGreater(Task.objects.get(id=tasks[1].id).updated_at, tasks[1].updated_at)
+        self.assertEqual(Task.objects.get(id=tasks[2].id).title, tasks[2].title)
+
+    def test_bulk_endpoints_reject_boolean_ids(self):
+        # arrange
+        client = APIClient()
+        task = TaskFactory.create(id=1, title='first', status='open')
+
+        # act
+        patched = client.patch('/api/tasks/bulk/', [{"id": True, "title": "renamed"}], format='json')
+        completed = client.put('/api/tasks/bulk-complete/', {"ids": [True]}, format='json')
+
+        # assert
+        self.assertEqual(patched.data['results'][0]['status'], 'error')
+        self.assertEqual(completed.status_code, status.HTTP_400_BAD_REQUEST)
+        task.refresh_from_db()
+        self.assertEqual((task.title, task.status), ('first', 'open'))
+
+    def test_bulk_complete_queues_notifications_in_one_batch(self):
+        # arrange
+        client = APIClient()
+        tasks = TaskFactory.create_batch(20, status='open')
+        tasks[0].status = 'completed'
+        tasks[0].save()
+        ids = [task.id for task in tasks]
+
+        # act: load + update + change log and outbox inserts, no matter how many tasks
+        with self.assertQueryBudget(6):
+            response = client.put('/api/tasks/bulk-complete/', {"ids": ids}, format='json')
+
+        # assert
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['results'][0]['status'], 'unchanged')
+        self.assertEqual(response.data['results'][1]['status'], 'completed')
+        self.assertEqual(Task.objects.filter(id__in=ids, status='completed').count(), 20)
+        self.assertEqual(OutboxEmail.objects.count(), 19)
+        self.assertEqual(len(mail.outbox), 0)
+
+
+class GenerateCommandTests(TestCase):
+    def test_generate_reuses_users_and_attaches_children_to_new_tasks(self):
+        # arrange
+        existing_user = UserFactory.create()
+        out = StringIO()
+
+        # act
+        call_command('generate', '--tasks', '30', '--users', '3', '--logs-per-task', '2',
+                     '--comments-per-task', '1', '--seed', '1', '--chunk-size', '7', stdout=out)
+
+        # assert
+        self.assertEqual(User.objects.count(), 3)
+        self.assertEqual(Task.objects.count(), 30)
+        self.assertEqual(TimeLog.objects.count(), 60)
+        self.assertEqual(Comment.objects.count(), 30)
+        self.assertTrue(Task.objects.filter(user=existing_user).exists())
+        self.assertFalse(Task.objects.exclude(user__in=User.objects.all()).exists())
+        self.assertIn('30 tasks', out.getvalue())
+        self.assertEqual({kind: ChangeLog.objects.filter(kind=kind).count() for kind in ChangeKind.values},
+                         {'task': 30, 'comment': 30, 'time_log': 60})
+
+    def test_generate_writes_matching_duration_rollups(self):
+        # act
+        call_command('generate', '--tasks', '10', '--users', '2', '--logs-per-task', '3', '--seed', '2',
+                     stdout=StringIO())
+        generated = {(r.task_id, r.month): (r.duration, r.log_count) for r in TaskDurationRollup.objects.all()}
+        TaskDurationRollup.objects.rebuild()
+
+        # assert
+        rebuilt = {(r.task_id, r.month): (r.duration, r.log_count) for r in TaskDurationRollup.objects.all()}
+        self.assertEqual(generated, rebuilt)
+
+    def test_generate_writes_matching_task_counters(self):
+        # act
+        call_command('generate', '--tasks', '10', '--users', '2', '--logs-per-task', '3',
+                     '--comments-per-task', '2', '--seed', '3', stdout=StringIO())
+
+        # assert
+        self.assertEqual(Task.objects.refresh_counters(), 0)
+        self.assertEqual(Task.objects.filter(comment_count=2, last_activity_at__isnull=False).count(), 10)
+
+
+class BenchmarkTests(TestCase):
+    def tearDown(self) -> None:
+        # analytics responses are cached, don't leak them into other tests
+        cache.clear()
+
+    def test_percentile(self):
+        values = [float(i) for i in range(1, 101)]
+
+        self.assertEqual(percentile(values, 50), 50)
+        self.assertEqual(percentile(values, 95), 95)
+        self.assertEqual(percentile(values, 99), 99)
+        self.assertEqual(percentile([], 99), 0)
+
+    def test_run_benchmark_reports_every_scenario(self):
+        # arrange
+        for task in TaskFactory.create_batch(5):
+            CommentFactory.create_batch(2, task=task)
+            TimeLogFactory.create(task=task, start_time=timezone.now(), duration=30)
+
+        # act
+        results = run_benchmark(requests=5, concurrency=1, include_writes=True)
+
+        # assert
+        self.assertEqual(results['meta']['tasks'], 5)
+        self.assertIn('start-timer', results['scenarios'])
+        for name, summary in results['scenarios'].items():
+            self.assertEqual(summary['requests'], 5, name)
+            self.assertEqual(summary['errors'], 0, name)
+            self.assertGreater(summary['queries_per_request'], 0, name)
+            self.assertLessEqual(summary['p50_ms'], summary['p99_ms'], name)
+            if connection.vendor == 'postgresql':
+                self.assertIsNotNone(summary['connections_per_request'], name)
+        # the detail endpoint stays at auth + task with user + comments
+        self.assertLessEqual(results['scenarios']['detail']['queries_per_request'], 3)
+
+    def test_write_scenarios_only_run_when_included(self):
+        # arrange
+        TaskFactory.create_batch(3)
+
+        # act
+        results = run_benchmark(requests=3, concurrency=1)
+        with self.assertRaises(ValueError):
+            run_benchmark(requests=3, concurrency=1, scenarios=['detail', 'comment'])
+
+        # assert
+        self.assertIn('detail', results['scenarios'])
+        self.assertNotIn('comment', results['scenarios'])
+        self.assertEqual((Comment.objects.count(), TimeLog.objects.count()), (0, 0))
+
+    def test_serialization_benchmark_compares_identical_payloads(self):
+        # arrange
+        for task in TaskFactory.create_batch(3):
+            TimeLogFactory.create(task=task, start_time=timezone.now(), duration=30)
+
+        # act
+        results = run_serialization_benchmark(rows=2, repeat=1)
+
+        # assert
+        for name, payload in results['payloads'].items():
+            self.assertEqual(payload['drf']['rows'], 2, name)
+            self.assertEqual(payload['values']['rows'], 2, name)
+            self.assertIsNotNone(payload['speedup'], name)
+
+    def test_compare_to_baseline(self):
+        baseline = {'scenarios': {'detail': {'p50_ms': 10, 'p95_ms': 20, 'p99_ms': 30, 'queries_per_request': 3}}}
+        ok = {'scenarios': {'detail': {'p50_ms': 11, 'p95_ms': 20, 'p99_ms': 35, 'queries_per_request': 3},
+                            'new': {'p50_ms': 1, 'p95_ms': 1, 'p99_ms': 1, 'queries_per_request': 1}}}
+        slow = {'scenarios': {'detail': {'p50_ms': 10, 'p95_ms': 30, 'p99_ms': 30, 'queries_per_request': 4}}}
+
+        self.assertEqual(compare_to_baseline(ok, baseline, tolerance=0.2), [])
+        self.assertEqual(len(compare_to_baseline(slow, baseline, tolerance=0.2)), 2)
+
+
+class BenchmarkHTTPTests(LiveServerTestCase):
+    def test_run_benchmark_over_http(self):
+        # arrange
+        TaskFactory.create_batch(3)
+
+        # act
+        results = run_benchmark(requests=4, concurrency=2, scenarios=['detail', 'list'],
+                                base_url=self.live_server_url, cores=2)
+
+        # assert
+        self.assertEqual(results['meta']['target'], self.live_server_url)
+        for name, summary in results['scenarios'].items():
+            self.assertEqual(summary['requests'], 4, name)
+            self.assertEqual(summary['errors'], 0, name)
+            self.assertIsNone(summary['queries_per_request'], name)
+            self.assertEqual(summary['rps_per_core'], round(summary['rps'] / 2, 1), name)
+
+
+class AnalyticsCacheTests(TestCase):
+    def tearDown(self) -> None:
+        cache.clear()
+
+    def log_time(self, task, duration):
+        return TimeLogFactory.create(task=task, start_time=timezone.now(), end_time=timezone.now(), duration=duration)
+
+    def test_top_tasks_are_served_from_cache(self):
+        # arrange
+        client = APIClient()
+        self.log_time(TaskFactory.create(), 60)
+        client.get('/api/tasks/top-tasks/')
+
+        # act
+        with self.assertNumQueries(0):
+            response = client.get('/api/tasks/top-tasks/')
+
+        # assert
+        self.assertEqual([task['task_duration'] for task in response.data], [60])
+
+    def test_time_log_write_invalidates_analytics(self):
+        # arrange
+        client = APIClient()
+        task = TaskFactory.create()
+        self.log_time(task, 60)
+        client.get('/api/tasks/top-tasks/')
+        client.get('/api/tasks/duration/')
+
+        # act
+        self.log_time(task, 30)
+        top_tasks = client.get('/api/tasks/top-tasks/')
+        durations = client.get('/api/tasks/duration/')
+
+        # assert
+        self.assertEqual(top_tasks.data[0]['task_duration'], 90)
+        self.assertEqual(durations.data[0]['task_duration'], 90)
+
+    def test_last_month_duration_is_cached_per_user(self):
+        # arrange
+        first_user, second_user = UserFactory.create_batch(2)
+        self.log_time(TaskFactory.create(user=first_user), 60)
+        self.log_time(TaskFactory.create(user=second_user), 120)
+        client = APIClient()
+        key = 'Total logged time in hours for last month'
+
+        # act
+        client.force_authenticate(user=first_user)
+        first = client.get(reverse('last_month_logged_time_duration'))
+        client.force_authenticate(user=second_user)
+        second = client.get(reverse('last_month_logged_time_duration'))
+
+        # assert
+        self.assertEqual(first.data[key], 1)
+        self.assertEqual(second.data[key], 2)
+
+    def test_reassigning_a_task_invalidates_both_users(self):
+        # arrange
+        first_user, second_user = UserFactory.create_batch(2)
+        task = TaskFactory.create(user=first_user)
+        self.log_time(task, 60)
+        client = APIClient()
+        key = 'Total logged time in hours for last month'
+        client.force_authenticate(user=first_user)
+        client.get(reverse('last_month_logged_time_duration'))
+        client.force_authenticate(user=second_user)
+        client.get(reverse('last_month_logged_time_duration'))
+
+        # act
+        task = Task.objects.get(id=task.id)
+        task.user = second_user
+        task.save()
+        second = client.get(reverse('last_month_logged_time_duration'))
+        client.force_authenticate(user=first_user)
+        first = client.get(reverse('last_month_logged_time_duration'))
+
+        # assert
+        self.assertEqual(second.data[key], 1)
+        self.assertEqual(first.data, {'message': 'No time logs found'})
+
+    def test_bulk_update_invalidates_analytics(self):
+        # arrange
+        client = APIClient()
+        task = TaskFactory.create()
+        self.log_time(task, 60)
+        client.get('/api/tasks/top-tasks/')
+
+        # act
+        client.patch('/api/tasks/bulk/', [{'id': task.id, 'title': 'renamed'}], format='json')
+        response = client.get('/api/tasks/top-tasks/')
+
+        # assert
+        self.assertEqual(response.data[0]['title'], 'renamed')
+
+    def test_concurrent_miss_serves_stale_value_instead_of_recomputing(self):
+        # arrange
+        compute = mock.Mock(return_value=['fresh'])
+        cached_analytics('report', '2024-01', lambda: ['old'])
+        invalidate_analytics()
+        # another caller is recomputing
+        cache.add('analytics:report:2024-01:all:lock', 'other', timeout=30)
+
+        # act
+        value = cached_analytics('report', '2024-01', compute)
+
+        # assert
+        self.assertEqual(value, ['old'])
+        compute.assert_not_called()
+
+    def test_miss_recomputes_once_and_releases_lock(self):
+        # arrange
+        compute = mock.Mock(return_value=['fresh'])
+
+        # act
+        first = cached_analytics('report', '2024-01', compute)
+        second = cached_analytics('report', '2024-01', compute)
+
+        # assert
+        self.assertEqual(first, second)
+        compute.assert_called_once()
+        self.assertIsNone(cache.get('analytics:report:2024-01:all:lock'))
+
+    @override_settings(REPLICA_MAX_LAG=2, ANALYTICS_CACHE_TIMEOUT=300)
+    def test_entries_read_from_a_replica_right_after_a_write_expire_quickly(self):
+        # arrange
+        invalidate_analytics()
+        versions = get_versions([GLOBAL_SCOPE])
+
+        # act
+        with reading_from('replica_1'):
+            replica_timeout = entry_timeout(versions)
+        primary_timeout = entry_timeout(versions)
+
+        # assert
+        self.assertEqual(replica_timeout, 2)
+        self.assertEqual(primary_timeout, 300)
+
+
+@skipUnless(settings.REPLICA_DATABASES, 'Needs a replica (DB_REPLICA_HOSTS)')
+class ReplicaReadTests(TestCase):
+    databases = {'default', *settings.REPLICA_DATABASES}
+
+    def setUp(self):
+        cache.clear()
+
+    def test_list_reads_from_the_replica_until_the_client_writes(self):
+        # arrange
+        client = APIClient()
+        client.force_authenticate(user=UserFactory.create())
+        before_write, after_write = [], []
+
+        # act
+        with track_queries(lambda alias, duration: before_write.append(alias)):
+            client.get(reverse('task_list_details'))
+        client.post('/api/tasks/', {'title': 'Mine', 'description': 'Just written'}, format='json')
+        with track_queries(lambda alias, duration: after_write.append(alias)):
+            response = client.get(reverse('task_list_details'))
+
+        # assert
+        self.assertTrue(before_write)
+        self.assertLessEqual(set(before_write), set(settings.REPLICA_DATABASES))
+        self.assertEqual(set(after_write), {'default'})
+        self.assertEqual([task['title'] for task in response.data['results']], ['Mine'])
+
+
+class AnalyticsPeriodTests(TestCase):
+    def tearDown(self) -> None:
+        cache.clear()
+
+    def explain(self, queryset) -> str:
+        if connection.vendor == 'postgresql':
+            # The test tables are tiny, make the planner show which index it would use.
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+        return queryset.explain()
+
+    def test_parse_period(self):
+        today = date(2024, 3, 15)
+
+        self.assertEqual(parse_period(None, today), Period('2024-03', date(2024, 3, 1), date(2024, 4, 1), True))
+        self.assertEqual(parse_period('last_month', today).start, date(2024, 2, 1))
+        self.assertEqual(parse_period('2023-12', today).end, date(2024, 1, 1))
+        last_30d = parse_period('last_30d', today)
+        self.assertEqual((last_30d.start, last_30d.end, last_30d.month_aligned),
+                         (date(2024, 2, 15), date(2024, 3, 16), False))
+        self.assertEqual(parse_period('0001-01', today).start, date(1, 1, 1))
+        self.assertEqual(parse_period('9999-11', today).end, date(9999, 12, 1))
+        for invalid in ('2024-13', 'yesterday', '2024-3', '0000-01', '9999-12'):
+            with self.assertRaises(ValidationError):
+                parse_period(invalid, today)
+
+    def test_out_of_range_periods_are_bad_requests(self):
+        # arrange
+        client = APIClient()
+        client.force_authenticate(user=UserFactory.create())
+
+        for period in ('0000-01', '9999-12'):
+            # act
+            responses = [client.get(f'/api/tasks/{path}', {PERIOD_QUERY_PARAM: period})
+                         for path in ('top-tasks/', 'async/top-tasks/', 'last-month-time-logged-duration')]
+
+            # assert
+            self.assertEqual([response.status_code for response in responses], [status.HTTP_400_BAD_REQUEST] * 3)
+
+    def test_top_tasks_for_period(self):
+        # arrange
+        client = APIClient()
+        now = timezone.now()
+        recent, old = TaskFactory.create_batch(2)
+        TimeLogFactory.create(task=recent, start_time=now - timedelta(days=2), duration=30)
+        TimeLogFactory.create(task=old, start_time=now - relativedelta(years=1), duration=60)
+
+        # act
+        last_30d = client.get('/api/tasks/top-tasks/', {'period': 'last_30d'})
+        year_ago = client.get('/api/tasks/top-tasks/', {'period': (now - relativedelta(years=1)).strftime('%Y-%m')})
+        invalid = client.get('/api/tasks/top-tasks/', {'period': 'forever'})
+
+        # assert
+        self.assertEqual([task['task_duration'] for task in last_30d.data], [30])
+        self.assertEqual([task['task_duration'] for task in year_ago.data], [60])
+        self.assertEqual(invalid.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_same_month_of_previous_year_is_not_counted(self):
+        # arrange
+        client = APIClient()
+        user = UserFactory.create()
+        task = TaskFactory.create(user=user)
+        TimeLogFactory.create(task=task, start_time=timezone.now(), duration=60)
+        TimeLogFactory.create(task=task, start_time=timezone.now() - relativedelta(years=1), duration=600)
+        client.force_authenticate(user=user)
+
+        # act
+        response = client.get(reverse('last_month_logged_time_duration'), {'period': 'this_month'})
+
+        # assert
+        self.assertEqual(response.data['Total logged time in hours for last month'], 1)
+
+    def test_last_30d_queries_use_time_log_indexes(self):
+        period = parse_period('last_30d')
+
+        for queryset in (LastMontLoggedTimeDurationView.logged_durations(1, period),
+                         TopTasksLastMonthView.top_tasks(period)):
+            self.assertNotIn('EXTRACT', str(queryset.query).upper())
+            self.assertRegex(self.explain(queryset), 'timelog_(task_start|start_duration)_idx')
+
+    def test_month_queries_use_rollup_indexes(self):
+        period = parse_period('this_month')
+
+        for queryset in (LastMontLoggedTimeDurationView.logged_durations(1, period),
+                         TopTasksLastMonthView.top_tasks(period)):
+            # SQLite names the index of the unique constraint itself
+            self.assertRegex(self.explain(queryset),
+                             'rollup_month_task_idx|unique_task_month_rollup|sqlite_autoindex_tasks_taskdurationrollup')
+
+
+class ExportTests(TestCase):
+    def setUp(self) -> None:
+        self.user = UserFactory.create(username='exporter')
+        self.open_task = TaskFactory.create(user=self.user, status='open', title='Open, "quoted"')
+        self.done_task = TaskFactory.create(status='completed')
+        CommentFactory.create_batch(2, task=self.open_task)
+        TimeLogFactory.create(task=self.open_task, start_time=timezone.now(), duration=30)
+        TimeLogFactory.create(task=self.done_task, start_time=timezone.now(), duration=60)
+
+    def test_tasks_csv_streams_with_user_and_comment_counts(self):
+        # arrange
+        client = APIClient()
+
+        # act
+        response = client.get(reverse('task_export', kwargs={'kind': 'tasks', 'export_format': 'csv'}))
+        with self.assertNumQueries(1):
+            rows = list(csv.DictReader(StringIO(b''.join(response.streaming_content).decode())))
+
+        # assert
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        self.assertEqual([row['id'] for row in rows], [str(self.open_task.id), str(self.done_task.id)])
+        self.assertEqual(rows[0]['title'], 'Open, "quoted"')
+        self.assertEqual(rows[0]['username'], 'exporter')
+        self.assertEqual([row['comment_count'] for row in rows], ['2', '0'])
+
+    def test_time_logs_ndjson_matches_task_filter(self):
+        # arrange
+        client = APIClient()
+        url = reverse('task_export', kwargs={'kind': 'time-logs', 'export_format': 'ndjson'})
+
+        # act
+        response = client.get(url, {'status': 'completed'})
+        lines = b''.join(response.streaming_content).decode().splitlines()
+
+        # assert
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson; charset=utf-8')
+        self.assertEqual(len(lines), 1)
+        row = json.loads(lines[0])
+        self.assertEqual((row['task_id'], row['duration']), (self.done_task.id, 60))
+
+    def test_invalid_filter_is_rejected(self):
+        response = APIClient().get(reverse('task_export', kwargs={'kind': 'tasks', 'export_format': 'csv'}),
+                                   {'status': 'unknown'})
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_export_command_writes_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            # arrange
+            path = Path(directory, 'tasks.ndjson')
+
+            # act
+            call_command('export_tasks', 'tasks', '--format', 'ndjson', '--output', str(path),
+                         '--filter', f'user_id={self.user.id}', '--chunk-size', '1')
+
+            # assert
+            rows = [json.loads(line) for line in path.read_text().splitlines()]
+        self.assertEqual([row['id'] for row in rows], [self.open_task.id])
+        self.assertEqual(rows[0]['comment_count'], 2)
+
+
+class ImportTests(TestCase):
+    def tearDown(self) -> None:
+        cache.clear()
+
+    def test_import_time_logs_csv_reports_row_errors(self):
+        # arrange
+        task = TaskFactory.create()
+        content = (
+            'task_id,start_time,end_time,duration\n'
+            f'{task.id},2024-05-01T10:00:00Z,2024-05-01T11:30:00Z,0\n'
+            f'{task.id},,,45\n'
+            '999999,2024-05-01T10:00:00Z,,30\n'
+            f'{task.id},2024-05-01T10:00:00Z,2024-05-01T09:00:00Z,0\n'
+            f'{task.id},not-a-date,,-5\n'
+        )
+
+        # act
+        result = TaskImporter('time-logs', chunk_size=2).run(StringIO(content), 'csv')
+
+        # assert
+        self.assertEqual({key: result[key] for key in ('rows', 'imported', 'skipped', 'failed')},
+                         {'rows': 5, 'imported': 2, 'skipped': 0, 'failed': 3})
+        self.assertEqual(sorted(error['row'] for error in result['errors']), [3, 4, 5])
+        self.assertIn('task_id', result['errors'][0]['errors'])
+        self.assertEqual(sorted(TimeLog.objects.filter(task=task).values_list('duration', flat=True)), [45, 90])
+        self.assertEqual(TaskDurationRollup.objects.get(task=task, month=date(2024, 5, 1)).duration, 90)
+        self.assertEqual(TaskDurationRollup.objects.get(task=task, month=None).duration, 45)
+        self.assertEqual(Task.objects.get(id=task.id).total_logged_minutes, 135)
+
+    def test_import_without_copy_moves_the_id_sequence(self):
+        # arrange
+        existing = TaskFactory.create()
+        content = '\n'.join([json.dumps({'id': existing.id + 1000, 'title': 'migrated', 'description': 'd'}),
+                             json.dumps({'title': 'fresh', 'description': 'd'})])
+
+        # act
+        result = TaskImporter('tasks', use_copy=False).run(StringIO(content), 'ndjson')
+        created = TaskFactory.create()
+
+        # assert
+        self.assertEqual(result['imported'], 2)
+        self.assertGreater(Task.objects.get(title='fresh').id, existing.id + 1000)
+        self.assertGreater(created.id, existing.id + 1000)
+
+    def test_import_tasks_ndjson_keeps_ids_and_updates_existing(self):
+        # arrange
+        user = UserFactory.create()
+        existing = TaskFactory.create(title='old title')
+        content = '\n'.join([
+            json.dumps({'id': existing.id, 'title': 'new title', 'description': 'd', 'status': 'completed'}),
+            json.dumps({'id': existing.id + 1000, 'title': 'migrated', 'description': 'd', 'user_id': user.id}),
+            json.dumps({'title': 'fresh', 'description': 'd'}),
+            '{not json',
+            json.dumps({'title': 'bad status', 'description': 'd', 'status': 'unknown'}),
+        ])
+
+        # act
+        result = TaskImporter('tasks').run(StringIO(content), 'ndjson')
+        created = TaskFactory.create()
+
+        # assert
+        self.assertEqual((result['imported'], result['failed']), (3, 2))
+        self.assertEqual(Task.objects.get(id=existing.id).title, 'new title')
+        self.assertEqual(Task.objects.get(id=existing.id + 1000).user, user)
+        self.assertTrue(Task.objects.filter(title='fresh').exists())
+        self.assertTrue(ChangeLog.objects.filter(kind=ChangeKind.TASK, object_id=existing.id + 1000).exists())
+        # generated ids continue after the imported ones
+        self.assertGreater(created.id, existing.id + 1000)
+
+    def test_import_endpoint(self):
+        # arrange
+        task = TaskFactory.create()
+        upload = SimpleUploadedFile('logs.csv', f'task_id,duration\n{task.id},30\n999999,30\n'.encode())
+
+        # act
+        response = APIClient().post(reverse('task_import', kwargs={'kind': 'time-logs', 'import_format': 'csv'}),
+                                    {'file': upload}, format='multipart')
+
+        # assert
+        self.assertEqual(response.status_code, status.HTTP_207_MULTI_STATUS)
+        self.assertEqual((response.data['imported'], response.data['failed']), (1, 1))
+
+    def test_import_command(self):
+        with tempfile.TemporaryDirectory() as directory:
+            # arrange
+            task = TaskFactory.create()
+            path = Path(directory, 'logs.ndjson')
+            path.write_text(json.dumps({'task_id': task.id, 'duration': 15}) + '\n')
+            stdout = StringIO()
+
+            # act
+            call_command('import_tasks', 'time-logs', str(path), stdout=stdout)
+
+        # assert
+        self.assertIn('1 imported', stdout.getvalue())
+        self.assertEqual(task.time_logs.get().duration, 15)
+
+
+class AsyncViewTests(TestCase):
+    def setUp(self) -> None:
+        self.user = UserFactory.create()
+        self.task = TaskFactory.create(user=self.user)
+        CommentFactory.create_batch(2, task=self.task)
+        TimeLogFactory.create(task=self.task, start_time=timezone.now(), end_time=timezone.now(), duration=90)
+        TaskFactory.create_batch(3)
+        self.client = APIClient(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+
+    def tearDown(self) -> None:
+        cache.clear()
+
+    def assertSameResponse(self, path: str, params: dict = None):
+        sync_response = self.client.get(f'/api/tasks/{path}', params)
+        async_response = self.client.get(f'/api/tasks/async/{path}', params)
+        self.assertEqual(async_response.status_code, sync_response.status_code)
+        # Pagination links point back at the endpoint that served the page.
+        self.assertEqual(async_response.content.decode().replace('/api/tasks/async/', '/api/tasks/'),
+                         sync_response.content.decode())
+        return async_response
+
+    def test_async_endpoints_match_sync_endpoints(self):
+        # arrange
+        task_id = self.task.id
+
+        # act / assert
+        self.assertEqual(len(self.assertSameResponse(f'{task_id}/').json()['comments']), 2)
+        self.assertSameResponse(f'{task_id}/comments/')
+        self.assertSameResponse(f'{task_id}/time-logs/')
+        self.assertSameResponse('list/', {'limit': 2, 'offset': 1, 'ordering': 'title'})
+        self.assertSameResponse('list/', {'cursor': '', 'limit': 2})
+        self.assertSameResponse('list/', {'user_id': self.user.id, 'status': self.task.status, 'search': 'a'})
+        self.assertSameResponse('top-tasks/')
+        self.assertSameResponse('duration/')
+        response = self.assertSameResponse('last-month-time-logged-duration')
+        self.assertEqual(response.json(), {'Total logged time in hours for last month': 1.5})
+
+    def test_async_errors(self):
+        # act
+        missing = self.client.get('/api/tasks/async/999999/comments/')
+        invalid_period = self.client.get('/api/tasks/async/top-tasks/', {'period': 'yesterday'})
+        invalid_token = APIClient(HTTP_AUTHORIZATION='Bearer invalid').get('/api/tasks/async/list/')
+
+        # assert
+        self.assertEqual(missing.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(invalid_period.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('period', invalid_period.json())
+        self.assertEqual(invalid_token.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertIn('WWW-Authenticate', invalid_token)
+
+    async def test_async_list_under_asgi(self):
+        # arrange
+        client = AsyncClient()
+
+        # act
+        response = await client.get('/api/tasks/async/list/', {'limit': 2})
+
+        # assert
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()['count'], 4)
+        self.assertEqual(len(response.json()['results']), 2)
+
+    async def test_async_list_filters_under_asgi(self):
+        # arrange
+        client = AsyncClient()
+
+        # act
+        response = await client.get('/api/tasks/async/list/', {'user_id': self.user.id, 'ordering': 'title'})
+        unknown_user = await client.get('/api/tasks/async/list/', {'user_id': self.user.id + 1000})
+
+        # assert
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([task['id'] for task in response.json()['results']], [self.task.id])
+        self.assertEqual(unknown_user.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class TaskEventTests(TestCase):
+    def setUp(self) -> None:
+        self.user = UserFactory.create()
+        self.task = TaskFactory.create(user=self.user)
+        self.url = '/api/tasks/async/events/'
+
+    def test_writes_publish_events_to_the_tasks_users(self):
+        # arrange
+        client = APIClient(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+        other_user = UserFactory.create()
+        published = []
+
+        # act
+        with mock.patch.object(get_broker(), 'publish', published.append), \
+                self.captureOnCommitCallbacks(execute=True):
+            client.put(f'/api/tasks/{self.task.id}/complete/')
+            client.post(f'/api/tasks/{self.task.id}/comment/', {'comment': 'Done'})
+            client.post(f'/api/tasks/{self.task.id}/start-timer/')
+            client.put(f'/api/tasks/{self.task.id}/stop-timer/')
+            client.put(f'/api/tasks/{self.task.id}/assign-user/', {'user_id': other_user.id})
+
+        # assert
+        self.assertEqual([event.type for event in published],
+                         [events.TASK_STATUS_CHANGED, events.COMMENT_CREATED, events.TIMER_STARTED,
+                          events.TIMER_STOPPED, events.TASK_ASSIGNED])
+        self.assertEqual({event.user_ids for event in published[:-1]}, {frozenset({self.user.id})})
+        self.assertEqual(published[-1].user_ids, {self.user.id, other_user.id})
+        self.assertEqual(published[0].data['status'], 'completed')
+        self.assertEqual(published[1].data['content'], 'Done')
+        self.assertEqual(published[3].data['time_log_id'], published[2].data['time_log_id'])
+
+    @override_settings(EVENTS_STREAM_MAX_SECONDS=0.5)
+    async def test_stream_sends_the_users_events(self):
+        # arrange
+        authorization = {'Authorization': f'Bearer {AccessToken.for_user(self.user)}'}
+        response = await AsyncClient().get(self.url, headers=authorization)
+        stream = aiter(response.streaming_content)
+        opening = await anext(stream)
+
+        # act
+        get_broker().publish(Event(events.TASK_ASSIGNED, {'task_id': 0}, frozenset({self.user.id + 1})))
+        get_broker().publish(Event(events.TASK_ASSIGNED, {'task_id': self.task.id}, frozenset({self.user.id})))
+        # The stream ends after EVENTS_STREAM_MAX_SECONDS
+        rest = b''.join([chunk async for chunk in stream])
+
+        # assert
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        self.assertEqual(opening, b': connected\n\n')
+        self.assertEqual(rest, f'event: task.assigned\ndata: {{"task_id": {self.task.id}}}\n\n'.encode())
+        self.assertFalse(get_broker().subscriptions)
+
+    async def test_stream_errors(self):
+        # act
+        anonymous = await AsyncClient().get(self.url)
+        # APIClient requests go through the WSGI handler
+        under_wsgi = await asyncio.to_thread(APIClient().get, self.url)
+
+        # assert
+        self.assertEqual(anonymous.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(under_wsgi.status_code, status.HTTP_501_NOT_IMPLEMENTED)
+
+
+class ConditionalGetTests(QueryBudgetMixin, TestCase):
+    def setUp(self) -> None:
+        self.task = TaskFactory.create(user=UserFactory.create())
+        CommentFactory.create_batch(2, task=self.task)
+        TimeLogFactory.create(task=self.task, start_time=timezone.now(), end_time=timezone.now(), duration=30)
+        self.client = APIClient()
+
+    def etags(self) -> dict:
+        return {path: self.client.get(f'/api/tasks/{self.task.id}/{path}')['ETag']
+                for path in ('', 'comments/', 'time-logs/')}
+
+    def test_unchanged_task_is_not_modified(self):
+        # arrange
+        response = self.client.get(f'/api/tasks/{self.task.id}/')
+
+        # act
+        with self.assertNumQueries(1):
+            not_modified = self.client.get(f'/api/tasks/{self.task.id}/', HTTP_IF_NONE_MATCH=response['ETag'])
+        since = self.client.get(f'/api/tasks/{self.task.id}/comments/',
+                                HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        hour_before = self.client.get(f'/api/tasks/{self.task.id}/comments/',
+                                      HTTP_IF_MODIFIED_SINCE=http_date(time.time() - 3600))
+
+        # assert
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(not_modified.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(not_modified.content, b'')
+        self.assertEqual(not_modified['ETag'], response['ETag'])
+        self.assertEqual(not_modified['Last-Modified'], response['Last-Modified'])
+        self.assertEqual(since.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(hour_before.status_code, status.HTTP_200_OK)
+
+    def test_validators_cost_no_query_on_full_responses(self):
+        # act / assert: task joined with its user + comments, as without validators
+        response = self.assertEndpointQueryBudget(f'/api/tasks/{self.task.id}/', 2)
+        self.assertIn('ETag', response)
+
+    def test_etags_change_with_the_task_and_its_children(self):
+        # arrange
+        initial = self.etags()
+
+        # act
+        CommentFactory.create(task=self.task)
+        commented = self.etags()
+        self.client.post(f'/api/tasks/{self.task.id}/start-timer/')
+        timed = self.etags()
+        self.task.user.first_name = 'Renamed'
+        self.task.user.save()
+        renamed = self.etags()
+        self.client.patch(f'/api/tasks/{self.task.id}/', {'title': 'Retitled'})
+        retitled = self.etags()
+
+        # assert
+        self.assertNotEqual(commented[''], initial[''])
+        self.assertNotEqual(commented['comments/'], initial['comments/'])
+        self.assertEqual(commented['time-logs/'], initial['time-logs/'])
+        self.assertEqual(timed['comments/'], commented['comments/'])
+        self.assertNotEqual(timed['time-logs/'], commented['time-logs/'])
+        self.assertEqual(renamed, {**timed, '': renamed['']})
+        self.assertNotEqual(renamed[''], timed[''])
+        self.assertNotEqual(retitled[''], renamed[''])
+
+    def test_zero_minute_imported_log_changes_time_logs_etag(self):
+        # arrange
+        etag = self.etags()['time-logs/']
+        start = timezone.now().isoformat()
+        rows = json.dumps({'task_id': self.task.id, 'start_time': start, 'end_time': start, 'duration': 0})
+
+        # act
+        TaskImporter('time-logs').run(StringIO(rows + '\n'), 'ndjson')
+
+        # assert
+        self.assertNotEqual(self.etags()['time-logs/'], etag)
+
+    def test_task_list_page_etag(self):
+        # arrange
+        TaskFactory.create_batch(3)
+        response = self.client.get('/api/tasks/list/', {'limit': 2})
+
+        # act
+        with self.assertNumQueries(2):
+            not_modified = self.client.get('/api/tasks/list/', {'limit': 2}, HTTP_IF_NONE_MATCH=response['ETag'])
+        other_page = self.client.get('/api/tasks/list/', {'limit': 2, 'offset': 2})
+        CommentFactory.create(task=Task.objects.order_by('-id').first())
+        commented = self.client.get('/api/tasks/list/', {'limit': 2}, HTTP_IF_NONE_MATCH=response['ETag'])
+
+        # assert
+        self.assertEqual(not_modified.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertNotEqual(other_page['ETag'], response['ETag'])
+        self.assertEqual(commented.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(commented['ETag'], response['ETag'])
+
+    def test_async_views_share_the_validators(self):
+        # arrange
+        client = APIClient(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.task.user)}')
+
+        for path in (f'{self.task.id}/', f'{self.task.id}/comments/', f'{self.task.id}/time-logs/', 'list/'):
+            # act
+            etag = client.get(f'/api/tasks/{path}')['ETag']
+            async_response = client.get(f'/api/tasks/async/{path}', HTTP_IF_NONE_MATCH=etag)
+
+            # assert
+            self.assertEqual(async_response.status_code, status.HTTP_304_NOT_MODIFIED, path)
+            self.assertEqual(async_response['ETag'], etag)
@@ -1,9 +1,11 @@
-﻿from django.urls import path, include
+﻿from django.urls import path, include, re_path
 from rest_framework.routers import DefaultRouter
 
+from .async_views import (AsyncTaskDetailView, AsyncTaskCommentsView, AsyncTaskTimeLogsView, AsyncTaskListView,
+                          AsyncTopTasksView, AsyncTasksDurationView, AsyncLastMonthLoggedTimeDurationView,
+                          AsyncTaskEventsView)
 from .views import (TaskDetailsView, TaskListDetailsView, LastMontLoggedTimeDurationView, TasksListDurationView,
-                    TopTasksLastMonthView)
-from django.views.decorators.cache import cache_page
+                    TopTasksLastMonthView, TaskExportView, TaskImportView, TaskChangesView)
 
 router = DefaultRouter()
 router.register(r'', TaskDetailsView, basename='tasks')
@@ -13,7 +15,21 @@ urlpatterns = [
     path('last-month-time-logged-duration', LastMontLoggedTimeDurationView.as_view(),
          name='last_month_logged_time_duration'),
     path('duration/', TasksListDurationView.as_view(), name='tasks_list_duration'),
-    path('top-tasks/',  cache_page(60)(TopTasksLastMonthView.as_view()), name='top_tasks_last_month'),
+    path('top-tasks/', TopTasksLastMonthView.as_view(), name='top_tasks_last_month'),
+    re_path(r'^export/(?P<kind>tasks|time-logs)\.(?P<export_format>csv|ndjson)$', TaskExportView.as_view(),
+            name='task_export'),
+    re_path(r'^import/(?P<kind>tasks|time-logs)\.(?P<import_format>csv|ndjson)$', TaskImportView.as_view(),
+            name='task_import'),
+    path('changes', TaskChangesView.as_view(), name='task_changes'),
+    path('async/list/', AsyncTaskListView.as_view(), name='async_task_list_details'),
+    path('async/last-month-time-logged-duration', AsyncLastMonthLoggedTimeDurationView.as_view(),
+         name='async_last_month_logged_time_duration'),
+    path('async/duration/', AsyncTasksDurationView.as_view(), name='async_tasks_list_duration'),
+    path('async/top-tasks/', AsyncTopTasksView.as_view(), name='async_top_tasks_last_month'),
+    path('async/events/', AsyncTaskEventsView.as_view(), name='async_task_events'),
+    path('async/<int:pk>/', AsyncTaskDetailView.as_view(), name='async_task_detail'),
+    path('async/<int:pk>/comments/', AsyncTaskCommentsView.as_view(), name='async_task_comments'),
+    path('async/<int:pk>/time-logs/', AsyncTaskTimeLogsView.as_view(), name='async_task_time_logs'),
     path('', include(router.urls)),
 
 ]
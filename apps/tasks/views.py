@@ -1,19 +1,36 @@
-from datetime import datetime
+import io
 
+from django.db import transaction
+from django.http import StreamingHttpResponse
 from django.db.models import Sum
 from django.utils import timezone
+from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.exceptions import ValidationError
+from rest_framework.filters import OrderingFilter
 from rest_framework.generics import get_object_or_404, ListAPIView, GenericAPIView
+from rest_framework.parsers import MultiPartParser
 from rest_framework.request import Request
 from rest_framework.response import Response
-from rest_framework.status import HTTP_200_OK, HTTP_201_CREATED
-
-from .filters import TaskFilter
-from .models import Task, StatusEnum, Comment, TimeLog
+from rest_framework.status import HTTP_200_OK, HTTP_201_CREATED, HTTP_207_MULTI_STATUS, HTTP_400_BAD_REQUEST
+
+from apps.common.helpers import EmptySerializer, optimize_queryset_for_serializer
+from apps.common.pagination import OptionalKeysetPagination
+from apps.common.replicas import ReplicaReadMixin
+from apps.common.values import ValuesListMixin, values_serializer
+from . import events
+from .cache import cached_analytics, invalidate_analytics
+from .changes import LIMIT_QUERY_PARAM, SINCE_QUERY_PARAM, read_changes
+from .conditional import LIST_ETAG_COLUMNS, TaskValidators
+from .exports import CONTENT_TYPES, export_rows, render_export
+from .imports import TaskImporter
+from .filters import TaskFilter, TaskSearchFilter
+from .models import Task, StatusEnum, Comment, TimeLog, TaskDurationRollup, OutboxEmail, ChangeLog
+from .periods import PERIOD_QUERY_PARAM, Period, parse_period
 from .serializers import (TaskDetailsSerializer, AssignUserSerializer, AddCommentToTaskSerializer, CommentSerializer,
-                          TasksSerializer, TimeLogSerializer, TaskDurationSerializer, LastMonthDurationSerializer)
+                          TasksSerializer, TimeLogSerializer, TaskDurationSerializer, LastMonthDurationSerializer,
+                          BulkCompleteSerializer)
 from dateutil.relativedelta import relativedelta
 from django.views.decorators.cache import cache_page
 
@@ -23,24 +40,159 @@ from django.views.decorators.cache import cache_page
 class TaskDetailsView(viewsets.ModelViewSet):
     serializer_class = TaskDetailsSerializer
     queryset = Task.objects.all()
+    pagination_class = OptionalKeysetPagination
+    # The timer actions pass the id straight to SQL
+    lookup_value_regex = r'\d+'
 
     get_serializer_class = lambda self: self.serializer_class
 
+    bulk_max_items = 1000
+
+    def get_queryset(self):
+        return optimize_queryset_for_serializer(super().get_queryset(), self.get_serializer_class())
+
+    def retrieve(self, request, *args, **kwargs):
+        validators = TaskValidators('detail', request.accepted_media_type)
+        if (response := validators.not_modified(request, self.kwargs['pk'])) is not None:
+            return response
+        task = self.get_object()
+        return validators.apply(Response(self.get_serializer(task).data), task)
+
+    def get_bulk_items(self, request: Request) -> list:
+        items = request.data
+        if not isinstance(items, list) or not items:
+            raise ValidationError('Expected a non-empty list of tasks')
+        if len(items) > self.bulk_max_items:
+            raise ValidationError(f'At most {self.bulk_max_items} tasks can be sent at once')
+        return items
+
+    @staticmethod
+    def bulk_response(results: list, success_status: int) -> Response:
+        """Per-item results, with 207 when only some of the items succeeded."""
+        failed = sum(result['status'] == 'error' for result in results)
+        if not failed:
+            response_status = success_status
+        elif failed == len(results):
+            response_status = HTTP_400_BAD_REQUEST
+        else:
+            response_status = HTTP_207_MULTI_STATUS
+        return Response({'results': results}, status=response_status)
+
+    @action(detail=False, methods=['post'], url_path='bulk')
+    def bulk(self, request: Request) -> Response:
+        """Create many tasks in one INSERT. Invalid items are reported and skipped."""
+        results, new_tasks = [], []
+        for index, item in enumerate(self.get_bulk_items(request)):
+            serializer = self.get_serializer(data=item)
+            if serializer.is_valid():
+                new_tasks.append((index, Task(**serializer.validated_data)))
+            else:
+                results.append({'index': index, 'status': 'error', 'errors': serializer.errors})
+
+        with transaction.atomic():
+            Task.objects.bulk_create([task for _, task in new_tasks])
+            ChangeLog.objects.record_tasks([task.id for _, task in new_tasks])
+
+        results += [{'index': index, 'status': 'created', 'id': task.id} for index, task in new_tasks]
+        return self.bulk_response(sorted(results, key=lambda result: result['index']), HTTP_201_CREATED)
+
+    @bulk.mapping.patch
+    def bulk_partial_update(self, request: Request) -> Response:
+        """Partially update many tasks, each item carrying its `id`, in one `bulk_update`."""
+        items = self.get_bulk_items(request)
+        ids = [item.get('id') for item in items if isinstance(item, dict)]
+        tasks = Task.objects.in_bulk([task_id for task_id in ids if self.is_task_id(task_id)])
+
+        results, changed, fields = [], {}, set()
+        for index, item in enumerate(items):
+            task_id = item.get('id') if isinstance(item, dict) else None
+            task = tasks.get(task_id) if self.is_task_id(task_id) else None
+            if task is None:
+                results.append({'index': index, 'status': 'error', 'errors': {'id': ['Task not found.']}})
+                continue
+
+            serializer = self.get_serializer(task, data=item, partial=True)
+            if not serializer.is_valid():
+                results.append({'index': index, 'status': 'error', 'id': task_id, 'errors': serializer.errors})
+                continue
+
+            for field, value in serializer.validated_data.items():
+                setattr(task, field, value)
+                fields.add(field)
+            changed[task.id] = task
+            results.append({'index': index, 'status': 'updated', 'id': task_id})
+
+        if changed:
+            now = timezone.now()
+            for task in changed.values():
+                task.updated_at = now
+            with transaction.atomic():
+                Task.objects.bulk_update(list(changed.values()), sorted(fields | {'updated_at'}), batch_size=500)
+                ChangeLog.objects.record_tasks(changed)
+                # bulk_update skips the signals that invalidate the analytics
+                invalidate_analytics(all_users='user' in fields)
+
+        return self.bulk_response(results, HTTP_200_OK)
+
+    @staticmethod
+    def is_task_id(value) -> bool:
+        # bool is an int, but `"id": true` isn't task 1 (the ids of `BulkCompleteSerializer` reject it too).
+        return isinstance(value, int) and not isinstance(value, bool)
+
+    @action(detail=False, methods=['put'], serializer_class=BulkCompleteSerializer, url_path='bulk-complete')
+    def bulk_complete(self, request: Request) -> Response:
+        """Complete many tasks in one UPDATE and queue their notifications in one INSERT."""
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        ids = serializer.validated_data['ids']
+        tasks = Task.objects.select_related('user').in_bulk(ids)
+
+        now = timezone.now()
+        to_complete = []
+        for task in tasks.values():
+            if task.status != StatusEnum.COMPLETED:
+                task.status = StatusEnum.COMPLETED
+                task.updated_at = now
+                to_complete.append(task)
+
+        with transaction.atomic():
+            Task.objects.bulk_update(to_complete, ['status', 'updated_at'], batch_size=500)
+            ChangeLog.objects.record_tasks([task.id for task in to_complete])
+            for task in to_complete:
+                events.task_status_changed(task)
+            emails = [task.task_completed_email(commit=False) for task in to_complete]
+            OutboxEmail.objects.bulk_create([email for email in emails if email is not None])
+
+        completed = {task.id for task in to_complete}
+        results = []
+        for index, task_id in enumerate(ids):
+            if task_id not in tasks:
+                results.append({'index': index, 'status': 'error', 'id': task_id, 'errors': {'id': ['Task not found.']}})
+            else:
+                results.append({'index': index, 'status': 'completed' if task_id in completed else 'unchanged',
+                                'id': task_id})
+        return self.bulk_response(results, HTTP_200_OK)
+
     @action(detail=True, methods=['put'], serializer_class=AssignUserSerializer, url_path='assign-user')
     def assign_user(self, request, *args, **kwargs):
         task = self.get_object()
+        previous_user_id = task.user_id
         serializer = self.get_serializer(task, data=request.data, partial=True)
         serializer.is_valid(raise_exception=True)
-        task = serializer.save()
-        task.user_assigned_to_task_email()
+        with transaction.atomic():
+            task = serializer.save()
+            task.user_assigned_to_task_email()
+            events.task_assigned(task, previous_user_id)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
     @action(detail=True, methods=['put'], serializer_class=NotImplemented)
     def complete(self, request, *args, **kwargs):
         task = self.get_object()
         task.status = StatusEnum.COMPLETED
-        task.save()
-        task.task_completed_email()
+        with transaction.atomic():
+            task.save()
+            task.task_completed_email()
+            events.task_status_changed(task)
         return Response({'message': f"Task: f{task.title} completed succesefully"}, status=HTTP_200_OK)
 
     @action(detail=True, methods=['post'], serializer_class=AddCommentToTaskSerializer)
@@ -49,141 +201,215 @@ class TaskDetailsView(viewsets.ModelViewSet):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         new_comment = Comment(content=serializer.data['comment'], task=task)
-        new_comment.save()
-        task.task_commented_email(new_comment.content)
+        with transaction.atomic():
+            new_comment.save()
+            task.task_commented_email(new_comment.content)
+            events.comment_created(new_comment, task)
         return Response({'comment_id': f"{new_comment.id}"}, status=HTTP_201_CREATED)
 
     @action(detail=True, methods=['get'], serializer_class=CommentSerializer)
     def comments(self, request, pk=None):
+        validators = TaskValidators('comments', request.accepted_media_type)
+        if (response := validators.not_modified(request, pk)) is not None:
+            return response
         task = self.get_object()
         comments = task.comments.all()
         serializer = CommentSerializer(comments, many=True)
-        return Response(serializer.data)
+        return validators.apply(Response(serializer.data), task)
 
     @action(detail=True, methods=['post'], serializer_class=NotImplemented, url_path='start-timer')
     def start_timer(self, request, pk=None):
-        task = self.get_object()
-
-        is_timer_started = (
-            task.time_logs.filter(
-                start_time__isnull=False,
-                end_time__isnull=True)
-            .exists())
-
-        if is_timer_started:
+        started_timer = TimeLog.objects.start_timer(pk)
+        if started_timer is None:
+            get_object_or_404(Task, pk=pk)
             raise ValidationError('Timer already started')
 
-        new_time_log = TimeLog(task=self.get_object(), start_time=datetime.now())
-        new_time_log.save()
-
+        events.timer_started(started_timer)
         return Response({'message': 'Timer started'}, status=HTTP_200_OK)
 
     @action(detail=True, methods=['put'], serializer_class=NotImplemented, url_path='stop-timer')
     def stop_timer(self, request, pk=None):
-        task = self.get_object()
-
-        started_timer: TimeLog = (
-            task.time_logs.filter(
-                start_time__isnull=False,
-                end_time__isnull=True,
-                duration__isnull=True)
-            .first())
-
-        if started_timer is None:
+        stopped_timer = TimeLog.objects.stop_timer(pk)
+        if stopped_timer is None:
+            get_object_or_404(Task, pk=pk)
             raise ValidationError('Timer not started')
 
-        duration = started_timer.start_time - timezone.now()
-
-        started_timer.end_time = datetime.now()
-        started_timer.duration = duration.total_seconds() / 60
-        started_timer.save()
-
-        return Response(TimeLogSerializer(started_timer).data, status=HTTP_200_OK)
+        invalidate_analytics(user_ids=[stopped_timer.task_user_id])
+        events.timer_stopped(stopped_timer)
+        return Response(TimeLogSerializer(stopped_timer).data, status=HTTP_200_OK)
 
     @action(detail=True, methods=['get'], serializer_class=TimeLogSerializer, url_path='time-logs')
     def time_logs(self, request: Request, pk=None):
-        time_logs = self.get_object().time_logs.all()
-        self.get_serializer(time_logs, many=True)
-        return Response(self.get_serializer(time_logs, many=True).data)
+        validators = TaskValidators('time-logs', request.accepted_media_type)
+        if (response := validators.not_modified(request, pk)) is not None:
+            return response
+        task = self.get_object()
+        time_logs = task.time_logs.all()
+        return validators.apply(Response(self.get_serializer(time_logs, many=True).data), task)
 
     @action(detail=True, methods=['post'], serializer_class=TimeLogSerializer, url_path='log-time')
     def log_time(self, request: Request, pk=None):
         task = self.get_object()
         data = TimeLogSerializer(data=request.data)
         data.is_valid(raise_exception=True)
-        validated_data = data.validated_data
-
-        start_time = validated_data['start_time']
-        end_time = validated_data['end_time']
-        duration = validated_data['duration']
-
-        if duration == 0 or duration is None:
-            duration = (end_time - start_time).total_seconds() / 60
-
-        new_time_log = TimeLog(task=task, start_time=start_time, end_time=end_time, duration=duration)
-        new_time_log.save()
+        new_time_log = TimeLog(task=task, **data.validated_data)
+        with transaction.atomic():
+            new_time_log.save()
         return Response(TimeLogSerializer(new_time_log).data, status=HTTP_201_CREATED)
 
     @action(detail=True, methods=['get'], serializer_class=NotImplemented, url_path='logged-time-duration')
     def logged_time_duration(self, request: Request, pk=None):
-        time_logs = self.get_object().time_logs.filter(duration__isnull=False)
-        logs_duration = time_logs.aggregate(Sum('duration'))['duration__sum']
-        logs_duration_in_hours = round(logs_duration / 60, 1)
+        task = get_object_or_404(Task.objects.only('total_logged_minutes'), pk=pk)
+        logs_duration_in_hours = round(task.total_logged_minutes / 60, 1)
 
         return Response({'Total logged time in hours': logs_duration_in_hours}, status=HTTP_200_OK)
 
 
-class LastMontLoggedTimeDurationView(GenericAPIView):
+class LastMontLoggedTimeDurationView(ReplicaReadMixin, GenericAPIView):
     serializer_class = LastMonthDurationSerializer
 
     def get(self, request: Request) -> Response:
         user_id = request.user.id
-        time_logs = TimeLog.objects.filter(
-            task__user_id=user_id,
-            start_time__month=timezone.now().month,
-            duration__isnull=False)
+        period = parse_period(request.query_params.get(PERIOD_QUERY_PARAM))
+        data = cached_analytics('last-month-duration', period.key,
+                                lambda: self.compute(user_id, period), user_id=user_id)
+        return Response(data, status=HTTP_200_OK)
+
+    @classmethod
+    def compute(cls, user_id, period: Period) -> dict:
+        return cls.summarize(cls.logged_durations(user_id, period).aggregate(Sum('duration'))['duration__sum'])
 
-        if not time_logs:
-            return Response({'message': 'No time logs found'}, status=HTTP_200_OK)
+    @staticmethod
+    def summarize(logs_duration) -> dict:
+        if logs_duration is None:
+            return {'message': 'No time logs found'}
 
-        logs_duration = time_logs.aggregate(Sum('duration'))['duration__sum']
         logs_duration_in_hours = round(logs_duration / 60, 1)
 
-        return Response({'Total logged time in hours for last month': logs_duration_in_hours}, status=HTTP_200_OK)
+        return {'Total logged time in hours for last month': logs_duration_in_hours}
 
+    @staticmethod
+    def logged_durations(user_id, period: Period):
+        if period.month_aligned:
+            return TaskDurationRollup.objects.filter(task__user_id=user_id, log_count__gt=0, **period.rollup_filter())
+        return TimeLog.objects.filter(task__user_id=user_id, duration__isnull=False, **period.time_log_filter())
 
-class TasksListDurationView(GenericAPIView):
+
+class TasksListDurationView(ReplicaReadMixin, GenericAPIView):
     serializer_class = TaskDurationSerializer
 
     def get(self, request: Request) -> Response:
-        tasks = Task.objects.all().filter(time_logs__duration__isnull=False).annotate(
-            task_duration=Sum('time_logs__duration'))
+        return Response(cached_analytics('tasks-duration', 'all', self.compute), status=HTTP_200_OK)
+
+    def compute(self) -> list:
+        return values_serializer(self.get_serializer_class()).serialize(self.durations())
 
-        return Response(self.get_serializer(tasks, many=True).data, status=HTTP_200_OK)
+    @staticmethod
+    def durations():
+        return (Task.objects
+                .filter(duration_rollups__log_count__gt=0)
+                .annotate(task_duration=Sum('duration_rollups__duration'))
+                .order_by('id'))
 
 
-class TopTasksLastMonthView(GenericAPIView):
+class TopTasksLastMonthView(ReplicaReadMixin, GenericAPIView):
     serializer_class = TaskDurationSerializer
 
     def get(self, request: Request) -> Response:
-        top_tasks = (Task.objects
-                     .filter(time_logs__duration__isnull=False,
-                             time_logs__start_time__month=timezone.now().month)
-                     .annotate(task_duration=Sum('time_logs__duration'))
-                     .order_by('-task_duration')[:20])
+        period = parse_period(request.query_params.get(PERIOD_QUERY_PARAM))
+        return Response(cached_analytics('top-tasks', period.key, lambda: self.compute(period)), status=200)
+
+    def compute(self, period: Period) -> list:
+        return values_serializer(self.get_serializer_class()).serialize(self.top_tasks(period))
+
+    @staticmethod
+    def top_tasks(period: Period):
+        if period.month_aligned:
+            tasks = (Task.objects
+                     .filter(duration_rollups__log_count__gt=0, **period.rollup_filter('duration_rollups__'))
+                     .annotate(task_duration=Sum('duration_rollups__duration')))
+        else:
+            tasks = (Task.objects
+                     .filter(time_logs__duration__isnull=False, **period.time_log_filter('time_logs__'))
+                     .annotate(task_duration=Sum('time_logs__duration')))
 
-        return Response(self.get_serializer(top_tasks, many=True).data, status=200)
+        # Ties by id, so their order doesn't depend on the query plan
+        return tasks.order_by('-task_duration', 'id')[:20]
 
 
-class TaskListDetailsView(ListAPIView):
+class TaskListDetailsView(ReplicaReadMixin, ValuesListMixin, ListAPIView):
     serializer_class = TasksSerializer
+    pagination_class = OptionalKeysetPagination
+    filter_backends = (DjangoFilterBackend, OrderingFilter, TaskSearchFilter)
     filterset_class = TaskFilter
     search_fields = ['title', 'description']
     ordering = ('-id',)
     ordering_fields = ('id', 'title', 'description', 'status', 'created_at')
+    etag_columns = LIST_ETAG_COLUMNS
 
     def get_serializer_class(self):
         return self.serializer_class
 
     def get_queryset(self):
         return Task.objects.all()
+
+
+class TaskExportView(GenericAPIView):
+    """
+    Streams every task (`tasks`) or time log (`time-logs`) matching the `TaskFilter` params as
+    CSV or NDJSON, without pagination and with constant memory use.
+    """
+    serializer_class = EmptySerializer
+    filter_backends = ()
+    pagination_class = None
+
+    def get(self, request: Request, kind: str, export_format: str) -> StreamingHttpResponse:
+        rows = export_rows(kind, request.query_params)
+        response = StreamingHttpResponse(render_export(kind, export_format, rows),
+                                         content_type=CONTENT_TYPES[export_format])
+        response['Content-Disposition'] = f'attachment; filename="{kind}.{export_format}"'
+        return response
+
+
+class TaskChangesView(GenericAPIView):
+    """
+    The tasks, comments and time logs created, updated or deleted since the `since` token, at
+    most `limit` changes at a time. See `apps.tasks.changes`.
+    """
+    serializer_class = EmptySerializer
+    filter_backends = ()
+    pagination_class = None
+
+    def get(self, request: Request) -> Response:
+        return Response(read_changes(request.query_params.get(SINCE_QUERY_PARAM),
+                                     request.query_params.get(LIMIT_QUERY_PARAM)), status=HTTP_200_OK)
+
+
+class TaskImportView(GenericAPIView):
+    """
+    Imports tasks or time logs from an uploaded CSV or NDJSON `file`, see `TaskImporter`.
+
+    Responds with the row counts and the per-row errors: 200 when every row was imported,
+    207 when only some were, 400 when none were. Use the `import_tasks` command for very
+    large files.
+    """
+    serializer_class = EmptySerializer
+    parser_classes = (MultiPartParser,)
+    filter_backends = ()
+    pagination_class = None
+
+    def post(self, request: Request, kind: str, import_format: str) -> Response:
+        upload = request.FILES.get('file')
+        if upload is None:
+            raise ValidationError({'file': 'No file was submitted.'})
+
+        stream = io.TextIOWrapper(upload.file, encoding='utf-8-sig', newline='')
+        result = TaskImporter(kind).run(stream, import_format)
+
+        if not result['failed']:
+            response_status = HTTP_200_OK
+        elif not result['imported']:
+            response_status = HTTP_400_BAD_REQUEST
+        else:
+            response_status = HTTP_207_MULTI_STATUS
+        return Response(result, status=response_status)
@@ -0,0 +1,126 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from django.utils.translation import gettext_lazy as _
+from drf_spectacular.contrib.rest_framework_simplejwt import SimpleJWTScheme
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+
+def snapshot_fields(user_model) -> list[str]:
+    # The password hash stays out of the caches. It's deferred on the cached users, so reading it
+    # (CHECK_REVOKE_TOKEN, password changes) costs a query.
+    return [field.attname for field in user_model._meta.concrete_fields if field.attname != "password"]
+
+
+def user_cache_key(user_id) -> str:
+    return f"users:snapshot:{user_id}"
+
+
+class LocalUserCache:
+    """
+    Least recently used user snapshots of this process, each kept `USER_CACHE_LOCAL_TIMEOUT`
+    seconds. Invalidation only reaches the process that saved the user, so this timeout is
+    how long the other processes may still authenticate a deactivated user.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+
+    def get(self, user_id):
+        with self.lock:
+            entry = self.entries.get(user_id)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self.entries[user_id]
+                return None
+            self.entries.move_to_end(user_id)
+            return entry[1]
+
+    def set(self, user_id, snapshot: tuple):
+        with self.lock:
+            self.entries[user_id] = (time.monotonic() + settings.USER_CACHE_LOCAL_TIMEOUT, snapshot)
+            self.entries.move_to_end(user_id)
+            while len(self.entries) > settings.USER_CACHE_LOCAL_SIZE:
+                self.entries.popitem(last=False)
+
+    def delete(self, user_id):
+        with self.lock:
+            self.entries.pop(user_id, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+local_users = LocalUserCache()
+
+
+def invalidate_cached_user(user_id) -> None:
+    """Drop a user's snapshot. Call it after writes to users that bypass model signals."""
+    local_users.delete(str(user_id))
+    cache.delete(user_cache_key(user_id))
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    `JWTAuthentication` that loads the user from a snapshot of its row, kept in this process
+    (`LocalUserCache`) and in the shared cache for `USER_CACHE_TIMEOUT` seconds, instead of
+    querying it on every request. Saving or deleting a user drops its snapshot, see
+    `apps.users.signals`.
+    """
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError as e:
+            raise InvalidToken(_("Token contained no recognizable user identification")) from e
+
+        # Tokens carry the id as a string.
+        user = self.get_cached_user(str(user_id))
+        if user is None:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found")
+
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(user.password):
+                raise AuthenticationFailed(_("The user's password has been changed."), code="password_changed")
+
+        return user
+
+    def get_cached_user(self, user_id):
+        fields = snapshot_fields(self.user_model)
+        snapshot = local_users.get(user_id)
+        if snapshot is None:
+            snapshot = cache.get(user_cache_key(user_id))
+            if snapshot is None:
+                # From the primary: a replica could still return the row as it was before an
+                # invalidation, and it would then be cached.
+                snapshot = (
+                    self.user_model.objects.using(DEFAULT_DB_ALIAS)
+                    .filter(**{api_settings.USER_ID_FIELD: user_id})
+                    .values_list(*fields)
+                    .first()
+                )
+                if snapshot is None:
+                    return None
+                cache.set(user_cache_key(user_id), snapshot, timeout=settings.USER_CACHE_TIMEOUT)
+            local_users.set(user_id, snapshot)
+
+        # A new instance per request, so changes a view makes to `request.user` stay in that request.
+        return self.user_model.from_db(DEFAULT_DB_ALIAS, fields, snapshot)
+
+
+class CachedJWTScheme(SimpleJWTScheme):
+    target_class = "apps.users.authentication.CachedJWTAuthentication"
+
@@ -0,0 +1,17 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework_simplejwt.settings import api_settings
+
+from .authentication import invalidate_cached_user
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def invalidate_cached_user_on_change(sender, instance, **kwargs):
+    user_id = getattr(instance, api_settings.USER_ID_FIELD)
+    invalidate_cached_user(user_id)
+    if transaction.get_connection().in_atomic_block:
+        # Again on commit, in case a request cached the old row before this transaction committed.
+        transaction.on_commit(lambda: invalidate_cached_user(user_id))
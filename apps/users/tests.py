@@ -1,7 +1,13 @@
 from django.contrib.auth.models import User
-from django.test import TestCase
+from django.core.cache import cache
+from django.test import RequestFactory, TestCase
+from rest_framework.request import Request
 from rest_framework.reverse import reverse
 from rest_framework.test import APIClient
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.tokens import AccessToken
+
+from apps.users.authentication import CachedJWTAuthentication, local_users
 
 
 class TestUsers(TestCase):
@@ -23,3 +29,52 @@ class TestUsers(TestCase):
             },
         )
         self.assertEqual(response.status_code, 200)
+
+
+class TestCachedJWTAuthentication(TestCase):
+    def setUp(self) -> None:
+        cache.clear()
+        local_users.clear()
+        self.user = User.objects.create_user(username="cached", password="testpwd1")
+        self.authorization = f"Bearer {AccessToken.for_user(self.user)}"
+
+    def authenticate(self):
+        request = Request(RequestFactory().get("/", HTTP_AUTHORIZATION=self.authorization))
+        return CachedJWTAuthentication().authenticate(request)
+
+    def test_authenticated_requests_do_no_queries_in_steady_state(self) -> None:
+        # arrange
+        client = APIClient()
+        client.get(reverse("top_tasks_last_month"), HTTP_AUTHORIZATION=self.authorization)
+
+        # act
+        with self.assertNumQueries(0):
+            response = client.get(reverse("top_tasks_last_month"), HTTP_AUTHORIZATION=self.authorization)
+
+        # assert
+        self.assertEqual(response.status_code, 200)
+
+    def test_other_processes_load_the_shared_snapshot(self) -> None:
+        # arrange
+        self.authenticate()
+        local_users.clear()
+
+        # act
+        with self.assertNumQueries(0):
+            user, _ = self.authenticate()
+
+        # assert
+        self.assertEqual((user.pk, user.username), (self.user.pk, "cached"))
+        self.assertEqual(user.get_deferred_fields(), {"password"})
+
+    def test_deactivating_a_user_drops_its_snapshot(self) -> None:
+        # arrange
+        self.authenticate()
+
+        # act
+        self.user.is_active = False
+        self.user.save()
+
+        # assert
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate()